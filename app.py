@@ -1,6 +1,18 @@
+import os
+
+# The Redis message queue needs cooperative sockets under eventlet, so patch
+# before anything else opens a connection
+if os.environ.get('SOCKETIO_MESSAGE_QUEUE') == 'redis':
+    import eventlet
+    eventlet.monkey_patch()
+
 from app import create_app, socketio
 from app.services.kafka_bridge import KafkaWebSocketBridge
-import os
+from app.services.track_store import track_writer
+from app.services.activity_rollups import activity_rollups
+from app.services.system_metrics import metrics_sampler
+from app.services.embedding_snapshot import snapshot_refresher
+import json
 import logging
 import atexit
 
@@ -17,11 +29,24 @@ def create_and_configure_app():
         'bootstrap_servers': [os.getenv('KAFKA_BROKERS', 'localhost:9092')],
         'auto_offset_reset': 'latest',
         'enable_auto_commit': True,
-        'group_id': 'gui-service-bridge'
+        'group_id': 'gui-service-bridge',
+        'value_deserializer': lambda m: json.loads(m.decode('utf-8')) if m else None
     }
     
     # Create Kafka bridge instance
-    kafka_bridge = KafkaWebSocketBridge(socketio, kafka_config)
+    kafka_bridge = KafkaWebSocketBridge(
+        socketio,
+        kafka_config,
+        batch_window_ms=app.config['BRIDGE_BATCH_WINDOW_MS'],
+        consumer_mode=app.config['BRIDGE_CONSUMER_MODE'],
+        num_workers=app.config['BRIDGE_WORKERS'],
+        worker_queue_size=app.config['BRIDGE_WORKER_QUEUE_SIZE'],
+        track_keyframe_interval=app.config['BRIDGE_TRACK_KEYFRAME_INTERVAL'],
+        snapshot_cache_size=app.config['BRIDGE_SNAPSHOT_CACHE_SIZE'],
+        snapshot_ttl=app.config['BRIDGE_SNAPSHOT_TTL'],
+        track_writer=track_writer if app.config['TRACK_STORE_ENABLED'] else None,
+        rollups=activity_rollups if app.config['ROLLUP_ENABLED'] else None
+    )
     
     # Store reference in app context for shutdown
     app.kafka_bridge = kafka_bridge
@@ -35,6 +60,8 @@ def start_background_services():
     """Start background services after app startup"""
     logger.info("Starting background services...")
     kafka_bridge.start()
+    metrics_sampler.start()
+    snapshot_refresher.start()
 
 # Register cleanup
 atexit.register(lambda: hasattr(app, 'kafka_bridge') and app.kafka_bridge.stop())
@@ -23,23 +23,90 @@ def create_app(config_class='app.config.Config'):
     jwt.init_app(app)
     ma.init_app(app)
     
-    # Initialize SocketIO with CORS enabled
+    # Initialize SocketIO with CORS enabled, per-client overlay backpressure
+    # and the message queue shared by all GUI workers
+    from app.services.message_queue import create_client_manager
+    client_manager = create_client_manager(app.config)
     socketio.init_app(app, 
                      cors_allowed_origins="*",
                      async_mode='eventlet',
+                     client_manager=client_manager,
                      logger=True,
                      engineio_logger=True)
 
+    # Verified-token and user cache used by token_required
+    from app.services.token_cache import token_cache
+    token_cache.configure(app.config['TOKEN_CACHE_SIZE'], app.config['TOKEN_CACHE_USER_TTL'])
+
+    # bcrypt pool matching the Socket.IO async mode
+    from app.services.password_hasher import password_hasher
+    password_hasher.configure(app.config['PASSWORD_HASH_WORKERS'],
+                              app.config['PASSWORD_HASH_PER_USER_LIMIT'],
+                              socketio.async_mode)
+
+    # Embedding similarity index, loaded on first search
+    from app.services.vector_index import vector_search
+    vector_search.configure(app.config['VECTOR_INDEX_MODE'],
+                            app.config['VECTOR_INDEX_NLIST'],
+                            app.config['VECTOR_INDEX_NPROBE'],
+                            app.config['VECTOR_INDEX_PQ_M'],
+                            app.config['EMBEDDING_SNAPSHOT_PATH'])
+    from app.services.embedding_snapshot import snapshot_refresher
+    snapshot_refresher.configure(app,
+                                 app.config['EMBEDDING_SNAPSHOT_PATH'],
+                                 app.config['EMBEDDING_SNAPSHOT_REFRESH_INTERVAL'],
+                                 app.config['EMBEDDING_SNAPSHOT_REFRESH_ROWS'])
+
+    # Person image thumbnails, rendered off the hub
+    from app.services.thumbnails import thumbnail_cache
+    thumbnail_cache.configure(app.config['UPLOAD_FOLDER'],
+                              app.config['THUMBNAIL_CACHE_DIR'],
+                              app.config['THUMBNAIL_CACHE_MAX_BYTES'],
+                              app.config['THUMBNAIL_WORKERS'],
+                              socketio.async_mode)
+
+    # Write-behind store for tracks and recognitions, started with the bridge
+    from app.services.track_store import track_writer
+    track_writer.configure(app,
+                           app.config['TRACK_STORE_BATCH_SIZE'],
+                           app.config['TRACK_STORE_FLUSH_INTERVAL_MS'],
+                           app.config['TRACK_STORE_QUEUE_SIZE'],
+                           app.config['TRACK_STORE_SPILL_DIR'],
+                           app.config['TRACK_STORE_SPILL_MAX_BYTES'],
+                           app.config['TRACK_RETENTION_DAYS'])
+
+    # Activity rollups, also fed by the bridge
+    from app.services.activity_rollups import activity_rollups
+    activity_rollups.configure(app,
+                               app.config['ROLLUP_GRID_SIZE'],
+                               app.config['ROLLUP_FLUSH_INTERVAL'])
+
+    # System metrics sampler, started with the background services
+    from app.services.system_metrics import metrics_sampler
+    metrics_sampler.configure(app, socketio,
+                              app.config['METRICS_SAMPLE_INTERVAL'],
+                              app.config['METRICS_HISTORY'],
+                              app.config['METRICS_EMIT_ENABLED'])
+
+    # Prometheus metrics: REST timing and Socket.IO room sizes
+    from app.utils.metrics import instrument_app, SOCKETIO_ROOM_CLIENTS
+    instrument_app(app)
+    SOCKETIO_ROOM_CLIENTS.set_function(lambda: {
+        (room,): size for room, size in socketio.server.manager.room_sizes().items()
+    } if socketio.server and hasattr(socketio.server.manager, 'room_sizes') else {})
+
     # Register API blueprints
     from app.api.auth.routes import auth_bp
     from app.api.cameras.routes import cameras_bp
     from app.api.persons.routes import persons_bp
     from app.api.system.routes import system_bp
+    from app.api.metrics.routes import metrics_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(cameras_bp)
     app.register_blueprint(persons_bp)
     app.register_blueprint(system_bp)
+    app.register_blueprint(metrics_bp)
 
     # Register error handlers
     from app.api.middleware.error_handlers import register_error_handlers
@@ -50,10 +117,20 @@ def create_app(config_class='app.config.Config'):
     register_handlers(socketio)
 
     # Import models to register them with SQLAlchemy
-    from app.models import user, camera, person, system_config
+    from app.models import user, camera, person, system_config, track, rollup, table_version
+    # Bumps the table versions behind listing ETags on commit
+    from app.services import table_versions
 
     # Create database tables if they don't exist
     with app.app_context():
         db.create_all()
 
+        # Name search indexes (pg_trgm) or the in-process fallback
+        from app.services.person_search import person_search
+        person_search.init_app(app)
+
+        # create_all() skips indexes on tables that already exist
+        from app.services.embedding_snapshot import create_indexes
+        create_indexes()
+
     return app
\ No newline at end of file
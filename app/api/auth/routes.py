@@ -2,6 +2,7 @@
 from flask import Blueprint
 from flask_restful import Api, Resource, request
 from app.services.auth_service import AuthService
+from app.services.password_hasher import LoginThrottled
 from app.api.auth.serializers import LoginSchema, UserSchema
 from app.utils.response_helpers import success_response, error_response
 from app.api.middleware.auth import token_required
@@ -18,7 +19,10 @@ class LoginResource(Resource):
             return error_response("Validation error", details=e.messages)
         
         auth_service = AuthService()
-        result = auth_service.authenticate(data['username'], data['password'])
+        try:
+            result = auth_service.authenticate(data['username'], data['password'])
+        except LoginThrottled:
+            return error_response("Too many concurrent login attempts", status_code=429)
         
         if result:
             return success_response(result)
@@ -1,11 +1,12 @@
 # app/api/auth/serializers.py
 from marshmallow import Schema, fields, validate
+from app.utils.metrics import TimedDumpMixin
 
 class LoginSchema(Schema):
     username = fields.Str(required=True, validate=validate.Length(min=1))
     password = fields.Str(required=True, validate=validate.Length(min=1))
 
-class UserSchema(Schema):
+class UserSchema(TimedDumpMixin, Schema):
     id = fields.Int(dump_only=True)
     username = fields.Str()
     role = fields.Str()
@@ -2,37 +2,104 @@
 from flask import Blueprint
 from flask_restful import Api, Resource, request
 from app.models.camera import Camera
-from app import db
+from app import db, socketio
 from app.api.cameras.serializers import CameraSchema, CameraCreateSchema, CameraUpdateSchema
-from app.utils.response_helpers import success_response, error_response, paginated_response
+from app.utils.response_helpers import success_response, error_response, paginated_response, cursor_response
+from app.utils.pagination import keyset_page, parse_sort, page_total, parse_page_args
 from app.api.middleware.auth import token_required
+from app.utils.conditional import (collection_validator, row_validator, is_not_modified,
+                                   not_modified_response, with_validator)
+from app.services.camera_batch import (parse_camera_ids, create_cameras, set_camera_status,
+                                       update_camera_settings, emit_status_changes)
+from app.services.activity_rollups import RESOLUTIONS, rollup_series
+from app.services.playback import parse_time
+from datetime import datetime, timedelta
 #from app.services.camera_discovery import CameraDiscoveryService
 import math
 
 cameras_bp = Blueprint('cameras', __name__, url_prefix='/api/cameras')
 cameras_api = Api(cameras_bp)
 
+CAMERA_SORT_KEYS = ('id', 'name', 'created_at')
+BATCH_MAX_SIZE = 1000
+ACTIVITY_MAX_BUCKETS = 1440
+
+def batch_records(data):
+    """Read the `cameras` list of a batch request body"""
+    records = data.get('cameras')
+    if not isinstance(records, list) or not records:
+        raise ValueError("cameras must be a non-empty list")
+    if len(records) > BATCH_MAX_SIZE:
+        raise ValueError(f"At most {BATCH_MAX_SIZE} cameras per request")
+    return records
+
+def status_results(camera_ids, updated, status, is_active):
+    """Per-camera outcome of a batch start or stop"""
+    found = set(updated)
+    results = [
+        {'id': camera_id, 'success': True, 'status': status, 'isActive': is_active}
+        if camera_id in found else
+        {'id': camera_id, 'success': False, 'error': 'Camera not found'}
+        for camera_id in camera_ids
+    ]
+    return {'results': results, 'succeeded': len(found), 'failed': len(camera_ids) - len(found)}
+
+def query_time(name, default):
+    """Epoch seconds/ms or ISO 8601 time from the query string"""
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return parse_time(float(value))
+    except ValueError:
+        return parse_time(value)
+
 class CameraListResource(Resource):
     @token_required
     def get(self, current_user):
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 20))
+        try:
+            page, per_page = parse_page_args(request.args)
+        except ValueError as e:
+            return error_response(str(e))
         status = request.args.get('status')
         
         query = Camera.query
         if status:
             query = query.filter_by(status=status)
         
-        total = query.count()
-        cameras = query.offset((page - 1) * per_page).limit(per_page).all()
+        # Polls that find nothing changed are answered before any row is loaded
+        validator = collection_validator(Camera, request.query_string.decode('utf-8', 'replace'))
+        if is_not_modified(validator):
+            return not_modified_response(validator)
         
         schema = CameraSchema(many=True)
-        return paginated_response(
+        
+        # Passing `cursor` (empty for the first page) switches to keyset pagination
+        cursor = request.args.get('cursor')
+        if cursor is not None:
+            try:
+                sort_key, descending = parse_sort(request.args.get('sort'), Camera, CAMERA_SORT_KEYS)
+                cameras, next_cursor = keyset_page(query, Camera, sort_key, descending, cursor, per_page)
+                total, is_estimate = page_total(query, Camera, request.args.get('total', 'none'), bool(status))
+            except ValueError as e:
+                return error_response(str(e))
+            return with_validator(cursor_response(
+                items={'cameras': schema.dump(cameras)},
+                per_page=per_page,
+                next_cursor=next_cursor,
+                total=total,
+                total_is_estimate=is_estimate
+            ), validator)
+        
+        total = query.order_by(None).count()
+        cameras = query.order_by(Camera.id).offset((page - 1) * per_page).limit(per_page).all()
+        
+        return with_validator(paginated_response(
             items={'cameras': schema.dump(cameras)},
             page=page,
             per_page=per_page,
             total=total
-        )
+        ), validator)
     
     @token_required
     def post(self, current_user):
@@ -54,11 +121,15 @@ class CameraListResource(Resource):
 class CameraDetailResource(Resource):
     @token_required
     def get(self, current_user, camera_id):
+        validator = row_validator(Camera, camera_id)
+        if validator is not None and is_not_modified(validator):
+            return not_modified_response(validator)
+        
         camera = Camera.query.get_or_404(camera_id)
         schema = CameraSchema()
-        return success_response({
+        return with_validator(success_response({
             'camera': schema.dump(camera)
-        })
+        }), validator)
     
     @token_required
     def put(self, current_user, camera_id):
@@ -135,6 +206,84 @@ class CameraSettingsResource(Resource):
             'camera': schema.dump(camera)
         })
 
+class CameraBatchResource(Resource):
+    @token_required
+    def post(self, current_user):
+        try:
+            records = batch_records(request.get_json() or {})
+        except ValueError as e:
+            return error_response(str(e))
+        
+        cameras, errors = create_cameras(records)
+        schema = CameraSchema(many=True)
+        return success_response({
+            'cameras': schema.dump(cameras),
+            'created': len(cameras),
+            'failed': len(errors),
+            'errors': errors
+        }, status_code=201 if cameras else 200)
+
+class CameraBatchSettingsResource(Resource):
+    @token_required
+    def put(self, current_user):
+        try:
+            records = batch_records(request.get_json() or {})
+        except ValueError as e:
+            return error_response(str(e))
+        
+        updated, errors = update_camera_settings(records)
+        return success_response({
+            'updated': updated,
+            'succeeded': len(updated),
+            'failed': len(errors),
+            'errors': errors
+        })
+
+class CameraBatchStartResource(Resource):
+    @token_required
+    def post(self, current_user):
+        try:
+            camera_ids = parse_camera_ids(request.get_json() or {}, BATCH_MAX_SIZE)
+        except ValueError as e:
+            return error_response(str(e))
+        
+        updated = set_camera_status(camera_ids, 'active', True)
+        emit_status_changes(socketio, updated, 'active', True, 'Camera streams starting...')
+        return success_response(status_results(camera_ids, updated, 'active', True))
+
+class CameraBatchStopResource(Resource):
+    @token_required
+    def post(self, current_user):
+        try:
+            camera_ids = parse_camera_ids(request.get_json() or {}, BATCH_MAX_SIZE)
+        except ValueError as e:
+            return error_response(str(e))
+        
+        updated = set_camera_status(camera_ids, 'inactive', False)
+        emit_status_changes(socketio, updated, 'inactive', False, 'Camera streams stopped')
+        return success_response(status_results(camera_ids, updated, 'inactive', False))
+
+class CameraActivityResource(Resource):
+    @token_required
+    def get(self, current_user, camera_id):
+        Camera.query.get_or_404(camera_id)
+        
+        resolution = request.args.get('resolution', '1m')
+        if resolution not in RESOLUTIONS:
+            return error_response(f"resolution must be one of {', '.join(RESOLUTIONS)}")
+        try:
+            end = query_time('end', datetime.utcnow())
+            start = query_time('start', end - timedelta(hours=24))
+        except ValueError as e:
+            return error_response(str(e))
+        if end <= start:
+            return error_response("end must be after start")
+        if (end - start).total_seconds() / RESOLUTIONS[resolution] > ACTIVITY_MAX_BUCKETS:
+            return error_response(f"At most {ACTIVITY_MAX_BUCKETS} buckets per request, use a coarser resolution")
+        
+        include_heatmap = request.args.get('heatmap', 'false').lower() == 'true'
+        return success_response(rollup_series(camera_id, resolution, start, end, include_heatmap))
+
 # class CameraDiscoverResource(Resource):
 #     @token_required
 #     def get(self, current_user):
@@ -146,8 +295,13 @@ class CameraSettingsResource(Resource):
 #         })
 
 cameras_api.add_resource(CameraListResource, '')
+cameras_api.add_resource(CameraBatchResource, '/batch')
+cameras_api.add_resource(CameraBatchSettingsResource, '/batch/settings')
+cameras_api.add_resource(CameraBatchStartResource, '/batch/start')
+cameras_api.add_resource(CameraBatchStopResource, '/batch/stop')
 cameras_api.add_resource(CameraDetailResource, '/<int:camera_id>')
 cameras_api.add_resource(CameraStartResource, '/<int:camera_id>/start')
 cameras_api.add_resource(CameraStopResource, '/<int:camera_id>/stop')
 cameras_api.add_resource(CameraSettingsResource, '/<int:camera_id>/settings')
+cameras_api.add_resource(CameraActivityResource, '/<int:camera_id>/activity')
 #cameras_api.add_resource(CameraDiscoverResource, '/discover')
\ No newline at end of file
@@ -2,12 +2,13 @@
 from marshmallow import Schema, fields, validate
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
 from app.models.camera import Camera
+from app.utils.metrics import TimedDumpMixin
 
 class ResolutionSchema(Schema):
     width = fields.Int()
     height = fields.Int()
 
-class CameraSchema(SQLAlchemyAutoSchema):
+class CameraSchema(TimedDumpMixin, SQLAlchemyAutoSchema):
     class Meta:
         model = Camera
         load_instance = True
@@ -43,4 +44,11 @@ class CameraUpdateSchema(Schema):
     name = fields.Str(validate=validate.Length(min=1, max=255))
     source = fields.Str(validate=validate.Regexp(r'^(rtsp://|http://|/dev/)'))
     camera_type = fields.Str(validate=validate.OneOf(['rtsp', 'webcam', 'usb']))
-    settings = fields.Raw()
\ No newline at end of file
+    settings = fields.Raw()
+
+class CameraSettingsSchema(Schema):
+    id = fields.Int(required=True)
+    resolution_width = fields.Int(validate=validate.Range(min=1))
+    resolution_height = fields.Int(validate=validate.Range(min=1))
+    fps = fields.Int(validate=validate.Range(min=1, max=240))
+    settings = fields.Dict()
\ No newline at end of file
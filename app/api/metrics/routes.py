@@ -0,0 +1,19 @@
+# app/api/metrics/routes.py
+from flask import Blueprint, Response, current_app
+from flask_restful import Api, Resource, request
+from app.utils.metrics import registry, CONTENT_TYPE
+from app.utils.response_helpers import error_response
+import hmac
+
+metrics_bp = Blueprint('metrics', __name__)
+metrics_api = Api(metrics_bp)
+
+class MetricsResource(Resource):
+    def get(self):
+        token = current_app.config.get('PROMETHEUS_METRICS_TOKEN')
+        if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return error_response("Invalid metrics token", status_code=401)
+        
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
+metrics_api.add_resource(MetricsResource, '/metrics')
@@ -1,60 +1,84 @@
 # app/api/middleware/auth.py
 from functools import wraps
+from typing import Optional
 from flask import request, current_app
 from flask_restful import abort
 from app.models.user import User
+from app.services.token_cache import token_cache, CachedUser
+from app.utils.metrics import TOKEN_CHECK_LATENCY
 import jwt
 import logging
 
 logger = logging.getLogger(__name__)
 
-def token_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = None
-        auth_header = request.headers.get('Authorization')
-        
-        if auth_header:
-            try:
-                token = auth_header.split(" ")[1]
-            except IndexError:
-                logger.error("Invalid token format")
-                abort(401, message="Invalid token format")
-        
-        if not token:
-            logger.error("Token is missing")
-            abort(401, message="Token is missing")
-        
+def authenticate_request():
+    """Return the CachedUser of the request's bearer token, aborting with 401"""
+    token = None
+    auth_header = request.headers.get('Authorization')
+    
+    if auth_header:
         try:
+            token = auth_header.split(" ")[1]
+        except IndexError:
+            logger.error("Invalid token format")
+            abort(401, message="Invalid token format")
+    
+    if not token:
+        logger.error("Token is missing")
+        abort(401, message="Token is missing")
+    
+    try:
+        # Tokens already verified are trusted until their exp
+        token_key = token_cache.token_key(token)
+        user_id = token_cache.get_token(token_key)
+        if user_id is None:
             data = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
             logger.debug(f"Decoded token data: {data}")
             user_id = data.get('sub', {}).get('user_id')
             if not user_id:
                 logger.error("No user_id found in token payload")
                 abort(401, message="Invalid token")
-            current_user = User.query.filter_by(id=user_id).first()
-            if not current_user:
+            if data.get('exp'):
+                token_cache.put_token(token_key, user_id, data['exp'])
+
+        current_user = token_cache.get_user(user_id)
+        if current_user is None:
+            user = User.query.filter_by(id=user_id).first()
+            if not user:
                 logger.error(f"No user found for user_id: {user_id}")
                 abort(401, message="Invalid token")
-            logger.debug(f"Current user: ID={current_user.id}, Username={current_user.username}, Role={current_user.role}")
-        except jwt.ExpiredSignatureError:
-            logger.error("Token has expired")
-            abort(401, message="Token has expired")
-        except jwt.InvalidTokenError as e:
-            logger.error(f"Invalid token error: {str(e)}")
-            abort(401, message="Invalid token")
+            current_user = CachedUser.from_model(user)
+            token_cache.put_user(current_user)
+        logger.debug(f"Current user: ID={current_user.id}, Username={current_user.username}, Role={current_user.role}")
+    except jwt.ExpiredSignatureError:
+        logger.error("Token has expired")
+        abort(401, message="Token has expired")
+    except jwt.InvalidTokenError as e:
+        logger.error(f"Invalid token error: {str(e)}")
+        abort(401, message="Invalid token")
+    
+    return current_user
+
+def token_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        with TOKEN_CHECK_LATENCY.time():
+            current_user = authenticate_request()
         
         return f(current_user=current_user, *args, **kwargs)
     
     return decorated
 
+def is_admin(role: Optional[str]) -> bool:
+    return bool(role) and role.strip().lower() == 'admin'
+
 def admin_required(f):
     @wraps(f)
     @token_required
     def decorated(*args, **kwargs):
         current_user = kwargs.get('current_user')
         logger.debug(f"Admin check - User: {current_user.id if current_user else 'None'}, Role: {current_user.role if current_user else 'None'}, Role type: {type(current_user.role) if current_user else 'None'}")
-        if not current_user or current_user.role.strip().lower() != 'admin':
+        if not current_user or not is_admin(current_user.role):
             logger.error(f"User {current_user.id if current_user else 'unknown'} is not an admin. Role: {current_user.role if current_user else 'None'}")
             abort(403, message="Admin access required")
         return f(*args, **kwargs)
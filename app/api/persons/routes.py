@@ -1,36 +1,98 @@
 # app/api/persons/routes.py
-from flask import Blueprint
+from flask import Blueprint, current_app, send_file
 from flask_restful import Api, Resource, request
-from app.models.person import Person
+from app.models.person import Person, Embedding
 from app import db
 from app.api.persons.serializers import PersonSchema, PersonCreateSchema
-from app.utils.response_helpers import success_response, error_response, paginated_response
+from app.utils.response_helpers import success_response, error_response, paginated_response, cursor_response
+from app.utils.pagination import keyset_page, parse_sort, page_total, parse_page_args
 from app.api.middleware.auth import token_required
+from app.utils.conditional import (collection_validator, row_validator, is_not_modified,
+                                   not_modified_response, with_validator)
+from app.services.person_search import person_search
+from app.services.vector_index import vector_search, decode_embedding
+from app.services.person_import import PersonImporter, iter_ndjson
+from app.services.thumbnails import thumbnail_cache
 
 persons_bp = Blueprint('persons', __name__, url_prefix='/api/persons')
 persons_api = Api(persons_bp)
 
+PERSON_SORT_KEYS = ('id', 'name', 'created_at')
+AUTOCOMPLETE_MAX_LIMIT = 50
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/jsonl', 'application/json-seq')
+BULK_CHUNK_SIZE = 500
+SIMILAR_MAX_K = 100
+
+def similar_persons(queries, k, min_score, exclude_person=None):
+    """Rank persons by embedding similarity and attach their names"""
+    index = vector_search.ensure_loaded()
+    matches = [match for match in index.search_persons(queries, k, exclude_person=exclude_person)
+               if match['score'] >= min_score]
+    names = dict(db.session.query(Person.id, Person.name).filter(
+        Person.id.in_([match['person_id'] for match in matches])
+    ).all()) if matches else {}
+    return [dict(match, name=names.get(match['person_id'])) for match in matches]
+
+def warm_thumbnails(persons):
+    """Start rendering the gallery thumbnails a listing is about to request"""
+    thumbnail_cache.warm([person.images[0] for person in persons if person.images], 'small')
+
+def send_thumbnail(thumbnail):
+    """Send a derivative; send_file opens it here, so a missing file raises"""
+    response = send_file(thumbnail.path, mimetype='image/jpeg', etag=thumbnail.etag,
+                         conditional=False, max_age=current_app.config['THUMBNAIL_MAX_AGE'])
+    response.cache_control.private = True
+    return response
+
 class PersonListResource(Resource):
     @token_required
     def get(self, current_user):
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 20))
+        try:
+            page, per_page = parse_page_args(request.args)
+        except ValueError as e:
+            return error_response(str(e))
         search = request.args.get('search')
         
+        # Passing `cursor` (empty for the first page) switches to keyset pagination
+        cursor = request.args.get('cursor')
+        
         query = Person.query
         if search:
-            query = query.filter(Person.name.ilike(f'%{search}%'))
+            # Best matches first, unless a cursor listing orders by its sort key
+            query = person_search.filter(query, search, ranked=cursor is None)
         
-        total = query.count()
-        persons = query.offset((page - 1) * per_page).limit(per_page).all()
+        validator = collection_validator(Person, request.query_string.decode('utf-8', 'replace'))
+        if is_not_modified(validator):
+            return not_modified_response(validator)
         
         schema = PersonSchema(many=True)
-        return paginated_response(
+        
+        if cursor is not None:
+            try:
+                sort_key, descending = parse_sort(request.args.get('sort'), Person, PERSON_SORT_KEYS)
+                persons, next_cursor = keyset_page(query, Person, sort_key, descending, cursor, per_page)
+                total, is_estimate = page_total(query, Person, request.args.get('total', 'none'), bool(search))
+            except ValueError as e:
+                return error_response(str(e))
+            warm_thumbnails(persons)
+            return with_validator(cursor_response(
+                items={'persons': schema.dump(persons)},
+                per_page=per_page,
+                next_cursor=next_cursor,
+                total=total,
+                total_is_estimate=is_estimate
+            ), validator)
+        
+        total = query.order_by(None).count()
+        persons = query.order_by(Person.id).offset((page - 1) * per_page).limit(per_page).all()
+        warm_thumbnails(persons)
+        
+        return with_validator(paginated_response(
             items={'persons': schema.dump(persons)},
             page=page,
             per_page=per_page,
             total=total
-        )
+        ), validator)
     
     @token_required
     def post(self, current_user):
@@ -49,14 +111,124 @@ class PersonListResource(Resource):
             'person': result_schema.dump(person)
         }, status_code=201)
 
+class PersonBulkResource(Resource):
+    @token_required
+    def post(self, current_user):
+        # NDJSON body, or an NDJSON file in a multipart upload; either way
+        # records are parsed as they are read
+        if request.mimetype == 'multipart/form-data':
+            upload = request.files.get('file')
+            if upload is None:
+                return error_response("file required")
+            stream = upload.stream
+        elif request.mimetype in NDJSON_MIMETYPES:
+            stream = request.stream
+        else:
+            return error_response("Send application/x-ndjson or a multipart file", status_code=415)
+        
+        importer = PersonImporter(chunk_size=BULK_CHUNK_SIZE)
+        result = importer.run(iter_ndjson(stream))
+        return success_response(result, status_code=201 if result['created'] else 200)
+
+class PersonAutocompleteResource(Resource):
+    @token_required
+    def get(self, current_user):
+        term = (request.args.get('q') or '').strip()
+        try:
+            limit = int(request.args.get('limit', 10))
+        except ValueError:
+            return error_response("limit must be an integer")
+        limit = max(1, min(limit, AUTOCOMPLETE_MAX_LIMIT))
+        if not term:
+            return success_response({'suggestions': []})
+        
+        return success_response({
+            'suggestions': person_search.autocomplete(term, limit)
+        })
+
+class PersonSimilarResource(Resource):
+    @token_required
+    def post(self, current_user):
+        # Onboarding duplicate check against raw embeddings
+        data = request.get_json() or {}
+        embeddings = data.get('embeddings') or ([data['embedding']] if data.get('embedding') else None)
+        if not embeddings:
+            return error_response("embedding or embeddings required")
+        
+        try:
+            matches = similar_persons(
+                embeddings,
+                min(int(data.get('k', 10)), SIMILAR_MAX_K),
+                float(data.get('min_score', 0.0))
+            )
+        except (TypeError, ValueError) as e:
+            return error_response("Invalid embedding", details=str(e))
+        
+        return success_response({'matches': matches})
+
+class PersonSimilarToResource(Resource):
+    @token_required
+    def get(self, current_user, person_id):
+        Person.query.get_or_404(person_id)
+        blobs = [row.embedding for row in db.session.query(Embedding.embedding).filter_by(person_id=person_id)]
+        if not blobs:
+            return success_response({'matches': []})
+        
+        matches = similar_persons(
+            [decode_embedding(blob) for blob in blobs],
+            min(int(request.args.get('k', 10)), SIMILAR_MAX_K),
+            float(request.args.get('min_score', 0.0)),
+            exclude_person=person_id
+        )
+        return success_response({'matches': matches})
+
+class PersonThumbnailResource(Resource):
+    @token_required
+    def get(self, current_user, person_id):
+        size = request.args.get('size', 'small')
+        try:
+            image_index = int(request.args.get('image', 0))
+        except ValueError:
+            return error_response("image must be an integer")
+        row = db.session.query(Person.images).filter_by(id=person_id).first()
+        if row is None:
+            return error_response("Person not found", status_code=404)
+        images = row.images or []
+        if not 0 <= image_index < len(images):
+            return error_response("Image not found", status_code=404)
+        
+        try:
+            etag = thumbnail_cache.etag(images[image_index], size)
+            # Revalidation costs a stat and never touches the derivative
+            if etag in request.if_none_match:
+                response = current_app.response_class(status=304)
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = f"private, max-age={current_app.config['THUMBNAIL_MAX_AGE']}"
+                return response
+            try:
+                response = send_thumbnail(thumbnail_cache.get(images[image_index], size))
+            except FileNotFoundError:
+                # Evicted between get() and send_file; get() renders it again
+                response = send_thumbnail(thumbnail_cache.get(images[image_index], size))
+        except ValueError as e:
+            return error_response(str(e))
+        except OSError:
+            return error_response("Image not found", status_code=404)
+        
+        return response
+
 class PersonDetailResource(Resource):
     @token_required
     def get(self, current_user, person_id):
+        validator = row_validator(Person, person_id)
+        if validator is not None and is_not_modified(validator):
+            return not_modified_response(validator)
+        
         person = Person.query.get_or_404(person_id)
         schema = PersonSchema()
-        return success_response({
+        return with_validator(success_response({
             'person': schema.dump(person)
-        })
+        }), validator)
     
     @token_required
     def put(self, current_user, person_id):
@@ -86,4 +258,9 @@ class PersonDetailResource(Resource):
         return success_response(message="Person deleted successfully")
 
 persons_api.add_resource(PersonListResource, '')
+persons_api.add_resource(PersonBulkResource, '/bulk')
+persons_api.add_resource(PersonAutocompleteResource, '/autocomplete')
+persons_api.add_resource(PersonSimilarResource, '/similar')
+persons_api.add_resource(PersonSimilarToResource, '/<int:person_id>/similar')
+persons_api.add_resource(PersonThumbnailResource, '/<int:person_id>/thumbnail')
 persons_api.add_resource(PersonDetailResource, '/<int:person_id>')
\ No newline at end of file
@@ -2,8 +2,9 @@
 from marshmallow import Schema, fields, validate
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
 from app.models.person import Person
+from app.utils.metrics import TimedDumpMixin
 
-class PersonSchema(SQLAlchemyAutoSchema):
+class PersonSchema(TimedDumpMixin, SQLAlchemyAutoSchema):
     class Meta:
         model = Person
         load_instance = True
@@ -2,11 +2,13 @@
 from flask import Blueprint
 from flask_restful import Api, Resource, request
 from app.models.system_config import SystemConfig
-from app import db
+from app import db, socketio
 from app.api.system.serializers import SystemConfigSchema
 from app.utils.response_helpers import success_response, error_response
-from app.api.middleware.auth import token_required, admin_required
-import time
+from app.api.middleware.auth import token_required, admin_required, is_admin
+from app.utils.conditional import collection_validator, is_not_modified, not_modified_response, with_validator
+from app.services.token_cache import token_cache
+from app.services.system_metrics import metrics_sampler, status_summary
 
 system_bp = Blueprint('system', __name__, url_prefix='/api/system')
 system_api = Api(system_bp)
@@ -14,15 +16,19 @@ system_api = Api(system_bp)
 class SystemConfigResource(Resource):
     @token_required
     def get(self, current_user):
+        validator = collection_validator(SystemConfig)
+        if is_not_modified(validator):
+            return not_modified_response(validator)
+        
         configs = SystemConfig.query.all()
         config_dict = {}
         
         for config in configs:
             config_dict[config.key] = config.value
         
-        return success_response({
+        return with_validator(success_response({
             'config': config_dict
-        })
+        }), validator)
     
     @admin_required
     def put(self, current_user):
@@ -57,26 +63,39 @@ class SystemConfigResource(Resource):
 class SystemStatusResource(Resource):
     @token_required
     def get(self, current_user):
-        # Mock system status - in real implementation, integrate with monitoring
-        status = {
-            'services': [
-                {'name': 'gui-service', 'status': 'running', 'health': 'healthy'},
-                {'name': 'detection-service', 'status': 'running', 'health': 'healthy'},
-                {'name': 'recognition-service', 'status': 'running', 'health': 'healthy'},
-                {'name': 'database', 'status': 'running', 'health': 'healthy'},
-                {'name': 'kafka', 'status': 'running', 'health': 'healthy'}
-            ],
-            'performance': {
-                'cpuUsage': 25.5,
-                'memoryUsage': 68.2,
-                'gpuUsage': 45.0,
-                'diskUsage': 23.1
-            },
-            'timestamp': int(time.time())
-        }
+        sample = metrics_sampler.latest()
+        if sample is None:
+            return error_response("System metrics not collected yet", status_code=503)
+        
+        detailed = is_admin(current_user.role)
+        history = request.args.get('history', 0, type=int)
+        if history > 0 and not detailed:
+            return error_response("Admin access required for metrics history", status_code=403)
+        
+        status = status_summary(sample, detailed=detailed)
+        if history > 0:
+            status['history'] = metrics_sampler.history(history)
         
         return success_response(status)
 
+class SystemClientsResource(Resource):
+    @admin_required
+    def get(self, current_user):
+        manager = socketio.server.manager if socketio.server else None
+        clients = manager.client_stats() if hasattr(manager, 'client_stats') else []
+        
+        return success_response({
+            'clients': clients,
+            'total_dropped': sum(client['dropped'] for client in clients)
+        })
+
+class SystemAuthCacheResource(Resource):
+    @admin_required
+    def get(self, current_user):
+        return success_response({
+            'auth_cache': token_cache.get_stats()
+        })
+
 class SystemResetResource(Resource):
     @admin_required
     def post(self, current_user):
@@ -98,4 +117,6 @@ class SystemResetResource(Resource):
 
 system_api.add_resource(SystemConfigResource, '/config')
 system_api.add_resource(SystemStatusResource, '/status')
+system_api.add_resource(SystemClientsResource, '/clients')
+system_api.add_resource(SystemAuthCacheResource, '/auth-cache')
 system_api.add_resource(SystemResetResource, '/reset')
\ No newline at end of file
@@ -5,6 +5,11 @@ from datetime import datetime
 
 class Person(db.Model):
     __tablename__ = 'persons'
+    __table_args__ = (
+        # Keyset pagination seeks on (sort key, id)
+        db.Index('ix_persons_name_id', 'name', 'id'),
+        db.Index('ix_persons_created_at_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
@@ -17,6 +22,10 @@ class Person(db.Model):
 
 class Embedding(db.Model):
     __tablename__ = 'embeddings'
+    __table_args__ = (
+        # Snapshot loads re-read rows created shortly before the snapshot
+        db.Index('ix_embeddings_created_at', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     person_id = db.Column(db.Integer, db.ForeignKey('persons.id', ondelete='CASCADE'))
@@ -0,0 +1,19 @@
+# gui-service/app/models/rollup.py
+
+from app import db
+from datetime import datetime
+
+class ActivityRollup(db.Model):
+    """Per-camera activity in one time bucket, merged in by ActivityRollups"""
+    __tablename__ = 'activity_rollups'
+
+    camera_id = db.Column(db.Integer, primary_key=True)
+    resolution = db.Column(db.String(8), primary_key=True)  # '1m', '15m', '1h'
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    detections = db.Column(db.BigInteger, default=0)
+    track_points = db.Column(db.BigInteger, default=0)
+    unique_tracks = db.Column(db.Integer, default=0)
+    # uint32 counts of track bbox centres, row-major grid_size x grid_size
+    grid_size = db.Column(db.Integer, nullable=False)
+    heatmap = db.Column(db.LargeBinary, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,10 @@
+# gui-service/app/models/table_version.py
+
+from app import db
+
+class TableVersion(db.Model):
+    """Write counter of a table, bumped after every commit that changed it"""
+    __tablename__ = 'table_versions'
+
+    table_name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
\ No newline at end of file
@@ -0,0 +1,35 @@
+# gui-service/app/models/track.py
+
+from app import db
+
+# Append-only time series written by the bridge's TrackWriter. On PostgreSQL
+# they are range-partitioned by day on `timestamp`, so retention drops whole
+# partitions. There is no surrogate key: a primary key on a partitioned
+# table would have to include `timestamp`, and rows are only ever read by
+# (camera_id, timestamp) range.
+
+tracks = db.Table(
+    'tracks', db.metadata,
+    db.Column('camera_id', db.Integer, nullable=False),
+    db.Column('track_id', db.String(255)),
+    db.Column('person_id', db.Integer),
+    db.Column('bbox', db.JSON),
+    db.Column('confidence', db.Float),
+    db.Column('timestamp', db.DateTime, nullable=False),
+    db.Column('metadata', db.JSON),
+    db.Index('ix_tracks_camera_timestamp', 'camera_id', 'timestamp'),
+    postgresql_partition_by='RANGE (timestamp)'
+)
+
+recognitions = db.Table(
+    'recognitions', db.metadata,
+    db.Column('camera_id', db.Integer, nullable=False),
+    db.Column('track_id', db.String(255)),
+    db.Column('person_id', db.Integer),
+    db.Column('name', db.String(255)),
+    db.Column('bbox', db.JSON),
+    db.Column('confidence', db.Float),
+    db.Column('timestamp', db.DateTime, nullable=False),
+    db.Index('ix_recognitions_camera_timestamp', 'camera_id', 'timestamp'),
+    postgresql_partition_by='RANGE (timestamp)'
+)
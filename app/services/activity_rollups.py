@@ -0,0 +1,283 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import tuple_
+from app import db
+from app.models.camera import Camera
+from app.models.rollup import ActivityRollup
+
+logger = logging.getLogger(__name__)
+
+# Bucket widths in seconds; only minutes are accumulated live, coarser
+# buckets are folded from them at flush time
+RESOLUTIONS = {'1m': 60, '15m': 900, '1h': 3600}
+# Buckets stay open this long after they end, for late records
+LATE_GRACE = 120
+DEFAULT_FRAME_SIZE = (1920, 1080)
+MERGE_CHUNK = 500
+EPOCH = datetime(1970, 1, 1)
+
+
+class MinuteDelta:
+    """Activity of one camera minute since the last flush"""
+    __slots__ = ('detections', 'points', 'track_ids', 'cells')
+
+    def __init__(self):
+        self.detections = 0
+        self.points = 0
+        self.track_ids = set()
+        self.cells: List[int] = []
+
+
+def record_seconds(timestamp) -> float:
+    """Epoch seconds of a record timestamp given in seconds or ms"""
+    timestamp = float(timestamp)
+    return timestamp / 1000.0 if timestamp > 1e11 else timestamp
+
+
+class ActivityRollups:
+    """Incremental per-camera activity rollups fed from the bridge
+
+    Each record costs a dict lookup and a few appends under a lock: item
+    counts, the distinct track_ids and the heatmap cell of every track's
+    bbox centre for its minute. Every `flush_interval` seconds the minutes
+    are folded into 1 min, 15 min and 1 h buckets, heatmaps are built with
+    np.bincount, and the deltas are merged additively into activity_rollups.
+    Track ids are de-duplicated per bucket within this process, so unique
+    counts assume each camera's records reach a single bridge process.
+    """
+
+    def __init__(self, grid_size: int = 32, flush_interval: float = 10.0):
+        self.app = None
+        self.grid_size = grid_size
+        self.flush_interval = flush_interval
+        self.pending: Dict[Tuple[int, int], MinuteDelta] = {}
+        self.lock = threading.Lock()
+        # Track ids already counted per open (camera, resolution, bucket)
+        self.seen: Dict[Tuple[int, str, int], set] = {}
+        # Rows of a failed merge, retried with the next flush
+        self.unmerged: Dict[Tuple[int, str, int], list] = {}
+        self.frame_sizes: Dict[str, Tuple[int, int]] = {}
+        self.running = False
+        self.thread = None
+        self.stats = {'records': 0, 'flushes': 0, 'rows_merged': 0, 'failures': 0, 'last_flush_ms': 0.0}
+
+    def configure(self, app, grid_size: int, flush_interval: float):
+        self.app = app
+        self.grid_size = grid_size
+        self.flush_interval = flush_interval
+
+    def add_detections(self, camera_id, timestamp, count: int):
+        key = self._minute_key(camera_id, timestamp)
+        if key is None:
+            return
+        with self.lock:
+            self._delta(key).detections += count
+
+    def add_tracks(self, camera_id, timestamp, items: List[Dict[str, Any]]):
+        key = self._minute_key(camera_id, timestamp)
+        if key is None:
+            return
+        width, height = self.frame_sizes.get(str(key[0]), DEFAULT_FRAME_SIZE)
+        grid = self.grid_size
+        track_ids, cells = [], []
+        for track in items:
+            if track.get('track_id') is not None:
+                track_ids.append(track['track_id'])
+            bbox = track.get('bbox')
+            if not isinstance(bbox, dict):
+                continue
+            try:
+                cx = float(bbox.get('x', 0)) + float(bbox.get('width', 0)) / 2
+                cy = float(bbox.get('y', 0)) + float(bbox.get('height', 0)) / 2
+            except (TypeError, ValueError):
+                continue
+            if cx > 1.0 or cy > 1.0:
+                # Pixel coordinates rather than normalised ones
+                cx, cy = cx / width, cy / height
+            if 0.0 <= cx <= 1.0 and 0.0 <= cy <= 1.0:
+                cells.append(min(int(cy * grid), grid - 1) * grid + min(int(cx * grid), grid - 1))
+
+        with self.lock:
+            delta = self._delta(key)
+            delta.points += len(items)
+            delta.track_ids.update(track_ids)
+            delta.cells.extend(cells)
+
+    @staticmethod
+    def _minute_key(camera_id, timestamp) -> Optional[Tuple[int, int]]:
+        try:
+            return int(camera_id), int(record_seconds(timestamp) // 60) * 60
+        except (TypeError, ValueError):
+            return None
+
+    def _delta(self, key: Tuple[int, int]) -> MinuteDelta:
+        """Pending delta for a camera minute; the caller holds the lock"""
+        self.stats['records'] += 1
+        delta = self.pending.get(key)
+        if delta is None:
+            delta = self.pending[key] = MinuteDelta()
+        return delta
+
+    def start(self):
+        if self.running:
+            return
+        if self.app is None:
+            raise RuntimeError("ActivityRollups.configure() must be called before start()")
+        self.running = True
+        self.thread = threading.Thread(target=self._flush_loop, name='activity-rollups')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Stop the flush thread and merge what is still pending"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=10)
+            self.thread = None
+        with self.app.app_context():
+            self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return dict(self.stats, pending_minutes=len(self.pending), open_buckets=len(self.seen))
+
+    def _flush_loop(self):
+        while self.running:
+            time.sleep(self.flush_interval)
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing activity rollups: {str(e)}")
+
+    def flush(self) -> int:
+        """Fold pending minutes into buckets and merge them into the database"""
+        started = time.monotonic()
+        with self.lock:
+            pending, self.pending = self.pending, {}
+
+        rows, self.unmerged = self.unmerged, {}
+        cells = self.grid_size * self.grid_size
+        for (camera_id, minute), delta in pending.items():
+            heat = np.bincount(np.asarray(delta.cells, dtype=np.int64), minlength=cells).astype(np.uint32) \
+                if delta.cells else None
+            for resolution, width in RESOLUTIONS.items():
+                key = (camera_id, resolution, minute // width * width)
+                seen = self.seen.setdefault(key, set())
+                new_tracks = delta.track_ids - seen
+                seen |= new_tracks
+
+                row = rows.get(key)
+                if row is None:
+                    row = rows[key] = [0, 0, 0, np.zeros(cells, dtype=np.uint32)]
+                row[0] += delta.detections
+                row[1] += delta.points
+                row[2] += len(new_tracks)
+                if heat is not None:
+                    row[3] += heat
+
+        # Forget buckets that can no longer receive records
+        now = time.time()
+        self.seen = {key: ids for key, ids in self.seen.items()
+                     if key[2] + RESOLUTIONS[key[1]] + LATE_GRACE > now}
+
+        if rows:
+            try:
+                self._merge(rows)
+                self.stats['rows_merged'] += len(rows)
+            except Exception as e:
+                db.session.rollback()
+                self.unmerged = rows
+                self.stats['failures'] += 1
+                logger.warning(f"Merging {len(rows)} activity rollups failed, will retry: {str(e)}")
+        self._refresh_frame_sizes()
+
+        self.stats['flushes'] += 1
+        self.stats['last_flush_ms'] = round((time.monotonic() - started) * 1000, 2)
+        return len(rows)
+
+    def _merge(self, rows: Dict[Tuple[int, str, int], list]):
+        keys = [(camera_id, resolution, EPOCH + timedelta(seconds=start))
+                for camera_id, resolution, start in rows]
+        existing = {}
+        for offset in range(0, len(keys), MERGE_CHUNK):
+            chunk = keys[offset:offset + MERGE_CHUNK]
+            for rollup in ActivityRollup.query.filter(
+                tuple_(ActivityRollup.camera_id, ActivityRollup.resolution, ActivityRollup.bucket_start).in_(chunk)
+            ).with_for_update():
+                existing[(rollup.camera_id, rollup.resolution, rollup.bucket_start)] = rollup
+
+        for key, (detections, points, unique_tracks, heat) in zip(keys, rows.values()):
+            rollup = existing.get(key)
+            if rollup is None:
+                db.session.add(ActivityRollup(
+                    camera_id=key[0], resolution=key[1], bucket_start=key[2],
+                    detections=detections, track_points=points, unique_tracks=unique_tracks,
+                    grid_size=self.grid_size, heatmap=heat.astype('<u4').tobytes()
+                ))
+                continue
+
+            rollup.detections += detections
+            rollup.track_points += points
+            rollup.unique_tracks += unique_tracks
+            if rollup.grid_size == self.grid_size:
+                heat = heat + np.frombuffer(rollup.heatmap, dtype='<u4')
+            else:
+                rollup.grid_size = self.grid_size
+            rollup.heatmap = heat.astype('<u4').tobytes()
+        db.session.commit()
+
+    def _refresh_frame_sizes(self):
+        try:
+            rows = db.session.query(Camera.id, Camera.resolution_width, Camera.resolution_height).all()
+        except Exception:
+            db.session.rollback()
+            return
+        self.frame_sizes = {str(camera_id): (width or DEFAULT_FRAME_SIZE[0], height or DEFAULT_FRAME_SIZE[1])
+                            for camera_id, width, height in rows}
+
+
+def rollup_series(camera_id: int, resolution: str, start: datetime, end: datetime,
+                  include_heatmap: bool) -> Dict[str, Any]:
+    """Read stored buckets in [start, end); cost grows with buckets, not records"""
+    query = ActivityRollup.query.filter(
+        ActivityRollup.camera_id == camera_id,
+        ActivityRollup.resolution == resolution,
+        ActivityRollup.bucket_start >= start,
+        ActivityRollup.bucket_start < end
+    ).order_by(ActivityRollup.bucket_start)
+    if not include_heatmap:
+        query = query.with_entities(ActivityRollup.bucket_start, ActivityRollup.detections,
+                                    ActivityRollup.track_points, ActivityRollup.unique_tracks)
+
+    series = []
+    heatmap = None
+    grid_size = None
+    for row in query:
+        series.append({
+            'bucket': row.bucket_start.isoformat() + 'Z',
+            'detections': row.detections,
+            'trackPoints': row.track_points,
+            'uniqueTracks': row.unique_tracks
+        })
+        if include_heatmap:
+            counts = np.frombuffer(row.heatmap, dtype='<u4').astype(np.uint64)
+            if heatmap is None:
+                heatmap, grid_size = counts, row.grid_size
+            elif row.grid_size == grid_size:
+                heatmap += counts
+
+    result = {'camera_id': camera_id, 'resolution': resolution, 'buckets': series}
+    if include_heatmap:
+        result['heatmap'] = {
+            'gridSize': grid_size,
+            'counts': heatmap.reshape(grid_size, grid_size).tolist() if heatmap is not None else []
+        }
+    return result
+
+
+activity_rollups = ActivityRollups()
@@ -1,14 +1,15 @@
 # gui-service/app/services/auth_service.py
 
 from app.models.user import User
-from app import db, bcrypt
+from app import db
+from app.services.password_hasher import password_hasher
 from app.utils.jwt_helper import generate_jwt
 from datetime import datetime
 
 class AuthService:
     def authenticate(self, username: str, password: str):
         user = User.query.filter_by(username=username).first()
-        if user and bcrypt.check_password_hash(user.password_hash, password):
+        if user and password_hasher.check(username, user.password_hash, password):
             user.last_login = datetime.utcnow()
             db.session.commit()
             token = generate_jwt(user.id, user.username, user.role)
@@ -18,7 +19,7 @@ class AuthService:
     def create_user(self, username: str, password: str, role: str = 'viewer'):
         if User.query.filter_by(username=username).first():
             return None
-        password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        password_hash = password_hasher.generate(password)
         user = User(username=username, password_hash=password_hash, role=role)
         db.session.add(user)
         db.session.commit()
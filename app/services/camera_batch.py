@@ -0,0 +1,127 @@
+import json
+import logging
+from typing import Dict, Any, Iterable, List, Tuple
+from marshmallow import ValidationError
+from sqlalchemy import insert, update
+from app import db
+from app.models.camera import Camera
+from app.api.cameras.serializers import CameraCreateSchema, CameraSettingsSchema
+
+logger = logging.getLogger(__name__)
+
+
+def parse_camera_ids(data: Dict[str, Any], max_size: int) -> List[int]:
+    """Read a de-duplicated `camera_ids` list from a request body"""
+    camera_ids = data.get('camera_ids')
+    if not isinstance(camera_ids, list) or not camera_ids:
+        raise ValueError("camera_ids must be a non-empty list")
+    if len(camera_ids) > max_size:
+        raise ValueError(f"At most {max_size} cameras per request")
+    if not all(isinstance(camera_id, int) and not isinstance(camera_id, bool) for camera_id in camera_ids):
+        raise ValueError("camera_ids must be integers")
+    return list(dict.fromkeys(camera_ids))
+
+
+def create_cameras(records: List[Any]) -> Tuple[List[Camera], List[Dict[str, Any]]]:
+    """Validate and insert cameras in one executemany
+
+    Returns the created cameras in input order and one error entry per
+    invalid record, keyed by its index in `records`.
+    """
+    schema = CameraCreateSchema()
+    valid, errors = [], []
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            errors.append({'index': index, 'errors': "Record must be a JSON object"})
+            continue
+        try:
+            valid.append(schema.load(record))
+        except ValidationError as e:
+            errors.append({'index': index, 'errors': e.messages})
+
+    if not valid:
+        return [], errors
+
+    cameras = db.session.scalars(
+        insert(Camera).returning(Camera, sort_by_parameter_order=True), valid
+    ).all()
+    db.session.commit()
+    return cameras, errors
+
+
+def set_camera_status(camera_ids: Iterable[int], status: str, is_active: bool) -> List[int]:
+    """Set status on many cameras with one UPDATE; returns the ids that exist"""
+    updated = db.session.scalars(
+        update(Camera)
+        .where(Camera.id.in_(list(camera_ids)))
+        .values(status=status, is_active=is_active)
+        .returning(Camera.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.session.commit()
+    return updated
+
+
+def update_camera_settings(records: List[Any]) -> Tuple[List[int], List[Dict[str, Any]]]:
+    """Apply per-camera settings, one UPDATE per distinct set of changes
+
+    Cameras given identical changes share a single `WHERE id IN (...)`
+    statement, and all statements run in one transaction. Returns the
+    updated ids and one error entry per invalid record or unknown id.
+    """
+    schema = CameraSettingsSchema()
+    groups: Dict[str, Tuple[Dict[str, Any], Dict[int, int]]] = {}
+    errors = []
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            errors.append({'index': index, 'errors': "Record must be a JSON object"})
+            continue
+        try:
+            changes = schema.load(record)
+        except ValidationError as e:
+            errors.append({'index': index, 'id': record.get('id'), 'errors': e.messages})
+            continue
+        camera_id = changes.pop('id')
+        if not changes:
+            errors.append({'index': index, 'id': camera_id, 'errors': "No settings given"})
+            continue
+        key = json.dumps(changes, sort_keys=True)
+        groups.setdefault(key, (changes, {}))[1][camera_id] = index
+
+    updated = []
+    for changes, camera_ids in groups.values():
+        updated.extend(db.session.scalars(
+            update(Camera)
+            .where(Camera.id.in_(list(camera_ids)))
+            .values(**changes)
+            .returning(Camera.id)
+            .execution_options(synchronize_session=False)
+        ).all())
+    db.session.commit()
+
+    found = set(updated)
+    for changes, camera_ids in groups.values():
+        for camera_id, index in camera_ids.items():
+            if camera_id not in found:
+                errors.append({'index': index, 'id': camera_id, 'errors': "Camera not found"})
+    if len(groups) > 1:
+        logger.debug(f"Updated settings of {len(found)} cameras in {len(groups)} statements")
+    return updated, errors
+
+
+def emit_status_changes(socketio, camera_ids: List[int], status: str, is_active: bool, message: str):
+    """Tell every affected camera room about a batch of status changes
+
+    One `camera_status_changed` event is addressed to all the rooms at once,
+    so a client watching many of the cameras receives it a single time.
+    """
+    if not camera_ids:
+        return
+    socketio.emit('camera_status_changed', {
+        'cameras': [{'camera_id': camera_id, 'status': status, 'is_active': is_active}
+                    for camera_id in camera_ids],
+        'count': len(camera_ids),
+        'status': status,
+        'is_active': is_active,
+        'message': message
+    }, to=[f'camera_{camera_id}' for camera_id in camera_ids])
@@ -0,0 +1,364 @@
+import fcntl
+import logging
+import os
+import struct
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+import numpy as np
+from sqlalchemy import select, func, or_
+from app import db
+from app.models.person import Embedding
+from app.services.vector_index import VectorIndex, decode_embedding, normalize
+
+logger = logging.getLogger(__name__)
+
+# File layout, every section 64-byte aligned and sized for `capacity` rows
+# of which the first `count` are used:
+#   header          magic, version, dim, capacity, count,
+#                   high-water mark on embeddings.id, created_at
+#   int64[capacity] embedding ids
+#   int64[capacity] person ids
+#   float32[capacity, dim] L2-normalised vectors
+MAGIC = b'EMBSNAP1'
+VERSION = 1
+HEADER = struct.Struct('<8sIIQQqd')
+ALIGN = 64
+# Ids are assigned before commit, so a row below the high-water mark can
+# become visible after the snapshot read past it. Rows created this long
+# before a snapshot are read again and added if the snapshot lacks them.
+OVERLAP = timedelta(minutes=10)
+
+# Embedding rows are immutable: the recognition service inserts and deletes
+# them but never updates one in place, so a row the snapshot holds is never
+# re-read. A changed embedding must be written as a new row.
+
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _layout(capacity: int, dim: int):
+    ids_offset = _aligned(HEADER.size)
+    persons_offset = _aligned(ids_offset + 8 * capacity)
+    matrix_offset = _aligned(persons_offset + 8 * capacity)
+    return ids_offset, persons_offset, matrix_offset, matrix_offset + 4 * capacity * dim
+
+
+class EmbeddingSnapshot(NamedTuple):
+    """Read-only view of a snapshot file; the arrays are memory maps"""
+    path: str
+    dim: int
+    count: int
+    high_water_mark: int
+    created_at: float
+    embedding_ids: np.ndarray
+    person_ids: np.ndarray
+    matrix: np.ndarray
+
+
+def open_snapshot(path: str) -> Optional[EmbeddingSnapshot]:
+    """Map a snapshot file, or return None if it is missing or unreadable
+
+    Pages are mapped read-only from the page cache, so every worker that
+    opens the same file shares one copy of the matrix.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        logger.error(f"Embedding snapshot {path} is truncated")
+        return None
+    magic, version, dim, capacity, count, high_water_mark, created_at = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        logger.error(f"Embedding snapshot {path} has an unknown format")
+        return None
+
+    ids_offset, persons_offset, matrix_offset, size = _layout(capacity, dim)
+    if os.path.getsize(path) < size:
+        logger.error(f"Embedding snapshot {path} is truncated")
+        return None
+
+    def mapped(dtype, offset, shape):
+        if not count:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(capacity,) + shape[1:])[:count]
+
+    return EmbeddingSnapshot(
+        path, dim, count, high_water_mark, created_at,
+        mapped(np.int64, ids_offset, (count,)),
+        mapped(np.int64, persons_offset, (count,)),
+        mapped(np.float32, matrix_offset, (count, dim))
+    )
+
+
+def create_indexes():
+    """Add the Embedding indexes to tables created before they existed"""
+    try:
+        for index in Embedding.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+    except Exception as e:
+        logger.error(f"Could not create embedding indexes: {str(e)}")
+
+
+def _overlap_since(snapshot: Optional[EmbeddingSnapshot]) -> Optional[datetime]:
+    if snapshot is None:
+        return None
+    return datetime.utcfromtimestamp(snapshot.created_at) - OVERLAP
+
+
+def _tail_filter(after_id: int, since: Optional[datetime]):
+    """Rows past the mark, plus rows created since `since` that may have committed late"""
+    if since is None:
+        return Embedding.id > after_id
+    return or_(Embedding.id > after_id, Embedding.created_at >= since)
+
+
+def _tail_rows(after_id: int, up_to_id: Optional[int], batch_size: int, since: Optional[datetime] = None):
+    """Stream (id, person_id, vector) rows past after_id (see _tail_filter) up to up_to_id"""
+    statement = select(Embedding.id, Embedding.person_id, Embedding.embedding).where(_tail_filter(after_id, since))
+    if up_to_id is not None:
+        statement = statement.where(Embedding.id <= up_to_id)
+    statement = statement.order_by(Embedding.id).execution_options(yield_per=batch_size)
+    for embedding_id, person_id, blob in db.session.execute(statement):
+        yield embedding_id, person_id or 0, decode_embedding(blob)
+
+
+def _live_ids(up_to_id: int) -> np.ndarray:
+    """Ids at or below the high-water mark that still exist"""
+    rows = db.session.execute(select(Embedding.id).where(Embedding.id <= up_to_id).order_by(Embedding.id))
+    return np.fromiter((row[0] for row in rows), dtype=np.int64)
+
+
+def write_snapshot(path: str, batch_size: int = 10000) -> EmbeddingSnapshot:
+    """Write or refresh the snapshot at `path` from the embeddings table
+
+    Rows the current snapshot already holds are copied from its mapping
+    (dropping deleted ones), and only rows past its high-water mark, or
+    created within OVERLAP of it, are read from the database, in batches.
+    The file is written next to the old one and swapped in with os.replace,
+    so readers keep a consistent mapping.
+    """
+    # Taken before the read so the next overlap starts early enough
+    started = time.time()
+    previous = open_snapshot(path)
+    high_water_mark = db.session.execute(select(func.max(Embedding.id))).scalar() or 0
+    after_id = previous.high_water_mark if previous else 0
+    since = _overlap_since(previous)
+
+    kept = np.empty(0, dtype=np.int64)
+    known = np.empty(0, dtype=np.int64)
+    if previous and previous.count:
+        kept = np.flatnonzero(np.isin(previous.embedding_ids, _live_ids(after_id), assume_unique=True))
+        known = np.sort(previous.embedding_ids)
+    tail_count = db.session.execute(
+        select(func.count()).select_from(Embedding).where(_tail_filter(after_id, since), Embedding.id <= high_water_mark)
+    ).scalar()
+
+    dim = previous.dim if previous and previous.count else None
+    if dim is None:
+        first = db.session.execute(select(Embedding.embedding).order_by(Embedding.id).limit(1)).scalar()
+        dim = len(decode_embedding(first)) if first is not None else 0
+
+    # Rows deleted while streaming leave unused capacity at the end
+    capacity = len(kept) + tail_count
+    ids_offset, persons_offset, matrix_offset, size = _layout(capacity, dim)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.truncate(size)
+
+    written = 0
+    if capacity:
+        embedding_ids = np.memmap(temp_path, dtype=np.int64, mode='r+', offset=ids_offset, shape=(capacity,))
+        person_ids = np.memmap(temp_path, dtype=np.int64, mode='r+', offset=persons_offset, shape=(capacity,))
+        matrix = np.memmap(temp_path, dtype=np.float32, mode='r+', offset=matrix_offset, shape=(capacity, dim))
+
+        for start in range(0, len(kept), batch_size):
+            rows = kept[start:start + batch_size]
+            embedding_ids[written:written + len(rows)] = previous.embedding_ids[rows]
+            person_ids[written:written + len(rows)] = previous.person_ids[rows]
+            matrix[written:written + len(rows)] = previous.matrix[rows]
+            written += len(rows)
+
+        batch = []
+
+        def write_batch():
+            nonlocal written
+            if batch:
+                rows = slice(written, written + len(batch))
+                embedding_ids[rows] = [row[0] for row in batch]
+                person_ids[rows] = [row[1] for row in batch]
+                matrix[rows] = normalize(np.vstack([row[2] for row in batch]))
+                written += len(batch)
+                batch.clear()
+
+        for embedding_id, person_id, vector in _tail_rows(after_id, high_water_mark, batch_size, since):
+            if embedding_id <= after_id and _contains(known, embedding_id):
+                continue
+            if len(vector) != dim:
+                logger.warning(f"Skipping embedding {embedding_id} with dimension {len(vector)}")
+                continue
+            if written + len(batch) == capacity:
+                # A row committed after the count; stop the mark before it
+                # so the next refresh or load reads it
+                last_id = batch[-1][0] if batch else int(embedding_ids[written - 1])
+                high_water_mark = max(after_id, last_id)
+                break
+            batch.append((embedding_id, person_id, vector))
+            if len(batch) == batch_size:
+                write_batch()
+        write_batch()
+
+        for array in (embedding_ids, person_ids, matrix):
+            array.flush()
+        del embedding_ids, person_ids, matrix
+
+    # Header goes last so a crash never leaves a valid-looking partial file
+    with open(temp_path, 'r+b') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, dim, capacity, written, high_water_mark, started))
+    os.replace(temp_path, path)
+
+    logger.info(f"Wrote embedding snapshot {path}: {written} vectors, "
+                f"{tail_count} read from the database, high-water mark {high_water_mark}")
+    return open_snapshot(path)
+
+
+def _contains(sorted_ids: np.ndarray, embedding_id: int) -> bool:
+    position = np.searchsorted(sorted_ids, embedding_id)
+    return position < len(sorted_ids) and sorted_ids[position] == embedding_id
+
+
+def load_index(index: VectorIndex, path: str, batch_size: int = 10000) -> bool:
+    """Open a snapshot as the index base and catch up from the database
+
+    Returns False when there is no usable snapshot. Embeddings deleted since
+    the snapshot are dropped, and rows past its high-water mark, or that
+    committed late below it, are read from the database into the in-memory
+    tail.
+    """
+    snapshot = open_snapshot(path)
+    if snapshot is None:
+        return False
+
+    index.load(snapshot.embedding_ids, snapshot.person_ids, snapshot.matrix, normalized=True)
+
+    tail = 0
+    late = 0
+    batch = []
+    for row in _tail_rows(snapshot.high_water_mark, None, batch_size, _overlap_since(snapshot)):
+        if row[0] <= snapshot.high_water_mark:
+            if row[0] in index.positions:
+                continue
+            late += 1
+        if snapshot.dim and len(row[2]) != snapshot.dim:
+            logger.warning(f"Skipping embedding {row[0]} with dimension {len(row[2])}")
+            continue
+        batch.append(row)
+        if len(batch) == batch_size:
+            tail += _add_batch(index, batch)
+    tail += _add_batch(index, batch)
+
+    live_count = db.session.execute(
+        select(func.count()).select_from(Embedding).where(Embedding.id <= snapshot.high_water_mark)
+    ).scalar()
+    if live_count != snapshot.count + late:
+        missing = np.setdiff1d(snapshot.embedding_ids, _live_ids(snapshot.high_water_mark), assume_unique=True)
+        for embedding_id in missing.tolist():
+            index.remove(embedding_id)
+
+    logger.info(f"Opened embedding snapshot {path} with {snapshot.count} vectors, "
+                f"{tail} newer rows read from the database")
+    return True
+
+
+def _add_batch(index: VectorIndex, batch) -> int:
+    if not batch:
+        return 0
+    count = len(batch)
+    index.add([row[0] for row in batch], [row[1] for row in batch], np.vstack([row[2] for row in batch]))
+    batch.clear()
+    return count
+
+
+class SnapshotRefresher:
+    """Rewrite the snapshot from the app once enough rows are past its mark
+
+    Every `interval` seconds a thread counts the rows past the snapshot's
+    high-water mark and rewrites the file when there are at least
+    `min_rows`, so the tail each worker reads on load stays bounded. A lock
+    file lets only one worker write at a time; the others skip the round.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.path = None
+        self.interval = 3600.0
+        self.min_rows = 10000
+        self.running = False
+        self.thread = None
+
+    def configure(self, app, path: Optional[str], interval: float, min_rows: int):
+        self.app = app
+        self.path = path or None
+        self.interval = interval
+        self.min_rows = min_rows
+
+    def start(self):
+        if self.running or not self.path or self.interval <= 0:
+            return
+        if self.app is None:
+            raise RuntimeError("SnapshotRefresher.configure() must be called before start()")
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='embedding-snapshot')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+
+    def _run(self):
+        while self.running:
+            time.sleep(self.interval)
+            try:
+                with self.app.app_context():
+                    self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing embedding snapshot {self.path}: {str(e)}")
+            finally:
+                db.session.remove()
+
+    def refresh(self) -> bool:
+        """Rewrite the snapshot if its tail reached min_rows; needs an app context"""
+        snapshot = open_snapshot(self.path)
+        if snapshot is None:
+            # Written by the first search
+            return False
+        tail = db.session.execute(
+            select(func.count()).select_from(Embedding).where(Embedding.id > snapshot.high_water_mark)
+        ).scalar()
+        if tail < self.min_rows:
+            return False
+
+        with open(f'{self.path}.lock', 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            # Another worker may have refreshed while this one counted
+            current = open_snapshot(self.path)
+            if current and current.high_water_mark != snapshot.high_water_mark:
+                return False
+            write_snapshot(self.path)
+        return True
+
+
+snapshot_refresher = SnapshotRefresher()
+
+
+if __name__ == '__main__':
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        write_snapshot(app.config['EMBEDDING_SNAPSHOT_PATH'])
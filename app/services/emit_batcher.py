@@ -0,0 +1,159 @@
+import logging
+import threading
+import time
+from typing import Optional, Dict, Any
+from app.services.track_delta import merge_track_frames
+from app.utils.metrics import KAFKA_POLL_TO_EMIT
+
+logger = logging.getLogger(__name__)
+
+# Coalescing policies for overlay events that are waiting to be sent
+LATEST = 'latest'
+MERGE = 'merge'
+TRACKS = 'tracks'
+BATCH = 'batch'
+
+COALESCE_POLICIES = {
+    'detection_update': LATEST,
+    'tracking_update': TRACKS,
+    'recognition_update': MERGE,
+    'overlay_batch': BATCH
+}
+
+
+def _merge_recognitions(older: Dict[str, Any], newer: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge two recognition payloads, newer entries win per track/person"""
+    if 'recognitions' not in older and 'recognitions' not in newer:
+        # Counts-only views have no items to merge; the newest count stands
+        return dict(newer, timestamp=max(older.get('timestamp', 0), newer.get('timestamp', 0)))
+    merged = {}
+    anonymous = []
+    for recognition in older.get('recognitions', []) + newer.get('recognitions', []):
+        key = recognition.get('track_id') or recognition.get('person_id')
+        if key is None:
+            anonymous.append(recognition)
+        else:
+            merged[key] = recognition
+
+    recognitions = list(merged.values()) + anonymous
+    payload = dict(newer)
+    payload['timestamp'] = max(older.get('timestamp', 0), newer.get('timestamp', 0))
+    payload['recognitions'] = recognitions
+    payload['count'] = len(recognitions)
+    return payload
+
+
+def coalesce_payload(event: str, pending: Optional[Dict[str, Any]], payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Combine a pending payload with a newer one according to the event policy"""
+    if pending is None:
+        return payload
+
+    policy = COALESCE_POLICIES.get(event, LATEST)
+    if policy == MERGE:
+        return _merge_recognitions(pending, payload)
+
+    if policy == TRACKS:
+        # Track deltas are folded together instead of dropped
+        return merge_track_frames(pending, payload)
+
+    if policy == BATCH:
+        events = dict(pending.get('events', {}))
+        for name, inner in payload.get('events', {}).items():
+            events[name] = coalesce_payload(name, events.get(name), inner)
+        return dict(payload, timestamp=max(pending.get('timestamp', 0), payload.get('timestamp', 0)), events=events)
+
+    # Keep only the newest frame; late records never overwrite a newer one
+    if payload.get('timestamp', 0) >= pending.get('timestamp', 0):
+        return payload
+    return pending
+
+
+class EmitBatcher:
+    """Coalesce overlay events per room and emit one batched payload per window"""
+
+    def __init__(self, socketio, window_ms: int = 33):
+        self.socketio = socketio
+        self.window = window_ms / 1000.0
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+
+    def add(self, room: str, camera_id: str, event: str, payload: Dict[str, Any],
+            topic: Optional[str] = None, polled_at: Optional[float] = None):
+        """Buffer an overlay event until the next flush
+
+        `polled_at` is when the record behind it was polled from `topic`; the
+        oldest one per coalesced event is timed when the batch is emitted.
+        """
+        with self.lock:
+            batch = self.pending.get(room)
+            if batch is None:
+                batch = self.pending[room] = {'camera_id': camera_id, 'events': {}, 'polled': {}}
+            events = batch['events']
+            events[event] = coalesce_payload(event, events.get(event), payload)
+            if polled_at is not None:
+                oldest = batch['polled'].get(event)
+                if oldest is None or polled_at < oldest[1]:
+                    batch['polled'][event] = (topic or event, polled_at)
+
+    def flush(self) -> int:
+        """Emit every buffered room batch and return the number of emits"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+
+        for room, batch in pending.items():
+            self._emit_batch(room, batch)
+
+        if pending:
+            logger.debug(f"Flushed overlay batches to {len(pending)} rooms")
+        return len(pending)
+
+    def flush_room(self, room: str, skip_sid: Optional[str] = None) -> bool:
+        """Emit a room's buffered batch now, optionally leaving one client out"""
+        with self.lock:
+            batch = self.pending.pop(room, None)
+        if batch is None:
+            return False
+        self._emit_batch(room, batch, skip_sid)
+        return True
+
+    def _emit_batch(self, room: str, batch: Dict[str, Any], skip_sid: Optional[str] = None):
+        events = batch['events']
+        self.socketio.emit('overlay_batch', {
+            'camera_id': batch['camera_id'],
+            'timestamp': max(payload.get('timestamp', 0) for payload in events.values()),
+            'events': events
+        }, room=room, skip_sid=skip_sid)
+        emitted_at = time.perf_counter()
+        for topic, polled_at in batch['polled'].values():
+            KAFKA_POLL_TO_EMIT.observe(emitted_at - polled_at, topic)
+
+    def start(self):
+        """Start the periodic flush thread"""
+        if self.running:
+            return
+
+        self.running = True
+        self.thread = threading.Thread(target=self._flush_loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Stop the flush thread and emit whatever is still buffered"""
+        self.running = False
+
+        if self.thread:
+            self.thread.join(timeout=5)
+
+        self.flush()
+
+    def _flush_loop(self):
+        """Flush buffered events once per window"""
+        while self.running:
+            started = time.monotonic()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing overlay batches: {str(e)}")
+            time.sleep(max(0.0, self.window - (time.monotonic() - started)))
@@ -5,17 +5,77 @@ import time
 from kafka import KafkaConsumer
 from kafka.errors import KafkaError
 from typing import Optional, Dict, Any
+from app.services.emit_batcher import EmitBatcher, COALESCE_POLICIES
+from app.services.partition_workers import PartitionWorkerPool, BridgeRebalanceListener
+from app.services.track_delta import TrackDeltaEncoder
+from app.services.state_cache import LatestStateCache
+from app.utils.metrics import KAFKA_POLL_TO_EMIT, KAFKA_DROPPED
 
 logger = logging.getLogger(__name__)
 
+# Item schemas emitted to clients; records whose items already have exactly
+# these keys are forwarded without being rebuilt
+CANONICAL_KEYS = {
+    'detections': frozenset(('bbox', 'confidence', 'class_name', 'track_id')),
+    'recognitions': frozenset(('person_id', 'name', 'confidence', 'bbox', 'track_id')),
+    'tracks': frozenset(('track_id', 'bbox', 'confidence', 'person_id', 'trajectory'))
+}
+
+# Topic each overlay event comes from, for the poll-to-emit histogram
+OVERLAY_TOPICS = {
+    'detection_update': 'detections',
+    'recognition_update': 'recognitions',
+    'tracking_update': 'tracks'
+}
+
 class KafkaWebSocketBridge:
     """Bridge service to consume Kafka messages and forward to WebSocket clients"""
     
-    def __init__(self, socketio, kafka_config: Optional[Dict[str, Any]] = None):
+    # Consumer modes: a single serial loop, one shard per assigned partition,
+    # or one shard per camera_id hash
+    CONSUMER_MODES = ('serial', 'partition', 'camera')
+    
+    def __init__(self, socketio, kafka_config: Optional[Dict[str, Any]] = None,
+                 batch_window_ms: int = 0, consumer_mode: str = 'serial',
+                 num_workers: int = 4, worker_queue_size: int = 1000,
+                 track_keyframe_interval: float = 0, snapshot_cache_size: int = 1000,
+                 snapshot_ttl: float = 30.0, track_writer=None, rollups=None):
+        if consumer_mode not in self.CONSUMER_MODES:
+            raise ValueError(f"Unknown consumer mode: {consumer_mode}")
+        
         self.socketio = socketio
         self.consumer = None
         self.running = False
         self.thread = None
+        self.consumer_mode = consumer_mode
+        
+        # Records are fanned out to parallel workers unless running serially
+        self.worker_pool = None
+        if consumer_mode != 'serial':
+            self.worker_pool = PartitionWorkerPool(self._process_message, num_workers, worker_queue_size)
+        
+        # Overlay events are coalesced per room when a batch window is set
+        self.batcher = EmitBatcher(socketio, batch_window_ms) if batch_window_ms > 0 else None
+        
+        # Tracks are sent as deltas between keyframes when an interval is set
+        self.track_delta = TrackDeltaEncoder(track_keyframe_interval) if track_keyframe_interval > 0 else None
+        
+        # Latest full payloads per camera, replayed to clients joining a room
+        self.state_cache = LatestStateCache(snapshot_cache_size, snapshot_ttl)
+        
+        # Tracks and recognitions are also handed to the write-behind store
+        self.track_writer = track_writer
+        
+        # Per-camera activity counts and heatmaps
+        self.rollups = rollups
+        
+        # Consumer lag per assigned partition and last record time per topic,
+        # updated after each poll from the fetched highwater marks
+        self.partition_lag: Dict[str, int] = {}
+        self.topic_seen: Dict[str, float] = {}
+        
+        # Producer schema versions whose records passed the canonical shape check
+        self.verified_schemas = {items_key: set() for items_key in CANONICAL_KEYS}
         
         # Default Kafka configuration
         self.kafka_config = kafka_config or {
@@ -42,13 +102,26 @@ class KafkaWebSocketBridge:
             return
         
         try:
-            self.consumer = KafkaConsumer(*self.topics, **self.kafka_config)
+            self.consumer = KafkaConsumer(**self.kafka_config)
+            self.consumer.subscribe(topics=self.topics, listener=BridgeRebalanceListener(self))
             self.running = True
             
+            if self.worker_pool:
+                self.worker_pool.start()
+            
             self.thread = threading.Thread(target=self._consume_messages)
             self.thread.daemon = True
             self.thread.start()
             
+            if self.batcher:
+                self.batcher.start()
+            
+            if self.track_writer:
+                self.track_writer.start()
+            
+            if self.rollups:
+                self.rollups.start()
+            
             logger.info("Kafka bridge started successfully")
             
         except Exception as e:
@@ -65,6 +138,18 @@ class KafkaWebSocketBridge:
         if self.thread:
             self.thread.join(timeout=5)
         
+        if self.worker_pool:
+            self.worker_pool.stop()
+        
+        if self.batcher:
+            self.batcher.stop()
+        
+        if self.track_writer:
+            self.track_writer.stop()
+        
+        if self.rollups:
+            self.rollups.stop()
+        
         logger.info("Kafka bridge stopped")
     
     def _consume_messages(self):
@@ -75,13 +160,19 @@ class KafkaWebSocketBridge:
             try:
                 # Poll for messages with timeout
                 message_batch = self.consumer.poll(timeout_ms=1000)
+                polled_at = time.perf_counter()
                 
                 for topic_partition, messages in message_batch.items():
                     topic = topic_partition.topic
+                    self._record_lag(topic_partition, messages[-1].offset)
                     
                     for message in messages:
                         try:
-                            self._process_message(topic, message.value)
+                            if self.worker_pool:
+                                self.worker_pool.submit(
+                                    self._shard_key(topic_partition, message.value), topic, message.value, polled_at)
+                            else:
+                                self._process_message(topic, message.value, polled_at)
                         except Exception as e:
                             logger.error(f"Error processing message from {topic}: {str(e)}")
                 
@@ -93,108 +184,253 @@ class KafkaWebSocketBridge:
                 logger.error(f"Unexpected error in Kafka consumer: {str(e)}")
                 time.sleep(1)
     
-    def _process_message(self, topic: str, message_data: Dict[str, Any]):
+    def _record_lag(self, topic_partition, last_offset: int):
+        """Remember how far a partition's consumer trails its highwater mark"""
+        self.topic_seen[topic_partition.topic] = time.time()
+        highwater = self.consumer.highwater(topic_partition)
+        if highwater is not None:
+            self.partition_lag[f"{topic_partition.topic}-{topic_partition.partition}"] = \
+                max(0, highwater - last_offset - 1)
+    
+    def consumer_stats(self) -> Dict[str, Any]:
+        """Return consumer lag and worker backlog without touching the consumer"""
+        now = time.time()
+        return {
+            'running': self.running,
+            'consumer_mode': self.consumer_mode,
+            'partition_lag': dict(self.partition_lag),
+            'total_lag': sum(self.partition_lag.values()),
+            'worker_queue_depths': self.worker_pool.queue_depths() if self.worker_pool else [],
+            'last_record_age': {topic: round(now - seen, 1) for topic, seen in list(self.topic_seen.items())}
+        }
+    
+    def _shard_key(self, topic_partition, message_data: Optional[Dict[str, Any]]):
+        """Return the key that decides which worker processes a record"""
+        if self.consumer_mode == 'partition':
+            return f"{topic_partition.topic}-{topic_partition.partition}"
+        
+        # Camera mode keeps ordering per camera across all topics
+        if isinstance(message_data, dict):
+            return message_data.get('camera_id')
+        return None
+    
+    def _process_message(self, topic: str, message_data: Dict[str, Any], polled_at: Optional[float] = None):
         """Process a Kafka message and forward to appropriate WebSocket room"""
         if not message_data:
+            KAFKA_DROPPED.inc(topic, 'empty')
             return
         
         try:
             camera_id = message_data.get('camera_id')
             if not camera_id:
                 logger.warning(f"Message from {topic} missing camera_id")
+                KAFKA_DROPPED.inc(topic, 'missing_camera_id')
                 return
             
             room = f'camera_{camera_id}'
             
+            # Overlays are timed when they are emitted, which may be at the
+            # next batcher flush; other events are emitted right here
             if topic == 'detections':
-                self._handle_detection_message(room, camera_id, message_data)
+                self._handle_detection_message(room, camera_id, message_data, polled_at)
                 
             elif topic == 'recognitions':
-                self._handle_recognition_message(room, camera_id, message_data)
+                self._handle_recognition_message(room, camera_id, message_data, polled_at)
                 
             elif topic == 'tracks':
-                self._handle_tracking_message(room, camera_id, message_data)
+                self._handle_tracking_message(room, camera_id, message_data, polled_at)
                 
             elif topic == 'system-alerts':
                 self._handle_system_alert(message_data)
+                self._observe_emit(topic, polled_at)
                 
             elif topic == 'camera-events':
                 self._handle_camera_event(room, camera_id, message_data)
+                self._observe_emit(topic, polled_at)
                 
         except Exception as e:
             logger.error(f"Error processing {topic} message: {str(e)}")
     
-    def _handle_detection_message(self, room: str, camera_id: str, data: Dict[str, Any]):
+    @staticmethod
+    def _observe_emit(topic: str, polled_at: Optional[float]):
+        if polled_at is not None:
+            KAFKA_POLL_TO_EMIT.observe(time.perf_counter() - polled_at, topic)
+    
+    def _emit_overlay(self, room: str, camera_id: str, event: str, payload: Dict[str, Any],
+                      polled_at: Optional[float] = None):
+        """Emit an overlay event, through the batcher when batching is enabled"""
+        self.state_cache.update(camera_id, event, payload)
+        
+        if event == 'tracking_update' and self.track_delta:
+            payload = self.track_delta.encode(room, payload)
+        
+        topic = OVERLAY_TOPICS.get(event, event)
+        if self.batcher and event in COALESCE_POLICIES:
+            self.batcher.add(room, camera_id, event, payload, topic, polled_at)
+        else:
+            self.socketio.emit(event, payload, room=room)
+            self._observe_emit(topic, polled_at)
+    
+    def _is_canonical(self, items_key: str, data: Dict[str, Any], items) -> bool:
+        """Check whether a record's items already match the emitted schema
+        
+        Records carrying a `schema_version` are checked once per version;
+        unversioned records get a shape check that allocates nothing.
+        """
+        version = data.get('schema_version')
+        verified = self.verified_schemas[items_key]
+        if version is not None and version in verified:
+            return True
+        
+        keys = CANONICAL_KEYS[items_key]
+        if not isinstance(items, list) or not all(type(item) is dict and item.keys() == keys for item in items):
+            return False
+        
+        # An empty frame says nothing about the item shape of its version
+        if version is not None and items:
+            verified.add(version)
+            logger.info(f"Forwarding {items_key} schema version {version} without normalisation")
+        return True
+    
+    def _handle_detection_message(self, room: str, camera_id: str, data: Dict[str, Any],
+                                  polled_at: Optional[float] = None):
         """Handle detection message"""
         detections = data.get('detections', [])
         
-        # Transform detection format if needed
-        formatted_detections = []
-        for detection in detections:
-            formatted_detections.append({
-                'bbox': detection.get('bbox', {}),
-                'confidence': detection.get('confidence', 0.0),
-                'class_name': detection.get('class_name', 'unknown'),
-                'track_id': detection.get('track_id')
-            })
-        
-        self.socketio.emit('detection_update', {
+        if self._is_canonical('detections', data, detections):
+            formatted_detections = detections
+        else:
+            # Transform detection format if needed
+            formatted_detections = []
+            for detection in detections:
+                formatted_detections.append({
+                    'bbox': detection.get('bbox', {}),
+                    'confidence': detection.get('confidence', 0.0),
+                    'class_name': detection.get('class_name', 'unknown'),
+                    'track_id': detection.get('track_id')
+                })
+        
+        timestamp = data.get('timestamp', int(time.time()))
+        self._emit_overlay(room, camera_id, 'detection_update', {
             'camera_id': camera_id,
-            'timestamp': data.get('timestamp', int(time.time())),
+            'timestamp': timestamp,
             'detections': formatted_detections,
             'count': len(formatted_detections)
-        }, room=room)
+        }, polled_at)
+        
+        if self.rollups:
+            self.rollups.add_detections(camera_id, timestamp, len(formatted_detections))
         
         logger.debug(f"Emitted {len(formatted_detections)} detections to {room}")
     
-    def _handle_recognition_message(self, room: str, camera_id: str, data: Dict[str, Any]):
+    def _handle_recognition_message(self, room: str, camera_id: str, data: Dict[str, Any],
+                                    polled_at: Optional[float] = None):
         """Handle recognition message"""
         recognitions = data.get('recognitions', [])
         
-        # Transform recognition format if needed
-        formatted_recognitions = []
-        for recognition in recognitions:
-            formatted_recognitions.append({
-                'person_id': recognition.get('person_id'),
-                'name': recognition.get('name', 'Unknown'),
-                'confidence': recognition.get('confidence', 0.0),
-                'bbox': recognition.get('bbox', {}),
-                'track_id': recognition.get('track_id')
-            })
-        
-        self.socketio.emit('recognition_update', {
+        if self._is_canonical('recognitions', data, recognitions):
+            formatted_recognitions = recognitions
+        else:
+            # Transform recognition format if needed
+            formatted_recognitions = []
+            for recognition in recognitions:
+                formatted_recognitions.append({
+                    'person_id': recognition.get('person_id'),
+                    'name': recognition.get('name', 'Unknown'),
+                    'confidence': recognition.get('confidence', 0.0),
+                    'bbox': recognition.get('bbox', {}),
+                    'track_id': recognition.get('track_id')
+                })
+        
+        timestamp = data.get('timestamp', int(time.time()))
+        self._emit_overlay(room, camera_id, 'recognition_update', {
             'camera_id': camera_id,
-            'timestamp': data.get('timestamp', int(time.time())),
+            'timestamp': timestamp,
             'recognitions': formatted_recognitions,
             'count': len(formatted_recognitions)
-        }, room=room)
+        }, polled_at)
+        
+        if self.track_writer:
+            self.track_writer.add('recognitions', camera_id, timestamp, formatted_recognitions)
         
         logger.debug(f"Emitted {len(formatted_recognitions)} recognitions to {room}")
     
-    def _handle_tracking_message(self, room: str, camera_id: str, data: Dict[str, Any]):
+    def _handle_tracking_message(self, room: str, camera_id: str, data: Dict[str, Any],
+                                 polled_at: Optional[float] = None):
         """Handle tracking message"""
         tracks = data.get('tracks', [])
         
-        # Transform tracking format if needed
-        formatted_tracks = []
-        for track in tracks:
-            formatted_tracks.append({
-                'track_id': track.get('track_id'),
-                'bbox': track.get('bbox', {}),
-                'confidence': track.get('confidence', 0.0),
-                'person_id': track.get('person_id'),
-                'trajectory': track.get('trajectory', [])
-            })
-        
-        self.socketio.emit('tracking_update', {
+        if self._is_canonical('tracks', data, tracks):
+            formatted_tracks = tracks
+        else:
+            # Transform tracking format if needed
+            formatted_tracks = []
+            for track in tracks:
+                formatted_tracks.append({
+                    'track_id': track.get('track_id'),
+                    'bbox': track.get('bbox', {}),
+                    'confidence': track.get('confidence', 0.0),
+                    'person_id': track.get('person_id'),
+                    'trajectory': track.get('trajectory', [])
+                })
+        
+        timestamp = data.get('timestamp', int(time.time()))
+        self._emit_overlay(room, camera_id, 'tracking_update', {
             'camera_id': camera_id,
-            'timestamp': data.get('timestamp', int(time.time())),
+            'timestamp': timestamp,
             'tracks': formatted_tracks,
             'count': len(formatted_tracks)
-        }, room=room)
+        }, polled_at)
+        
+        if self.track_writer:
+            self.track_writer.add('tracks', camera_id, timestamp, formatted_tracks)
+        
+        if self.rollups:
+            self.rollups.add_tracks(camera_id, timestamp, formatted_tracks)
         
         logger.debug(f"Emitted {len(formatted_tracks)} tracks to {room}")
     
+    def emit_snapshot(self, camera_id: str, sid: str) -> bool:
+        """Send the latest cached state of a camera to one client"""
+        room = f'camera_{camera_id}'
+        if self.batcher:
+            # The client has already joined the room; batched deltas predate
+            # the keyframe below, so send them to everyone else first
+            self.batcher.flush_room(room, skip_sid=sid)
+        
+        events = self.state_cache.snapshot(camera_id) or {}
+        
+        if self.track_delta:
+            # The encoder's last frame doubles as the baseline for later
+            # deltas, and its seq lets the client drop deltas it already has
+            keyframe = self.track_delta.keyframe(room)
+            if keyframe:
+                events['tracking_update'] = keyframe
+            elif 'tracking_update' in events:
+                events['tracking_update'] = dict(events['tracking_update'], keyframe=True)
+        
+        if not events:
+            return False
+        
+        self.socketio.emit('camera_snapshot', {
+            'camera_id': camera_id,
+            'timestamp': max(payload.get('timestamp', 0) for payload in events.values()),
+            'events': events
+        }, to=sid)
+        
+        logger.debug(f"Sent snapshot of camera {camera_id} with {len(events)} events")
+        return True
+    
+    def emit_track_keyframe(self, camera_id: str, sid: str) -> bool:
+        """Send a room's track baseline to one client that resumed full tracks"""
+        if not self.track_delta:
+            return False
+        keyframe = self.track_delta.keyframe(f'camera_{camera_id}')
+        if keyframe is None:
+            return False
+        self.socketio.emit('tracking_update', keyframe, to=sid)
+        return True
+    
     def _handle_system_alert(self, data: Dict[str, Any]):
         """Handle system-wide alerts"""
         self.socketio.emit('system_alert', {
@@ -210,11 +446,14 @@ class KafkaWebSocketBridge:
         """Handle camera-specific events"""
         event_type = data.get('event_type', 'unknown')
         
-        self.socketio.emit('camera_event', {
+        payload = {
             'camera_id': camera_id,
             'event_type': event_type,
             'data': data.get('data', {}),
             'timestamp': data.get('timestamp', int(time.time()))
-        }, room=room)
+        }
+        self.state_cache.update(camera_id, 'camera_event', payload)
+        
+        self.socketio.emit('camera_event', payload, room=room)
         
         logger.debug(f"Emitted camera event {event_type} to {room}")
\ No newline at end of file
@@ -0,0 +1,89 @@
+import logging
+import pickle
+import queue
+import threading
+from socketio import PubSubManager, RedisManager
+from app.services.overlay_manager import OverlayClientManager
+
+logger = logging.getLogger(__name__)
+
+
+class LocalPubSubManager(PubSubManager):
+    """In-process stand-in for the Redis message queue
+
+    Managers created in the same process with the same channel see each
+    other's emits, which lets tests run several Socket.IO servers side by
+    side without a Redis instance.
+    """
+    name = 'local'
+
+    _subscribers = {}
+    _subscribers_lock = threading.Lock()
+
+    def __init__(self, url='memory://', channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.url = url
+        self.inbox = queue.Queue()
+        if not write_only:
+            with self._subscribers_lock:
+                self._subscribers.setdefault(channel, []).append(self.inbox)
+
+    def _publish(self, data):
+        with self._subscribers_lock:
+            inboxes = list(self._subscribers.get(self.channel, []))
+        message = pickle.dumps(data)
+        for inbox in inboxes:
+            inbox.put(message)
+
+    def _listen(self):
+        while True:
+            try:
+                yield self.inbox.get(block=False)
+            except queue.Empty:
+                self.server.sleep(0.01)
+
+
+class RedisOverlayManager(RedisManager, OverlayClientManager):
+    """Redis fan-out with per-client overlay backpressure on every worker"""
+
+    def __init__(self, url, channel='socketio', write_only=False,
+                 high_water_mark: int = 32, drain_interval_ms: int = 50):
+        super().__init__(url, channel=channel, write_only=write_only)
+        self.configure_backpressure(high_water_mark, drain_interval_ms)
+
+
+class LocalOverlayManager(LocalPubSubManager, OverlayClientManager):
+    """In-process fan-out with per-client overlay backpressure"""
+
+    def __init__(self, url='memory://', channel='socketio', write_only=False,
+                 high_water_mark: int = 32, drain_interval_ms: int = 50):
+        super().__init__(url, channel=channel, write_only=write_only)
+        self.configure_backpressure(high_water_mark, drain_interval_ms)
+
+
+def create_client_manager(config, write_only: bool = False) -> OverlayClientManager:
+    """Build the Socket.IO client manager for the configured message queue
+
+    SOCKETIO_MESSAGE_QUEUE selects the bus shared by all GUI workers: 'redis'
+    publishes through REDIS_URL, 'memory' uses the in-process stand-in and an
+    empty value keeps a single-worker in-memory manager.
+    """
+    message_queue = config.get('SOCKETIO_MESSAGE_QUEUE')
+    channel = config.get('SOCKETIO_CHANNEL', 'gui-service')
+    options = {
+        'high_water_mark': config['SOCKETIO_HIGH_WATER_MARK'],
+        'drain_interval_ms': config['SOCKETIO_DRAIN_INTERVAL_MS']
+    }
+
+    if not message_queue:
+        manager = OverlayClientManager(**options)
+    elif message_queue == 'redis':
+        logger.info(f"Socket.IO emits fan out through Redis channel {channel}")
+        manager = RedisOverlayManager(config['REDIS_URL'], channel=channel, write_only=write_only, **options)
+    elif message_queue == 'memory':
+        manager = LocalOverlayManager(channel=channel, write_only=write_only, **options)
+    else:
+        raise ValueError(f"Unknown Socket.IO message queue: {message_queue}")
+
+    manager.configure_tiers(config['SOCKETIO_REDUCED_TIER_INTERVAL_MS'], config['SOCKETIO_SUMMARY_TIER_INTERVAL_MS'])
+    return manager
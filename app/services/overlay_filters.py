@@ -0,0 +1,126 @@
+from typing import NamedTuple, Optional, Dict, Any, FrozenSet
+
+# Overlay types a client can subscribe to, with the event and item list
+# they map to
+OVERLAY_TYPES = {
+    'detections': 'detection_update',
+    'recognitions': 'recognition_update',
+    'tracks': 'tracking_update'
+}
+EVENT_ITEMS = {event: items_key for items_key, event in OVERLAY_TYPES.items()}
+
+# Delivery tiers chosen at join_camera_room: 'full' gets every frame,
+# 'reduced' a coalesced frame at a lower cadence and 'summary' only counts
+TIERS = ('full', 'reduced', 'summary')
+
+
+class OverlayFilter(NamedTuple):
+    """Per-camera overlay subscription of a client
+
+    Filters are hashable so clients with identical settings share one
+    filtered payload per emit.
+    """
+    overlays: FrozenSet[str] = frozenset(OVERLAY_TYPES)
+    min_confidence: float = 0.0
+    classes: Optional[FrozenSet[str]] = None
+    counts_only: bool = False
+    tier: str = 'full'
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'overlays': sorted(self.overlays),
+            'min_confidence': self.min_confidence,
+            'classes': sorted(self.classes) if self.classes is not None else None,
+            'counts_only': self.counts_only,
+            'tier': self.tier
+        }
+
+    @property
+    def full_tracks(self) -> bool:
+        """Whether this subscription receives track keyframes and deltas"""
+        return 'tracks' in self.overlays and not self.counts_only and self.tier != 'summary'
+
+    def apply(self, event: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return the payload this subscription receives, or None to skip it"""
+        if self is DEFAULT_FILTER:
+            return payload
+
+        if event == 'overlay_batch':
+            events = {}
+            for name, inner in payload.get('events', {}).items():
+                filtered = self.apply(name, inner)
+                if filtered is not None:
+                    events[name] = filtered
+            if not events:
+                return None
+            return dict(payload, events=events)
+
+        items_key = EVENT_ITEMS.get(event)
+        if items_key is None:
+            return payload
+        if items_key not in self.overlays:
+            return None
+
+        counts_only = self.counts_only or self.tier == 'summary'
+        if items_key == 'tracks':
+            # Track deltas are relative to the room baseline, so tracks are
+            # only filtered by type, never per track
+            if not self.full_tracks:
+                return {key: value for key, value in payload.items()
+                        if key not in ('tracks', 'ended', 'keyframe')}
+            return payload
+
+        items = payload.get(items_key, [])
+        if self.min_confidence > 0:
+            items = [item for item in items if (item.get('confidence') or 0.0) >= self.min_confidence]
+        if self.classes is not None and items_key == 'detections':
+            items = [item for item in items if item.get('class_name') in self.classes]
+
+        filtered = {key: value for key, value in payload.items() if key != items_key}
+        if not counts_only:
+            filtered[items_key] = items
+        filtered['count'] = len(items)
+        return filtered
+
+
+DEFAULT_FILTER = OverlayFilter()
+
+
+def parse_overlay_settings(data: Dict[str, Any]) -> OverlayFilter:
+    """Build an OverlayFilter from an update_overlay_settings payload"""
+    overlays = data.get('overlays', list(OVERLAY_TYPES))
+    if not isinstance(overlays, list) or any(overlay not in OVERLAY_TYPES for overlay in overlays):
+        raise ValueError(f"overlays must be a list of {', '.join(OVERLAY_TYPES)}")
+
+    try:
+        min_confidence = float(data.get('min_confidence') or 0.0)
+    except (TypeError, ValueError):
+        raise ValueError("min_confidence must be a number")
+    if not 0.0 <= min_confidence <= 1.0:
+        raise ValueError("min_confidence must be between 0 and 1")
+
+    classes = data.get('classes')
+    if classes is not None:
+        if not isinstance(classes, list) or not all(isinstance(name, str) for name in classes):
+            raise ValueError("classes must be a list of class names")
+        classes = frozenset(classes)
+
+    return shared(OverlayFilter(
+        overlays=frozenset(overlays),
+        min_confidence=min_confidence,
+        classes=classes,
+        counts_only=bool(data.get('counts_only', False))
+    ))
+
+
+def parse_tier(data: Dict[str, Any]) -> str:
+    """Read the delivery tier from a join_camera_room payload"""
+    tier = data.get('tier') or 'full'
+    if tier not in TIERS:
+        raise ValueError(f"tier must be one of {', '.join(TIERS)}")
+    return tier
+
+
+def shared(overlay_filter: OverlayFilter) -> OverlayFilter:
+    """Reuse the shared default so unfiltered clients take the fast path"""
+    return DEFAULT_FILTER if overlay_filter == DEFAULT_FILTER else overlay_filter
@@ -0,0 +1,303 @@
+import logging
+import threading
+import time
+from collections import Counter
+from engineio import packet as eio_packet
+from socketio import Manager, packet
+from typing import Optional, Dict, Any, List
+from app.services.emit_batcher import COALESCE_POLICIES, coalesce_payload
+from app.services.overlay_filters import DEFAULT_FILTER, OverlayFilter, shared
+from app.services.wire_format import JSON, BINARY_EVENTS, encode_overlay
+
+logger = logging.getLogger(__name__)
+
+# Only overlay events with a coalescing policy are ever held back; everything
+# else (system_alert, camera_event, ...) is never dropped
+
+
+class ClientOutbox:
+    """Overlay frames held back for one client while its transport is congested"""
+
+    def __init__(self):
+        self.pending: Dict[tuple, Any] = {}
+        self.sent = 0
+        self.dropped = Counter()
+
+    def park(self, key: tuple, data: Any):
+        """Hold a frame, coalescing it with (and counting) an older pending frame"""
+        pending = self.pending.get(key)
+        if pending is not None:
+            self.dropped[key[2]] += 1
+        self.pending[key] = coalesce_payload(key[2], pending, data)
+
+
+class OverlayClientManager(Manager):
+    """Socket.IO client manager that sheds overlay frames for slow clients
+
+    Each client gets an outbound buffer in front of its engine.io queue. While
+    the queue is above the high-water mark, overlay events are parked and
+    coalesced per room and event (newest detection frame, merged recognitions,
+    folded track deltas); the drain task sends them once the client catches
+    up. Other events are always delivered.
+
+    Overlay events are also filtered and encoded per client: each client can
+    subscribe per camera room to a subset of overlays (see OverlayFilter),
+    and clients that negotiated MessagePack at connect time get binary
+    attachments. Clients are grouped by subscription and encoding, so each
+    distinct filtered payload and encoding is produced at most once per emit.
+
+    Subscriptions on a 'reduced' or 'summary' tier are rate limited per
+    group: frames arriving before the tier is due are coalesced and the
+    drain task sends them at the tier's cadence.
+    """
+
+    def __init__(self, high_water_mark: int = 32, drain_interval_ms: int = 50):
+        super().__init__()
+        self.outboxes: Dict[str, ClientOutbox] = {}
+        self.outbox_lock = threading.Lock()
+        self.client_encodings: Dict[str, str] = {}
+        self.client_filters: Dict[str, Dict[str, OverlayFilter]] = {}
+        self.tier_pending: Dict[tuple, Any] = {}
+        self.tier_due: Dict[tuple, float] = {}
+        self.tier_lock = threading.Lock()
+        # Emits per room since start, sampled into rates by the metrics sampler
+        self.room_emits = Counter()
+        self.configure_backpressure(high_water_mark, drain_interval_ms)
+        self.configure_tiers()
+
+    def configure_backpressure(self, high_water_mark: int, drain_interval_ms: int):
+        """Set the queue depth at which overlay frames start being shed"""
+        self.high_water_mark = high_water_mark
+        self.drain_interval = drain_interval_ms / 1000.0
+
+    def configure_tiers(self, reduced_interval_ms: int = 500, summary_interval_ms: int = 1000):
+        """Set how often rate-limited tiers receive a coalesced frame"""
+        self.tier_intervals = {
+            'full': 0.0,
+            'reduced': reduced_interval_ms / 1000.0,
+            'summary': summary_interval_ms / 1000.0
+        }
+
+    def initialize(self):
+        super().initialize()
+        self.server.start_background_task(self._drain_loop)
+
+    def emit(self, event, data, namespace, room=None, skip_sid=None,
+             callback=None, **kwargs):
+        """Emit an event, applying the drop policy to overlay events"""
+        if isinstance(room, list):
+            self.room_emits.update(room)
+        elif room is not None:
+            self.room_emits[room] += 1
+        if event not in COALESCE_POLICIES or callback is not None or room is None:
+            return super().emit(event, data, namespace, room=room,
+                                skip_sid=skip_sid, callback=callback, **kwargs)
+
+        if namespace not in self.rooms:
+            return
+        if not isinstance(skip_sid, list):
+            skip_sid = [skip_sid]
+
+        # Group clients by subscription so each one is filtered only once
+        views: Dict[OverlayFilter, List[tuple]] = {}
+        for sid, eio_sid in self.get_participants(namespace, room):
+            if sid not in skip_sid:
+                overlay_filter = self.client_filters.get(sid, {}).get(room, DEFAULT_FILTER)
+                views.setdefault(overlay_filter, []).append((sid, eio_sid))
+
+        for overlay_filter, members in views.items():
+            view_data = overlay_filter.apply(event, data)
+            if view_data is None:
+                continue
+
+            interval = self.tier_intervals.get(overlay_filter.tier, 0.0)
+            if interval:
+                view_data = self._throttle((namespace, room, event, overlay_filter), view_data, interval)
+                if view_data is None:
+                    continue
+
+            self._deliver(event, view_data, namespace, room, members)
+
+    def _deliver(self, event: str, data: Any, namespace: str, room: str, members: List[tuple]):
+        """Send a payload to clients, parking it for congested ones"""
+        key = (namespace, room, event)
+        packets_by_encoding = {}
+        for sid, eio_sid in members:
+            with self.outbox_lock:
+                outbox = self.outboxes.setdefault(sid, ClientOutbox())
+                # Park behind an already pending frame so the client never
+                # receives frames out of order
+                if key in outbox.pending or self._queue_depth(eio_sid) >= self.high_water_mark:
+                    outbox.park(key, data)
+                    continue
+                outbox.sent += 1
+
+            encoding = self.client_encodings.get(sid, JSON)
+            eio_packets = packets_by_encoding.get(encoding)
+            if eio_packets is None:
+                eio_packets = packets_by_encoding[encoding] = self._encode(event, data, namespace, encoding)
+            for eio_pkt in eio_packets:
+                self.server._send_eio_packet(eio_sid, eio_pkt)
+
+    def disconnect(self, sid, namespace, **kwargs):
+        with self.outbox_lock:
+            self.outboxes.pop(sid, None)
+        self.client_encodings.pop(sid, None)
+        self.client_filters.pop(sid, None)
+        self.room_emits.pop(sid, None)
+        return super().disconnect(sid, namespace, **kwargs)
+
+    def leave_room(self, sid, namespace, room):
+        self.client_filters.get(sid, {}).pop(room, None)
+        return super().leave_room(sid, namespace, room)
+
+    def set_client_encoding(self, sid: str, encoding: str):
+        """Record the overlay encoding a client negotiated at connect time"""
+        self.client_encodings[sid] = encoding
+
+    def set_overlay_filter(self, sid: str, room: str, overlay_filter: OverlayFilter) -> bool:
+        """Record which overlays a client wants from a camera room
+
+        Returns True when the change turns full tracks back on, in which case
+        the client needs a keyframe before the next delta.
+        """
+        current = self.client_filters.get(sid, {}).get(room, DEFAULT_FILTER)
+        overlay_filter = overlay_filter._replace(tier=current.tier)
+        self._store_filter(sid, room, overlay_filter)
+        return overlay_filter.full_tracks and not current.full_tracks
+
+    def set_client_tier(self, sid: str, room: str, tier: str):
+        """Record the delivery tier a client picked for a camera room"""
+        current = self.client_filters.get(sid, {}).get(room, DEFAULT_FILTER)
+        self._store_filter(sid, room, current._replace(tier=tier))
+
+    def _store_filter(self, sid: str, room: str, overlay_filter: OverlayFilter):
+        filters = self.client_filters.setdefault(sid, {})
+        overlay_filter = shared(overlay_filter)
+        if overlay_filter is DEFAULT_FILTER:
+            filters.pop(room, None)
+        else:
+            filters[room] = overlay_filter
+
+    def connected_clients(self, namespace: str = '/') -> int:
+        """Number of clients connected to a namespace"""
+        return len(self.rooms.get(namespace, {}).get(None, {}))
+
+    def room_sizes(self, prefix: str = 'camera_', namespace: str = '/') -> Dict[str, int]:
+        """Number of clients in each room whose name starts with prefix"""
+        return {room: len(members) for room, members in list(self.rooms.get(namespace, {}).items())
+                if isinstance(room, str) and room.startswith(prefix)}
+
+    def client_stats(self) -> List[Dict[str, Any]]:
+        """Return per-client delivery counters for operators"""
+        stats = []
+        with self.outbox_lock:
+            outboxes = list(self.outboxes.items())
+
+        for sid, outbox in outboxes:
+            namespace = '/'
+            eio_sid = self.eio_sid_from_sid(sid, namespace)
+            stats.append({
+                'sid': sid,
+                'encoding': self.client_encodings.get(sid, JSON),
+                'overlay_filters': {room: overlay_filter.to_dict()
+                                    for room, overlay_filter in self.client_filters.get(sid, {}).items()},
+                'rooms': [room for room in self.get_rooms(sid, namespace) if room != sid],
+                'queue_depth': self._queue_depth(eio_sid),
+                'pending': len(outbox.pending),
+                'sent': outbox.sent,
+                'dropped': sum(outbox.dropped.values()),
+                'dropped_by_event': dict(outbox.dropped)
+            })
+        return stats
+
+    def _encode(self, event: str, data: Any, namespace: str,
+                encoding: str = JSON) -> List[eio_packet.Packet]:
+        """Encode an event once so it can be sent to many clients"""
+        if encoding != JSON and event in BINARY_EVENTS:
+            # Bytes are sent by Socket.IO as a binary attachment
+            data = encode_overlay(event, data)
+
+        if isinstance(data, tuple):
+            data = list(data)
+        elif data is not None:
+            data = [data]
+        else:
+            data = []
+
+        pkt = self.server.packet_class(packet.EVENT, namespace=namespace, data=[event] + data)
+        encoded_packet = pkt.encode()
+        if not isinstance(encoded_packet, list):
+            encoded_packet = [encoded_packet]
+        return [eio_packet.Packet(eio_packet.MESSAGE, p) for p in encoded_packet]
+
+    def _queue_depth(self, eio_sid: Optional[str]) -> int:
+        """Number of packets waiting in a client's engine.io queue"""
+        socket = self.server.eio.sockets.get(eio_sid) if eio_sid else None
+        if socket is None:
+            return 0
+        return socket.queue.qsize()
+
+    def _throttle(self, key: tuple, data: Any, interval: float) -> Optional[Any]:
+        """Return a rate-limited view's payload if its tier is due, else hold it"""
+        now = time.monotonic()
+        with self.tier_lock:
+            data = coalesce_payload(key[2], self.tier_pending.pop(key, None), data)
+            if now < self.tier_due.get(key, 0.0):
+                self.tier_pending[key] = data
+                return None
+            self.tier_due[key] = now + interval
+            return data
+
+    def _flush_tiers(self):
+        """Send held rate-limited frames whose tier is due"""
+        now = time.monotonic()
+        due = []
+        with self.tier_lock:
+            for key, due_at in list(self.tier_due.items()):
+                if now < due_at:
+                    continue
+                if key in self.tier_pending:
+                    due.append((key, self.tier_pending.pop(key)))
+                    self.tier_due[key] = now + self.tier_intervals.get(key[3].tier, 0.0)
+                else:
+                    # Nothing arrived for a whole interval, forget the view
+                    del self.tier_due[key]
+
+        for (namespace, room, event, overlay_filter), data in due:
+            members = [(sid, eio_sid) for sid, eio_sid in self.get_participants(namespace, room)
+                       if self.client_filters.get(sid, {}).get(room, DEFAULT_FILTER) == overlay_filter]
+            if members:
+                self._deliver(event, data, namespace, room, members)
+
+    def _drain_loop(self):
+        """Send parked frames to clients whose queue dropped below the mark"""
+        while True:
+            self.server.sleep(self.drain_interval)
+            try:
+                self._flush_tiers()
+                self._drain()
+            except Exception as e:
+                logger.error(f"Error draining client outboxes: {str(e)}")
+
+    def _drain(self):
+        ready = []
+        with self.outbox_lock:
+            for sid, outbox in self.outboxes.items():
+                if not outbox.pending:
+                    continue
+                for namespace, room, event in list(outbox.pending):
+                    eio_sid = self.eio_sid_from_sid(sid, namespace)
+                    if eio_sid is None or sid not in self.rooms.get(namespace, {}).get(room, {}):
+                        # Client left the room or disconnected meanwhile
+                        del outbox.pending[(namespace, room, event)]
+                        continue
+                    if self._queue_depth(eio_sid) >= self.high_water_mark:
+                        continue
+                    data = outbox.pending.pop((namespace, room, event))
+                    outbox.sent += 1
+                    ready.append((eio_sid, event, data, namespace, self.client_encodings.get(sid, JSON)))
+
+        for eio_sid, event, data, namespace, encoding in ready:
+            for eio_pkt in self._encode(event, data, namespace, encoding):
+                self.server._send_eio_packet(eio_sid, eio_pkt)
@@ -0,0 +1,112 @@
+import logging
+import queue
+import threading
+import time
+import zlib
+from kafka import ConsumerRebalanceListener
+from typing import Callable, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def shard_for(key: Any, num_shards: int) -> int:
+    """Map a shard key to a worker index, stable across processes"""
+    return zlib.crc32(str(key).encode('utf-8')) % num_shards
+
+
+class PartitionWorkerPool:
+    """Process Kafka records on parallel workers while keeping per-key order
+
+    Every shard key (a topic partition or a camera_id) always lands on the same
+    worker, so records sharing a key are handled in arrival order while
+    different keys are processed in parallel. Queues are bounded; a full queue
+    blocks the poll loop instead of buffering without limit.
+    """
+
+    def __init__(self, handler: Callable[[str, Dict[str, Any], Optional[float]], None],
+                 num_workers: int = 4, queue_size: int = 1000):
+        self.handler = handler
+        self.num_workers = max(1, num_workers)
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(self.num_workers)]
+        self.threads = []
+        self.running = False
+
+    def start(self):
+        """Start one daemon thread per worker queue"""
+        if self.running:
+            return
+
+        self.running = True
+        for index, work_queue in enumerate(self.queues):
+            thread = threading.Thread(target=self._work, args=(index, work_queue))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+        logger.info(f"Started {self.num_workers} bridge workers")
+
+    def stop(self):
+        """Stop the workers, discarding records that were not processed yet"""
+        self.running = False
+
+        for thread in self.threads:
+            thread.join(timeout=5)
+        self.threads = []
+
+    def submit(self, key: Any, topic: str, message_data: Dict[str, Any], polled_at: Optional[float] = None):
+        """Queue a record on the worker that owns its shard key"""
+        self.queues[shard_for(key, self.num_workers)].put((topic, message_data, polled_at))
+
+    def drain(self, timeout: float = 10.0) -> bool:
+        """Wait until every queued record has been processed"""
+        deadline = time.monotonic() + timeout
+        for work_queue in self.queues:
+            while work_queue.unfinished_tasks:
+                if time.monotonic() >= deadline:
+                    logger.warning("Timed out draining bridge worker queues")
+                    return False
+                time.sleep(0.01)
+        return True
+
+    def queue_depths(self):
+        """Return the number of pending records per worker"""
+        return [work_queue.qsize() for work_queue in self.queues]
+
+    def _work(self, index: int, work_queue: queue.Queue):
+        """Worker loop processing records from a single queue"""
+        while self.running:
+            try:
+                topic, message_data, polled_at = work_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            try:
+                self.handler(topic, message_data, polled_at)
+            except Exception as e:
+                logger.error(f"Worker {index} failed processing message from {topic}: {str(e)}")
+            finally:
+                work_queue.task_done()
+
+
+class BridgeRebalanceListener(ConsumerRebalanceListener):
+    """Drain in-flight records before partitions move to another consumer"""
+
+    def __init__(self, bridge):
+        self.bridge = bridge
+
+    def on_partitions_revoked(self, revoked):
+        logger.info(f"Partitions revoked: {sorted(str(tp) for tp in revoked)}")
+        for tp in revoked:
+            self.bridge.partition_lag.pop(f"{tp.topic}-{tp.partition}", None)
+
+        if self.bridge.worker_pool:
+            self.bridge.worker_pool.drain()
+
+        if not self.bridge.kafka_config.get('enable_auto_commit', True):
+            try:
+                self.bridge.consumer.commit()
+            except Exception as e:
+                logger.error(f"Failed to commit offsets on rebalance: {str(e)}")
+
+    def on_partitions_assigned(self, assigned):
+        logger.info(f"Partitions assigned: {sorted(str(tp) for tp in assigned)}")
@@ -0,0 +1,63 @@
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict
+from app import bcrypt
+from app.services.worker_pool import BlockingPool
+
+logger = logging.getLogger(__name__)
+
+
+class LoginThrottled(Exception):
+    """Raised when a username already has too many hash checks in flight"""
+
+
+class PasswordHasher:
+    """Run bcrypt off the request thread on a bounded pool
+
+    A bcrypt check costs 100-300 ms of CPU, which would stall the eventlet
+    hub if run inline (bcrypt releases the GIL, so native threads overlap).
+    Each username may have at most `per_user_limit` checks in flight, which
+    stops a login burst on one account from taking the pool.
+    """
+
+    def __init__(self, max_workers: int = 4, per_user_limit: int = 2, async_mode: str = 'threading'):
+        self.in_flight: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.pool = BlockingPool(max_workers, async_mode, name='bcrypt')
+        self.per_user_limit = per_user_limit
+
+    def configure(self, max_workers: int, per_user_limit: int, async_mode: str):
+        """Size the pool for the server's async mode"""
+        self.pool.configure(max_workers, async_mode)
+        self.per_user_limit = per_user_limit
+
+    def check(self, username: str, password_hash: str, password: str) -> bool:
+        """Verify a password against its hash"""
+        with self._user_slot(username):
+            return self.pool.run(bcrypt.check_password_hash, password_hash, password)
+
+    def generate(self, password: str) -> str:
+        """Hash a new password"""
+        return self.pool.run(bcrypt.generate_password_hash, password).decode('utf-8')
+
+    @contextmanager
+    def _user_slot(self, username: str):
+        key = username.lower()
+        with self.lock:
+            if self.per_user_limit and self.in_flight.get(key, 0) >= self.per_user_limit:
+                logger.warning(f"Throttled concurrent login attempt for {username}")
+                raise LoginThrottled(username)
+            self.in_flight[key] = self.in_flight.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                remaining = self.in_flight[key] - 1
+                if remaining:
+                    self.in_flight[key] = remaining
+                else:
+                    del self.in_flight[key]
+
+
+password_hasher = PasswordHasher()
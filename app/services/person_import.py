@@ -0,0 +1,115 @@
+import json
+import logging
+from typing import Dict, Any, Iterable, Iterator, List, Tuple
+from marshmallow import ValidationError
+from sqlalchemy import insert
+from app import db
+from app.models.person import Person
+from app.api.persons.serializers import PersonCreateSchema
+from app.services.person_search import person_search
+
+logger = logging.getLogger(__name__)
+
+# Errors reported back per upload; the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+
+def iter_ndjson(lines: Iterable[bytes]) -> Iterator[Tuple[int, Any]]:
+    """Yield (line number, record) for each non-empty line of an NDJSON stream
+
+    A line that is not valid JSON yields a ValueError instead of a record.
+    """
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            yield number, ValueError(f"Invalid JSON: {str(e)}")
+
+
+class PersonImporter:
+    """Validate and insert streamed person records in chunks
+
+    Each chunk of `chunk_size` records is validated with PersonCreateSchema
+    and inserted as one executemany in its own transaction. If the insert
+    fails, the chunk is retried record by record in savepoints, so one bad
+    row only fails itself.
+    """
+
+    def __init__(self, chunk_size: int = 500):
+        self.chunk_size = chunk_size
+        self.schema = PersonCreateSchema()
+        self.created = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def run(self, records: Iterable[Tuple[int, Any]]) -> Dict[str, Any]:
+        chunk = []
+        for line, record in records:
+            chunk.append((line, record))
+            if len(chunk) == self.chunk_size:
+                self._import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._import_chunk(chunk)
+
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors
+        }
+
+    def _import_chunk(self, chunk: List[Tuple[int, Any]]):
+        valid = []
+        for line, record in chunk:
+            if isinstance(record, ValueError):
+                self._fail(line, str(record))
+                continue
+            if not isinstance(record, dict):
+                self._fail(line, "Record must be a JSON object")
+                continue
+            try:
+                valid.append((line, self.schema.load(record)))
+            except ValidationError as e:
+                self._fail(line, e.messages)
+
+        if not valid:
+            return
+
+        try:
+            inserted = db.session.execute(
+                insert(Person).returning(Person.id, Person.name, sort_by_parameter_order=True),
+                [data for _, data in valid]
+            ).all()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Bulk insert of {len(valid)} persons failed, retrying one by one: {str(e)}")
+            inserted = self._insert_each(valid)
+
+        self.created += len(inserted)
+        self._index(inserted)
+
+    def _insert_each(self, valid: List[Tuple[int, Dict[str, Any]]]) -> List[Tuple[int, str]]:
+        inserted = []
+        for line, data in valid:
+            try:
+                with db.session.begin_nested():
+                    row = db.session.execute(insert(Person).returning(Person.id, Person.name), data).one()
+                inserted.append(row)
+            except Exception as e:
+                self._fail(line, str(e.__cause__ or e))
+        db.session.commit()
+        return inserted
+
+    def _index(self, inserted):
+        # Core inserts skip the mapper events that keep name search current
+        for person_id, name in inserted:
+            person_search.index.add(person_id, name)
+
+    def _fail(self, line: int, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
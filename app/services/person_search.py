@@ -0,0 +1,232 @@
+import bisect
+import logging
+import threading
+from collections import defaultdict
+from typing import Optional, Dict, List, Set, Tuple
+from sqlalchemy import event, func, or_, case, text
+from app import db
+from app.models.person import Person
+
+logger = logging.getLogger(__name__)
+
+# Same default as pg_trgm.similarity_threshold
+SIMILARITY_THRESHOLD = 0.3
+# Best in-process matches a search listing can page through
+MAX_CANDIDATES = 1000
+
+POSTGRES_INDEXES = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    # Substring and fuzzy matches: name ILIKE '%term%' and name % 'term'
+    "CREATE INDEX IF NOT EXISTS ix_persons_name_trgm ON persons USING gin (name gin_trgm_ops)",
+    # Autocomplete prefixes, including one or two characters the trigram index can't serve
+    "CREATE INDEX IF NOT EXISTS ix_persons_name_prefix ON persons (lower(name) text_pattern_ops)"
+)
+
+
+def trigrams(value: str) -> Set[str]:
+    """Trigrams of a name the way pg_trgm builds them"""
+    grams = set()
+    for word in ''.join(ch if ch.isalnum() else ' ' for ch in value.lower()).split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def escape_like(term: str) -> str:
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class NameIndex:
+    """In-process prefix and trigram index over person names
+
+    Stands in for the PostgreSQL indexes on other databases (SQLite test
+    runs): a sorted list of lowercased names answers prefixes with a binary
+    search and trigram postings find substring and fuzzy candidates. It is
+    loaded on first use and kept in step by the Person mapper events below.
+    """
+
+    def __init__(self):
+        self.names: Dict[int, str] = {}
+        self.grams: Dict[int, Set[str]] = {}
+        self.sorted_names: List[Tuple[str, int]] = []
+        self.postings: Dict[str, Set[int]] = defaultdict(set)
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def load(self, rows):
+        with self.lock:
+            self.names.clear()
+            self.grams.clear()
+            self.postings.clear()
+            for person_id, name in rows:
+                self._add(person_id, name)
+            self.sorted_names = sorted((name.lower(), person_id) for person_id, name in self.names.items())
+            self.loaded = True
+
+    def add(self, person_id: int, name: str):
+        with self.lock:
+            if self.loaded:
+                self._remove(person_id)
+                self._add(person_id, name)
+                bisect.insort(self.sorted_names, (name.lower(), person_id))
+
+    def remove(self, person_id: int):
+        with self.lock:
+            if self.loaded:
+                self._remove(person_id)
+
+    def _add(self, person_id: int, name: str):
+        grams = trigrams(name)
+        self.names[person_id] = name
+        self.grams[person_id] = grams
+        for gram in grams:
+            self.postings[gram].add(person_id)
+
+    def _remove(self, person_id: int):
+        name = self.names.pop(person_id, None)
+        if name is None:
+            return
+        for gram in self.grams.pop(person_id):
+            self.postings[gram].discard(person_id)
+        position = bisect.bisect_left(self.sorted_names, (name.lower(), person_id))
+        if position < len(self.sorted_names) and self.sorted_names[position] == (name.lower(), person_id):
+            del self.sorted_names[position]
+
+    def prefix(self, term: str, limit: int) -> List[Tuple[int, str]]:
+        """Names starting with term, alphabetically"""
+        term = term.lower()
+        with self.lock:
+            start = bisect.bisect_left(self.sorted_names, (term, -1))
+            matches = []
+            for name, person_id in self.sorted_names[start:start + limit]:
+                if not name.startswith(term):
+                    break
+                matches.append((person_id, self.names[person_id]))
+            return matches
+
+    def search(self, term: str, limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Substring and fuzzy matches of term, best first, as (id, score)"""
+        lowered = term.lower()
+        term_grams = trigrams(term)
+        with self.lock:
+            if term_grams:
+                candidates = set()
+                for gram in term_grams:
+                    candidates |= self.postings.get(gram, set())
+            else:
+                candidates = set(self.names)
+
+            ranked = []
+            for person_id in candidates:
+                name = self.names[person_id].lower()
+                score = similarity(term_grams, self.grams[person_id])
+                if lowered in name or score >= SIMILARITY_THRESHOLD:
+                    ranked.append((not name.startswith(lowered), -score, name, person_id))
+
+        ranked.sort()
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [(person_id, -negative_score) for _, negative_score, _, person_id in ranked]
+
+
+class PersonSearch:
+    """Ranked person name search backed by pg_trgm or an in-process index"""
+
+    def __init__(self):
+        self.index = NameIndex()
+        self.use_postgres = False
+
+    def init_app(self, app):
+        """Pick the backend and create the PostgreSQL indexes if needed"""
+        self.use_postgres = db.engine.dialect.name == 'postgresql'
+        if not self.use_postgres:
+            logger.info("Person search uses the in-process name index")
+            return
+
+        try:
+            with db.engine.begin() as connection:
+                for statement in POSTGRES_INDEXES:
+                    connection.execute(text(statement))
+        except Exception as e:
+            # pg_trgm may need a superuser; searches still work, unindexed
+            logger.error(f"Could not create person search indexes: {str(e)}")
+
+    def filter(self, query, term: str, ranked: bool = True):
+        """Restrict a Person query to names matching term, best matches first"""
+        if self.use_postgres:
+            lowered = term.lower()
+            query = query.filter(or_(
+                Person.name.ilike(f'%{escape_like(term)}%', escape='\\'),
+                Person.name.op('%')(term)
+            ))
+            if ranked:
+                query = query.order_by(
+                    case((func.lower(Person.name).like(f'{escape_like(lowered)}%', escape='\\'), 0), else_=1),
+                    func.similarity(Person.name, term).desc(),
+                    Person.name,
+                    Person.id
+                )
+            return query
+
+        self._ensure_index()
+        matches = self.index.search(term, MAX_CANDIDATES)
+        ids = [person_id for person_id, _ in matches]
+        query = query.filter(Person.id.in_(ids))
+        if ranked and ids:
+            query = query.order_by(case({person_id: rank for rank, person_id in enumerate(ids)}, value=Person.id))
+        return query
+
+    def autocomplete(self, term: str, limit: int = 10) -> List[Dict]:
+        """Top names for a search box: prefix matches, then fuzzy ones"""
+        if self.use_postgres:
+            rows = db.session.query(Person.id, Person.name).filter(
+                func.lower(Person.name).like(f'{escape_like(term.lower())}%', escape='\\')
+            ).order_by(func.lower(Person.name), Person.id).limit(limit).all()
+            results = [{'id': person_id, 'name': name, 'score': 1.0} for person_id, name in rows]
+
+            if len(results) < limit and len(term) >= 3:
+                seen = [result['id'] for result in results]
+                score = func.similarity(Person.name, term)
+                fuzzy = db.session.query(Person.id, Person.name, score).filter(
+                    Person.name.op('%')(term), ~Person.id.in_(seen)
+                ).order_by(score.desc(), Person.id).limit(limit - len(results)).all()
+                results.extend({'id': person_id, 'name': name, 'score': round(value, 3)}
+                               for person_id, name, value in fuzzy)
+            return results
+
+        self._ensure_index()
+        results = [{'id': person_id, 'name': name, 'score': 1.0}
+                   for person_id, name in self.index.prefix(term, limit)]
+        if len(results) < limit and len(term) >= 3:
+            seen = {result['id'] for result in results}
+            for person_id, value in self.index.search(term, limit + len(seen)):
+                if person_id not in seen:
+                    results.append({'id': person_id, 'name': self.index.names.get(person_id), 'score': round(value, 3)})
+                    if len(results) == limit:
+                        break
+        return results
+
+    def _ensure_index(self):
+        if not self.index.loaded:
+            self.index.load(db.session.query(Person.id, Person.name).all())
+
+
+person_search = PersonSearch()
+
+
+@event.listens_for(Person, 'after_insert')
+@event.listens_for(Person, 'after_update')
+def _index_person(mapper, connection, target):
+    person_search.index.add(target.id, target.name)
+
+
+@event.listens_for(Person, 'after_delete')
+def _unindex_person(mapper, connection, target):
+    person_search.index.remove(target.id)
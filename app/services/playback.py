@@ -0,0 +1,241 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Iterator, List, Tuple
+from sqlalchemy import func, select
+from app import db
+from app.models.track import tracks, recognitions
+
+logger = logging.getLogger(__name__)
+
+PLAYBACK_SPEEDS = (1, 4, 16)
+# Rows are read one window of recorded time at a time, so memory depends on
+# the window and not on the requested range
+WINDOW = timedelta(seconds=10)
+FETCH_SIZE = 1000
+# Idle stretches in the recording are shortened to this much wall time
+MAX_GAP = 5.0
+# Longest single sleep, so a stop request is noticed quickly
+SLEEP_SLICE = 0.25
+EPOCH = datetime(1970, 1, 1)
+
+
+def parse_time(value) -> datetime:
+    """Naive UTC datetime from epoch seconds/ms or an ISO 8601 string"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        seconds = value / 1000.0 if value > 1e11 else float(value)
+        return EPOCH + timedelta(seconds=seconds)
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError(f"Invalid time: {value}")
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+    raise ValueError("start and end must be epoch seconds or ISO 8601 strings")
+
+
+def epoch_seconds(when: datetime) -> float:
+    return (when - EPOCH).total_seconds()
+
+
+def _frames(statement, event: str, build_item) -> Iterator[Tuple[datetime, str, List[Dict[str, Any]]]]:
+    """Group rows ordered by timestamp into (timestamp, event, items) frames"""
+    rows = db.session.execute(statement.execution_options(yield_per=FETCH_SIZE))
+    for when, group in itertools.groupby(rows, key=lambda row: row.timestamp):
+        yield when, event, [build_item(row) for row in group]
+
+
+def _track_item(row) -> Dict[str, Any]:
+    return {
+        'track_id': row.track_id,
+        'bbox': row.bbox or {},
+        'confidence': row.confidence or 0.0,
+        'person_id': row.person_id,
+        'trajectory': (row.metadata or {}).get('trajectory', [])
+    }
+
+
+def _recognition_item(row) -> Dict[str, Any]:
+    return {
+        'person_id': row.person_id,
+        'name': row.name or 'Unknown',
+        'confidence': row.confidence or 0.0,
+        'bbox': row.bbox or {},
+        'track_id': row.track_id
+    }
+
+
+def iter_frames(camera_id: int, start: datetime, end: datetime) -> Iterator[Tuple[datetime, str, List[Dict[str, Any]]]]:
+    """Yield (timestamp, event, items) for a camera in time order
+
+    Each window of recorded time is read with a streaming cursor and its
+    connection is released before the next window, so a long replay holds
+    neither a transaction nor more than one window of rows. An empty window
+    seeks straight to the next stored row, so gaps in the recording cost
+    one lookup instead of a scan of empty windows.
+    """
+    window_start = start
+    while window_start < end:
+        window_end = min(window_start + WINDOW, end)
+        streams = []
+        for table, event, build_item in ((tracks, 'tracking_update', _track_item),
+                                         (recognitions, 'recognition_update', _recognition_item)):
+            statement = select(table).where(
+                table.c.camera_id == camera_id,
+                table.c.timestamp >= window_start,
+                table.c.timestamp < window_end
+            ).order_by(table.c.timestamp)
+            streams.append(_frames(statement, event, build_item))
+
+        frames = list(heapq.merge(*streams, key=lambda frame: frame[0]))
+        if not frames:
+            window_end = _next_timestamp(camera_id, window_end, end)
+        db.session.close()
+        if window_end is None:
+            return
+        yield from frames
+        window_start = window_end
+
+
+def _next_timestamp(camera_id: int, start: datetime, end: datetime):
+    """Earliest stored track or recognition timestamp in [start, end), or None"""
+    found = []
+    for table in (tracks, recognitions):
+        when = db.session.execute(select(func.min(table.c.timestamp)).where(
+            table.c.camera_id == camera_id,
+            table.c.timestamp >= start,
+            table.c.timestamp < end
+        )).scalar()
+        if when is not None:
+            found.append(when)
+    return min(found) if found else None
+
+
+class PlaybackSession:
+    """One client's replay of a camera's stored overlays"""
+
+    def __init__(self, playback_id: str, sid: str, camera_id, start: datetime, end: datetime, speed: int):
+        self.playback_id = playback_id
+        self.sid = sid
+        self.camera_id = camera_id
+        self.start = start
+        self.end = end
+        self.speed = speed
+        self.stopped = False
+        self.frames = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'playback_id': self.playback_id,
+            'camera_id': self.camera_id,
+            'start': epoch_seconds(self.start),
+            'end': epoch_seconds(self.end),
+            'speed': self.speed
+        }
+
+
+class PlaybackManager:
+    """Run playback sessions as Socket.IO background tasks
+
+    Frames go only to the requesting client, as `tracking_update` and
+    `recognition_update` events shaped like the live ones plus a
+    `playback_id`. They are paced by their recorded timestamps divided by
+    the speed.
+    """
+
+    def __init__(self, max_per_client: int = 2):
+        self.max_per_client = max_per_client
+        self.sessions: Dict[str, PlaybackSession] = {}
+        self.lock = threading.Lock()
+
+    def start(self, app, socketio, sid: str, camera_id, start: datetime, end: datetime, speed: int) -> PlaybackSession:
+        if speed not in PLAYBACK_SPEEDS:
+            raise ValueError(f"speed must be one of {', '.join(map(str, PLAYBACK_SPEEDS))}")
+        if end <= start:
+            raise ValueError("end must be after start")
+        try:
+            stored_camera_id = int(camera_id)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid camera ID")
+
+        session = PlaybackSession(uuid.uuid4().hex, sid, camera_id, start, end, speed)
+        with self.lock:
+            if sum(1 for other in self.sessions.values() if other.sid == sid) >= self.max_per_client:
+                raise ValueError(f"At most {self.max_per_client} playbacks per client")
+            self.sessions[session.playback_id] = session
+
+        socketio.start_background_task(self._run, app, socketio, session, stored_camera_id)
+        return session
+
+    def stop(self, playback_id: str, sid: str) -> bool:
+        with self.lock:
+            session = self.sessions.get(playback_id)
+            if session is None or session.sid != sid:
+                return False
+            session.stopped = True
+        return True
+
+    def stop_client(self, sid: str):
+        """Stop every session of a disconnected client"""
+        with self.lock:
+            for session in self.sessions.values():
+                if session.sid == sid:
+                    session.stopped = True
+
+    def _run(self, app, socketio, session: PlaybackSession, stored_camera_id: int):
+        reason = 'finished'
+        try:
+            with app.app_context():
+                clock = time.monotonic()
+                previous = None
+                for when, event, items in iter_frames(stored_camera_id, session.start, session.end):
+                    if previous is not None:
+                        gap = min((when - previous).total_seconds() / session.speed, MAX_GAP)
+                        clock += gap
+                        if not self._sleep_until(socketio, session, clock):
+                            break
+                    previous = when
+
+                    items_key = 'tracks' if event == 'tracking_update' else 'recognitions'
+                    socketio.emit(event, {
+                        'camera_id': session.camera_id,
+                        'timestamp': epoch_seconds(when),
+                        items_key: items,
+                        'count': len(items),
+                        'playback_id': session.playback_id
+                    }, to=session.sid)
+                    session.frames += 1
+                    if session.stopped:
+                        break
+            if session.stopped:
+                reason = 'stopped'
+        except Exception as e:
+            logger.error(f"Playback {session.playback_id} failed: {str(e)}")
+            reason = 'error'
+        finally:
+            with self.lock:
+                self.sessions.pop(session.playback_id, None)
+
+        socketio.emit('playback_finished', dict(session.to_dict(), frames=session.frames, reason=reason),
+                      to=session.sid)
+        logger.info(f"Playback {session.playback_id} of camera {session.camera_id} {reason} "
+                    f"after {session.frames} frames")
+
+    @staticmethod
+    def _sleep_until(socketio, session: PlaybackSession, deadline: float) -> bool:
+        """Sleep in short slices until deadline; False if the session stopped"""
+        while not session.stopped:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            socketio.sleep(min(remaining, SLEEP_SLICE))
+        return False
+
+
+playback_manager = PlaybackManager()
@@ -0,0 +1,59 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+
+class LatestStateCache:
+    """Bounded cache of the latest overlay payloads per camera
+
+    Entries are kept in update order, so cameras that went silent sit at the
+    front: expired entries are evicted from there, and once more than
+    `max_cameras` are cached the least recently updated camera goes first.
+    """
+
+    def __init__(self, max_cameras: int = 1000, ttl: float = 30.0):
+        self.max_cameras = max_cameras
+        self.ttl = ttl
+        self.entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self.lock = threading.Lock()
+
+    def update(self, camera_id: str, event: str, payload: Dict[str, Any]):
+        """Store the latest payload of an event for a camera"""
+        key = str(camera_id)
+        now = time.monotonic()
+
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                entry = {'events': {}}
+            entry['updated_at'] = now
+            entry['events'][event] = payload
+            self.entries[key] = entry
+
+            self._evict_expired(now)
+            while len(self.entries) > self.max_cameras:
+                self.entries.popitem(last=False)
+
+    def snapshot(self, camera_id: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Return the cached payloads of a camera keyed by event, if still fresh"""
+        with self.lock:
+            self._evict_expired(time.monotonic())
+            entry = self.entries.get(str(camera_id))
+            if entry is None:
+                return None
+            return dict(entry['events'])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _evict_expired(self, now: float):
+        while self.entries:
+            key, entry = next(iter(self.entries.items()))
+            if now - entry['updated_at'] < self.ttl:
+                break
+            del self.entries[key]
+            logger.debug(f"Evicted silent camera {key} from snapshot cache")
@@ -0,0 +1,282 @@
+import logging
+import os
+import platform
+import shutil
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional
+from sqlalchemy import text
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# Hub lag above this marks the GUI service as degraded
+HUB_LAG_DEGRADED_MS = 250.0
+# Producers that sent nothing for this long are reported as idle
+PRODUCER_IDLE_AFTER = 60.0
+PRODUCER_TOPICS = {'detection-service': 'detections', 'recognition-service': 'recognitions'}
+# Busiest rooms reported per sample
+MAX_ROOMS = 50
+# Admins join this room on connect; only they receive performance_metrics
+ADMIN_ROOM = 'system_admins'
+
+
+def _read_proc(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _host_cpu_times() -> Optional[tuple]:
+    """(busy, total) jiffies from /proc/stat"""
+    stat = _read_proc('/proc/stat')
+    if not stat:
+        return None
+    values = [int(value) for value in stat.split('\n', 1)[0].split()[1:9]]
+    idle = values[3] + values[4]
+    return sum(values) - idle, sum(values)
+
+
+def _process_rss() -> Optional[int]:
+    statm = _read_proc('/proc/self/statm')
+    if not statm:
+        return None
+    return int(statm.split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def _host_memory_percent() -> Optional[float]:
+    meminfo = _read_proc('/proc/meminfo')
+    if not meminfo:
+        return None
+    fields = {}
+    for line in meminfo.splitlines():
+        name, _, value = line.partition(':')
+        fields[name] = int(value.split()[0])
+    if not fields.get('MemTotal') or 'MemAvailable' not in fields:
+        return None
+    return round(100.0 * (1 - fields['MemAvailable'] / fields['MemTotal']), 1)
+
+
+def _percent(used: float, total: float) -> Optional[float]:
+    return round(100.0 * used / total, 1) if total > 0 else None
+
+
+class MetricsSampler:
+    """Sample process, host, bridge, Socket.IO and database metrics
+
+    A Socket.IO background task takes a sample every `interval` seconds into
+    a ring buffer of `history` samples and sends it as `performance_metrics`
+    to the admins connected to this worker; every sample names its worker.
+    Readers only copy from the buffer. The task's
+    oversleep is the hub lag: under eventlet it is how long greenlets wait
+    for the hub. CPU and memory come from /proc and read as None elsewhere.
+    """
+
+    def __init__(self, interval: float = 5.0, history: int = 720):
+        self.app = None
+        self.socketio = None
+        self.interval = interval
+        self.samples = deque(maxlen=history)
+        self.lock = threading.Lock()
+        self.emit_enabled = True
+        self.running = False
+        self.previous: Dict[str, Any] = {}
+
+    def configure(self, app, socketio, interval: float, history: int, emit_enabled: bool):
+        self.app = app
+        self.socketio = socketio
+        self.interval = interval
+        self.samples = deque(maxlen=history)
+        self.emit_enabled = emit_enabled
+
+    def start(self):
+        if self.running:
+            return
+        if self.app is None:
+            raise RuntimeError("MetricsSampler.configure() must be called before start()")
+        self.running = True
+        self.socketio.start_background_task(self._run)
+
+    def stop(self):
+        self.running = False
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            return self.samples[-1] if self.samples else None
+
+    def history(self, count: int) -> List[Dict[str, Any]]:
+        with self.lock:
+            samples = list(self.samples)
+        return samples[-count:] if count > 0 else []
+
+    def _run(self):
+        deadline = time.monotonic() + self.interval
+        while self.running:
+            self.socketio.sleep(max(0.0, deadline - time.monotonic()))
+            now = time.monotonic()
+            hub_lag = max(0.0, now - deadline)
+            deadline = max(deadline + self.interval, now)
+            try:
+                with self.app.app_context():
+                    sample = self.sample(hub_lag)
+            except Exception as e:
+                logger.error(f"Error sampling system metrics: {str(e)}")
+                continue
+
+            with self.lock:
+                self.samples.append(sample)
+            if self.emit_enabled:
+                # ignore_queue keeps each worker's sample off the message queue,
+                # so clients get one sample per interval, from their own worker
+                self.socketio.emit('performance_metrics', sample, to=ADMIN_ROOM, ignore_queue=True)
+
+    def sample(self, hub_lag: float = 0.0) -> Dict[str, Any]:
+        """Collect one sample; needs an app context"""
+        now = time.monotonic()
+        elapsed = now - self.previous.get('at', now)
+        self.previous['at'] = now
+        bridge = getattr(self.app, 'kafka_bridge', None)
+
+        sample = {
+            'timestamp': round(time.time(), 3),
+            'worker': {'host': platform.node(), 'pid': os.getpid()},
+            'process': self._process(elapsed),
+            'host': self._host(),
+            'hub_lag_ms': round(hub_lag * 1000, 2),
+            'kafka': bridge.consumer_stats() if bridge else None,
+            'socketio': self._socketio(elapsed),
+            'database': self._database()
+        }
+        if bridge and bridge.track_writer:
+            sample['track_store'] = bridge.track_writer.get_stats()
+        sample['services'] = self._services(sample)
+        return sample
+
+    def _process(self, elapsed: float) -> Dict[str, Any]:
+        times = os.times()
+        cpu = times.user + times.system
+        previous, self.previous['process_cpu'] = self.previous.get('process_cpu'), cpu
+        return {
+            'cpu_percent': _percent(cpu - previous, elapsed) if previous is not None else None,
+            'rss_bytes': _process_rss(),
+            'threads': threading.active_count()
+        }
+
+    def _host(self) -> Dict[str, Any]:
+        cpu_percent = None
+        cpu_times = _host_cpu_times()
+        previous, self.previous['host_cpu'] = self.previous.get('host_cpu'), cpu_times
+        if cpu_times and previous:
+            cpu_percent = _percent(cpu_times[0] - previous[0], cpu_times[1] - previous[1])
+
+        disk_percent = None
+        path = self.app.config.get('UPLOAD_FOLDER') or '.'
+        try:
+            usage = shutil.disk_usage(path if os.path.exists(path) else '.')
+            disk_percent = _percent(usage.used, usage.total)
+        except OSError:
+            pass
+
+        return {
+            'cpu_percent': cpu_percent,
+            'cpu_count': os.cpu_count(),
+            'memory_percent': _host_memory_percent(),
+            'disk_percent': disk_percent,
+            'load_average': list(os.getloadavg()) if hasattr(os, 'getloadavg') else None
+        }
+
+    def _socketio(self, elapsed: float) -> Dict[str, Any]:
+        manager = self.socketio.server.manager if self.socketio.server else None
+        clients = manager.connected_clients() if hasattr(manager, 'connected_clients') else None
+
+        rates = {}
+        if hasattr(manager, 'room_emits'):
+            counts = dict(manager.room_emits)
+            previous, self.previous['room_emits'] = self.previous.get('room_emits', {}), counts
+            if elapsed > 0:
+                for room, count in counts.items():
+                    delta = count - previous.get(room, 0)
+                    if delta > 0:
+                        rates[room] = round(delta / elapsed, 2)
+        busiest = sorted(rates.items(), key=lambda item: item[1], reverse=True)[:MAX_ROOMS]
+
+        return {
+            'connected_clients': clients,
+            'emit_rate': dict(busiest),
+            'total_emit_rate': round(sum(rates.values()), 2)
+        }
+
+    def _database(self) -> Dict[str, Any]:
+        pool = db.engine.pool
+        stats = {}
+        for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+            if hasattr(pool, name):
+                stats[name] = getattr(pool, name)()
+
+        started = time.monotonic()
+        try:
+            db.session.execute(text('SELECT 1'))
+            stats['ping_ms'] = round((time.monotonic() - started) * 1000, 2)
+            stats['healthy'] = True
+        except Exception as e:
+            logger.warning(f"Database ping failed: {str(e)}")
+            stats['ping_ms'] = None
+            stats['healthy'] = False
+        finally:
+            db.session.remove()
+        return stats
+
+    def _services(self, sample: Dict[str, Any]) -> List[Dict[str, Any]]:
+        kafka = sample['kafka'] or {}
+        services = [
+            {'name': 'gui-service', 'status': 'running',
+             'health': 'degraded' if sample['hub_lag_ms'] > HUB_LAG_DEGRADED_MS else 'healthy'}
+        ]
+        for name, topic in PRODUCER_TOPICS.items():
+            age = kafka.get('last_record_age', {}).get(topic)
+            active = age is not None and age <= PRODUCER_IDLE_AFTER
+            services.append({'name': name, 'status': 'running' if active else 'idle',
+                             'health': 'healthy' if active else 'unknown'})
+        services.append({'name': 'database', 'status': 'running' if sample['database']['healthy'] else 'error',
+                         'health': 'healthy' if sample['database']['healthy'] else 'unhealthy'})
+        services.append({'name': 'kafka', 'status': 'running' if kafka.get('running') else 'stopped',
+                         'health': 'healthy' if kafka.get('running') else 'unhealthy'})
+        return services
+
+
+def status_summary(sample: Dict[str, Any], camel_case: bool = True, detailed: bool = False) -> Dict[str, Any]:
+    """Shape a sample like the system status response
+
+    The raw sample (room rates, pool and partition stats) is only included
+    when `detailed`, which callers set for admins.
+    """
+    performance = {
+        'cpu_usage': sample['host']['cpu_percent'],
+        'memory_usage': sample['host']['memory_percent'],
+        'disk_usage': sample['host']['disk_percent'],
+        'process_cpu_usage': sample['process']['cpu_percent'],
+        'hub_lag_ms': sample['hub_lag_ms']
+    }
+    if camel_case:
+        performance = {
+            'cpuUsage': performance['cpu_usage'],
+            'memoryUsage': performance['memory_usage'],
+            'diskUsage': performance['disk_usage'],
+            'processCpuUsage': performance['process_cpu_usage'],
+            'hubLagMs': performance['hub_lag_ms']
+        }
+    summary = {
+        'services': sample['services'],
+        'performance': performance,
+        'worker': sample['worker'],
+        'timestamp': int(sample['timestamp'])
+    }
+    if detailed:
+        summary['metrics'] = sample
+    return summary
+
+
+metrics_sampler = MetricsSampler()
@@ -0,0 +1,83 @@
+import logging
+from typing import Set
+from sqlalchemy import event, select, update, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app import db
+from app.models.table_version import TableVersion
+
+logger = logging.getLogger(__name__)
+
+# Tables whose listings are validated by their version
+VERSIONED_TABLES = frozenset(('cameras', 'persons', 'system_config'))
+
+
+def table_version(table_name: str) -> int:
+    """Current version of a table; 0 until its first tracked write"""
+    return db.session.execute(
+        select(TableVersion.version).where(TableVersion.table_name == table_name)
+    ).scalar() or 0
+
+
+def _changed(session: Session) -> Set[str]:
+    return session.info.setdefault('changed_tables', set())
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_flush(session, flush_context):
+    changed = _changed(session)
+    for instance in list(session.new) + list(session.deleted) + list(session.dirty):
+        table_name = getattr(instance, '__tablename__', None)
+        if table_name in VERSIONED_TABLES and (instance not in session.dirty or session.is_modified(instance)):
+            changed.add(table_name)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _record_statement(orm_execute_state):
+    # Bulk insert(Model), update(Model) and query.delete() skip the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        table_name = mapper.local_table.name if mapper is not None else None
+        if table_name in VERSIONED_TABLES:
+            _changed(orm_execute_state.session).add(table_name)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changes(session):
+    session.info.pop('changed_tables', None)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_versions(session):
+    """Bump after the commit, in its own transaction
+
+    A reader that sees the new version therefore also sees the new rows,
+    and writers never wait on the counter row.
+    """
+    changed = session.info.pop('changed_tables', None)
+    if not changed:
+        return
+    try:
+        with session.get_bind().begin() as connection:
+            for table_name in sorted(changed):
+                _bump(connection, table_name)
+    except Exception as e:
+        logger.error(f"Could not bump table versions {sorted(changed)}: {str(e)}")
+
+
+def _bump(connection, table_name: str):
+    bumped = connection.execute(
+        update(TableVersion).where(TableVersion.table_name == table_name)
+        .values(version=TableVersion.version + 1)
+    ).rowcount
+    if bumped:
+        return
+    try:
+        with connection.begin_nested():
+            connection.execute(insert(TableVersion).values(table_name=table_name, version=1))
+    except IntegrityError:
+        # Another worker created the row meanwhile
+        connection.execute(
+            update(TableVersion).where(TableVersion.table_name == table_name)
+            .values(version=TableVersion.version + 1)
+        )
\ No newline at end of file
@@ -0,0 +1,193 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Dict, Iterable, Tuple
+from PIL import Image, ImageOps
+from app.services.worker_pool import BlockingPool
+
+logger = logging.getLogger(__name__)
+
+# Longest edge in pixels of each derivative
+THUMBNAIL_SIZES = {'small': 96, 'medium': 256, 'large': 512}
+JPEG_QUALITY = 85
+# Part of every cache key; bump it when rendering changes
+RENDER_VERSION = 1
+# Image paths stored on persons start with this URL prefix
+UPLOAD_URL_PREFIX = '/uploads/'
+# Source images whose digest is remembered; the least recently used go first
+MAX_DIGESTS = 10000
+
+
+class Thumbnail(NamedTuple):
+    path: str
+    etag: str
+
+
+class ThumbnailCache:
+    """Content-addressed disk cache of resized person images
+
+    A derivative's key is the SHA-256 of the source image bytes, the size and
+    RENDER_VERSION, so it changes exactly when its content does and doubles as
+    a strong ETag. The digest of the latest (mtime, size) of each source path
+    is remembered for the MAX_DIGESTS most recently used paths, so a hit
+    costs one stat. Misses are rendered with Pillow on a BlockingPool.
+    Total cache size is kept under `max_bytes` by evicting the least recently
+    served files.
+    """
+
+    def __init__(self):
+        self.upload_folder = 'uploads'
+        self.cache_dir = 'data/thumbnails'
+        self.max_bytes = 512 * 1024 * 1024
+        self.pool = BlockingPool(4, 'threading', name='thumbnail')
+        self.entries: 'OrderedDict[str, int]' = OrderedDict()
+        self.total_bytes = 0
+        self.digests: 'OrderedDict[str, Tuple[int, int, str]]' = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def configure(self, upload_folder: str, cache_dir: str, max_bytes: int, workers: int, async_mode: str):
+        self.upload_folder = upload_folder
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.pool.configure(workers, async_mode)
+        self._scan()
+
+    def source_path(self, image: str) -> Optional[str]:
+        """Map a stored image path to a file under the upload folder"""
+        relative = image[len(UPLOAD_URL_PREFIX):] if image.startswith(UPLOAD_URL_PREFIX) else image.lstrip('/')
+        root = os.path.abspath(self.upload_folder)
+        path = os.path.abspath(os.path.join(root, relative))
+        if os.path.commonpath([root, path]) != root:
+            return None
+        return path
+
+    def etag(self, image: str, size: str) -> str:
+        """Cache key of a derivative, computed without rendering it
+
+        Raises ValueError for an unknown size or a path outside the upload
+        folder, and FileNotFoundError when the source image is missing.
+        """
+        if size not in THUMBNAIL_SIZES:
+            raise ValueError(f"size must be one of {', '.join(THUMBNAIL_SIZES)}")
+        source = self.source_path(image)
+        if source is None:
+            raise ValueError("Invalid image path")
+
+        stat = os.stat(source)
+        with self.lock:
+            known = self.digests.get(source)
+            if known is not None:
+                self.digests.move_to_end(source)
+        if known is not None and known[:2] == (stat.st_mtime_ns, stat.st_size):
+            digest = known[2]
+        else:
+            digest = self.pool.run(self._digest, source)
+            with self.lock:
+                # Replaces the digest of an older version of the file
+                self.digests[source] = (stat.st_mtime_ns, stat.st_size, digest)
+                self.digests.move_to_end(source)
+                while len(self.digests) > MAX_DIGESTS:
+                    self.digests.popitem(last=False)
+        return hashlib.sha256(f'{digest}:{size}:{RENDER_VERSION}'.encode('ascii')).hexdigest()
+
+    def get(self, image: str, size: str) -> Thumbnail:
+        """Return the cached derivative of an image, rendering it on a miss"""
+        key = self.etag(image, size)
+        path = self._path(key)
+        with self.lock:
+            hit = key in self.entries
+            if hit:
+                self.entries.move_to_end(key)
+                self.stats['hits'] += 1
+            else:
+                self.stats['misses'] += 1
+        if hit and os.path.exists(path):
+            return Thumbnail(path, key)
+
+        nbytes = self.pool.run(self._render, self.source_path(image), path, THUMBNAIL_SIZES[size])
+        self._store(key, nbytes)
+        return Thumbnail(path, key)
+
+    def warm(self, images: Iterable[str], size: str):
+        """Render derivatives in the background so later requests hit"""
+        for image in images:
+            self.pool.submit(self._warm_one, image, size)
+
+    def _warm_one(self, image: str, size: str):
+        try:
+            self.get(image, size)
+        except (ValueError, OSError):
+            pass
+
+    def get_stats(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.stats, entries=len(self.entries), bytes=self.total_bytes)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f'{key}.jpg')
+
+    @staticmethod
+    def _digest(source: str) -> str:
+        sha = hashlib.sha256()
+        with open(source, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(block)
+        return sha.hexdigest()
+
+    @staticmethod
+    def _render(source: str, path: str, edge: int) -> int:
+        with Image.open(source) as image:
+            # draft() lets JPEG decode at a reduced scale, far cheaper than full size
+            image.draft('RGB', (edge, edge))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((edge, edge))
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            image.save(temp_path, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+        os.replace(temp_path, path)
+        return os.path.getsize(path)
+
+    def _store(self, key: str, nbytes: int):
+        evicted = []
+        with self.lock:
+            self.total_bytes += nbytes - self.entries.pop(key, 0)
+            self.entries[key] = nbytes
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                old_key, old_bytes = self.entries.popitem(last=False)
+                self.total_bytes -= old_bytes
+                self.stats['evictions'] += 1
+                evicted.append(old_key)
+
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    def _scan(self):
+        """Rebuild the LRU order from the files already on disk"""
+        files = []
+        if os.path.isdir(self.cache_dir):
+            for directory, _, names in os.walk(self.cache_dir):
+                for name in names:
+                    if name.endswith('.jpg'):
+                        stat = os.stat(os.path.join(directory, name))
+                        files.append((stat.st_atime, name[:-4], stat.st_size))
+
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+            for _, key, nbytes in sorted(files):
+                self.entries[key] = nbytes
+                self.total_bytes += nbytes
+        if files:
+            logger.info(f"Thumbnail cache has {len(files)} files, {self.total_bytes} bytes")
+
+
+thumbnail_cache = ThumbnailCache()
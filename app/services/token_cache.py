@@ -0,0 +1,133 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple, Optional, Dict, Any, Tuple
+from sqlalchemy import event
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+class CachedUser(NamedTuple):
+    """Detached copy of the User columns request handlers read"""
+    id: int
+    username: str
+    role: str
+    created_at: Optional[datetime] = None
+    last_login: Optional[datetime] = None
+
+    @classmethod
+    def from_model(cls, user: User) -> 'CachedUser':
+        return cls(user.id, user.username, user.role, user.created_at, user.last_login)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'username': self.username,
+            'role': self.role
+        }
+
+
+class TokenCache:
+    """Cache of verified JWTs and of the users they resolve to
+
+    Tokens are keyed by the SHA-256 of the raw token and kept until their
+    `exp`, so a token is only decoded and checked once while it is valid.
+    Users are kept for `user_ttl` seconds and dropped as soon as the row is
+    updated or deleted in this process; the TTL bounds how long a change made
+    by another worker can go unnoticed.
+    """
+
+    def __init__(self, max_tokens: int = 10000, user_ttl: float = 30.0):
+        self.max_tokens = max_tokens
+        self.user_ttl = user_ttl
+        self.tokens: 'OrderedDict[bytes, Tuple[int, float]]' = OrderedDict()
+        self.users: Dict[int, Tuple[CachedUser, float]] = {}
+        self.lock = threading.Lock()
+        self.stats = {'token_hits': 0, 'token_misses': 0, 'user_hits': 0, 'user_misses': 0}
+
+    def configure(self, max_tokens: int, user_ttl: float):
+        """Apply the app's cache limits"""
+        with self.lock:
+            self.max_tokens = max_tokens
+            self.user_ttl = user_ttl
+            while len(self.tokens) > self.max_tokens:
+                self.tokens.popitem(last=False)
+
+    @staticmethod
+    def token_key(token: str) -> bytes:
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get_token(self, key: bytes) -> Optional[int]:
+        """Return the user id of a verified, unexpired token"""
+        now = time.time()
+        with self.lock:
+            entry = self.tokens.get(key)
+            if entry is not None and now < entry[1]:
+                self.tokens.move_to_end(key)
+                self.stats['token_hits'] += 1
+                return entry[0]
+            if entry is not None:
+                del self.tokens[key]
+            self.stats['token_misses'] += 1
+            return None
+
+    def put_token(self, key: bytes, user_id: int, expires_at: float):
+        """Remember a verified token until its expiry"""
+        if self.max_tokens <= 0 or expires_at <= time.time():
+            return
+        with self.lock:
+            self.tokens[key] = (user_id, expires_at)
+            self.tokens.move_to_end(key)
+            while len(self.tokens) > self.max_tokens:
+                self.tokens.popitem(last=False)
+
+    def get_user(self, user_id: int) -> Optional[CachedUser]:
+        """Return the cached user, if still fresh"""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.users.get(user_id)
+            if entry is not None and now < entry[1]:
+                self.stats['user_hits'] += 1
+                return entry[0]
+            self.users.pop(user_id, None)
+            self.stats['user_misses'] += 1
+            return None
+
+    def put_user(self, user: CachedUser):
+        if self.user_ttl <= 0:
+            return
+        with self.lock:
+            self.users[user.id] = (user, time.monotonic() + self.user_ttl)
+
+    def invalidate_user(self, user_id: int):
+        """Drop a user so the next request reloads it"""
+        with self.lock:
+            self.users.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.tokens.clear()
+            self.users.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.stats)
+            stats['tokens'] = len(self.tokens)
+            stats['users'] = len(self.users)
+        for name in ('token', 'user'):
+            lookups = stats[f'{name}_hits'] + stats[f'{name}_misses']
+            stats[f'{name}_hit_ratio'] = round(stats[f'{name}_hits'] / lookups, 3) if lookups else None
+        return stats
+
+
+token_cache = TokenCache()
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_changed_user(mapper, connection, target):
+    token_cache.invalidate_user(target.id)
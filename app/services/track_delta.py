@@ -0,0 +1,187 @@
+import logging
+import threading
+import time
+from typing import Optional, Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+
+def _new_points(sent: List[Any], trajectory: List[Any]) -> Optional[List[Any]]:
+    """Return trajectory points added after the points that were sent
+
+    Upstream keeps a bounded trajectory, so the new one may have dropped
+    points from the front as well. The smallest shift whose overlap matches
+    point for point wins; points are never matched by value alone, since a
+    stationary or repeating track revisits the same coordinates. Returns
+    None when no overlap matches and the full trajectory has to be resent.
+    """
+    for shift in range(len(sent)):
+        overlap = len(sent) - shift
+        if overlap <= len(trajectory) and trajectory[:overlap] == sent[shift:]:
+            return trajectory[overlap:]
+    return trajectory if not sent else None
+
+
+class TrackDeltaEncoder:
+    """Encode tracking frames as deltas against the last frame sent to a room
+
+    The first frame for a room, and then one frame every `keyframe_interval`
+    seconds, goes out as a full keyframe. In between, each track only carries
+    the fields that changed and the trajectory points added since the previous
+    frame, and tracks that disappeared are listed in `ended`.
+
+    Frames are numbered per room in `seq`, and a delta names the frame it
+    applies to in `base_seq`, so a client can drop a delta that its keyframe
+    already covers.
+    """
+
+    def __init__(self, keyframe_interval: float = 5.0):
+        self.keyframe_interval = keyframe_interval
+        self.rooms: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+    def encode(self, room: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the payload to emit for a full tracking frame"""
+        now = time.monotonic()
+        tracks = {track.get('track_id'): track for track in payload.get('tracks', [])}
+
+        with self.lock:
+            state = self.rooms.get(room)
+            is_keyframe = state is None or now - state['keyframe_at'] >= self.keyframe_interval
+            seq = state['seq'] + 1 if state else 1
+            self.rooms[room] = {
+                'frame': payload,
+                'tracks': tracks,
+                'keyframe_at': now if is_keyframe else state['keyframe_at'],
+                'seq': seq
+            }
+
+        if is_keyframe:
+            return dict(payload, keyframe=True, seq=seq)
+
+        previous = state['tracks']
+        delta_tracks = []
+        for track_id, track in tracks.items():
+            before = previous.get(track_id)
+            if before is None:
+                delta_tracks.append(track)
+                continue
+
+            change = {'track_id': track_id}
+            for field in ('bbox', 'confidence', 'person_id'):
+                if track.get(field) != before.get(field):
+                    change[field] = track.get(field)
+
+            trajectory = track.get('trajectory') or []
+            sent = before.get('trajectory') or []
+            added = _new_points(sent, trajectory)
+            if added is None:
+                change['trajectory'] = trajectory
+            else:
+                if added:
+                    change['trajectory_append'] = added
+                if len(sent) + len(added) != len(trajectory):
+                    # Upstream keeps a bounded trajectory; tell clients where to cut
+                    change['trajectory_length'] = len(trajectory)
+
+            if len(change) > 1:
+                delta_tracks.append(change)
+
+        return {
+            'camera_id': payload.get('camera_id'),
+            'timestamp': payload.get('timestamp'),
+            'keyframe': False,
+            'seq': seq,
+            'base_seq': state['seq'],
+            'tracks': delta_tracks,
+            'ended': [track_id for track_id in previous if track_id not in tracks],
+            'count': len(tracks)
+        }
+
+    def keyframe(self, room: str) -> Optional[Dict[str, Any]]:
+        """Return the last full frame of a room as a keyframe, if any"""
+        with self.lock:
+            state = self.rooms.get(room)
+        if state is None:
+            return None
+        return dict(state['frame'], keyframe=True, seq=state['seq'])
+
+    def forget(self, room: str):
+        """Drop the baseline for a room so the next frame is a keyframe"""
+        with self.lock:
+            self.rooms.pop(room, None)
+
+
+def _apply_track_change(track: Dict[str, Any], change: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply a track change to a full track or to an earlier change"""
+    merged = dict(track)
+    for field, value in change.items():
+        if field == 'trajectory_append':
+            if 'trajectory' in merged:
+                merged['trajectory'] = list(merged['trajectory']) + value
+            else:
+                merged['trajectory_append'] = list(merged.get('trajectory_append', [])) + value
+        elif field == 'trajectory':
+            merged['trajectory'] = value
+            merged.pop('trajectory_append', None)
+            merged.pop('trajectory_length', None)
+        elif field != 'trajectory_length':
+            merged[field] = value
+
+    length = change.get('trajectory_length')
+    if length is not None:
+        if 'trajectory' in merged:
+            merged['trajectory'] = merged['trajectory'][-length:] if length else []
+        else:
+            merged['trajectory_length'] = length
+    return merged
+
+
+def merge_track_frames(older: Dict[str, Any], newer: Dict[str, Any]) -> Dict[str, Any]:
+    """Combine two pending tracking frames into one that yields the same state
+
+    Used wherever unsent frames are coalesced, so that skipping a delta never
+    leaves a client with a broken baseline.
+    """
+    if 'keyframe' not in newer:
+        # Plain full frames: keep only the newest
+        if newer.get('timestamp', 0) >= older.get('timestamp', 0):
+            return newer
+        return older
+
+    if newer['keyframe']:
+        return newer
+
+    ended = set(newer.get('ended', []))
+    changes = {change['track_id']: change for change in newer.get('tracks', [])}
+
+    if older.get('keyframe'):
+        # Apply the delta to a full frame, which stays a keyframe
+        tracks = []
+        for track in older.get('tracks', []):
+            track_id = track.get('track_id')
+            if track_id in ended:
+                continue
+            change = changes.pop(track_id, None)
+            if change:
+                track = _apply_track_change(dict(track, trajectory=track.get('trajectory') or []), change)
+            tracks.append(track)
+        tracks.extend(changes.values())
+        return dict(older, timestamp=newer.get('timestamp'), seq=newer.get('seq'), tracks=tracks, count=len(tracks))
+
+    # Merge two deltas
+    tracks = []
+    for change in older.get('tracks', []):
+        track_id = change['track_id']
+        if track_id in ended:
+            continue
+        later = changes.pop(track_id, None)
+        tracks.append(_apply_track_change(change, later) if later else change)
+    tracks.extend(changes.values())
+
+    reappeared = {change['track_id'] for change in newer.get('tracks', [])}
+    ended_tracks = [track_id for track_id in older.get('ended', []) if track_id not in reappeared]
+    ended_tracks.extend(track_id for track_id in newer.get('ended', []) if track_id not in ended_tracks)
+
+    # The folded delta applies to the older delta's baseline
+    return dict(newer, base_seq=older.get('base_seq'), tracks=tracks, ended=ended_tracks)
@@ -0,0 +1,419 @@
+import csv
+import io
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+from sqlalchemy import text
+from app import db
+from app.models.track import tracks, recognitions
+
+logger = logging.getLogger(__name__)
+
+TABLES = {table.name: table for table in (tracks, recognitions)}
+PARTITION_FORMAT = '%Y%m%d'
+# Spill segments are replayed only while the queue is below this fraction
+REPLAY_QUEUE_FRACTION = 0.25
+RETENTION_CHECK_INTERVAL = 3600.0
+MAX_RETRY_BACKOFF = 30.0
+# A spill segment whose replay keeps failing for reasons other than the
+# database being unreachable is set aside after this many attempts
+MAX_REPLAY_ATTEMPTS = 5
+
+
+def record_time(timestamp) -> datetime:
+    """Naive UTC datetime for a record timestamp in epoch seconds or ms"""
+    timestamp = float(timestamp)
+    if timestamp > 1e11:
+        timestamp /= 1000.0
+    return datetime.utcfromtimestamp(timestamp)
+
+
+def track_rows(camera_id: int, when: datetime, items: List[Dict[str, Any]]) -> List[tuple]:
+    rows = []
+    for track in items:
+        trajectory = track.get('trajectory')
+        rows.append((
+            camera_id, _text(track.get('track_id')), _integer(track.get('person_id')),
+            track.get('bbox'), track.get('confidence'), when,
+            {'trajectory': trajectory} if trajectory else None
+        ))
+    return rows
+
+
+def recognition_rows(camera_id: int, when: datetime, items: List[Dict[str, Any]]) -> List[tuple]:
+    return [(
+        camera_id, _text(recognition.get('track_id')), _integer(recognition.get('person_id')),
+        recognition.get('name'), recognition.get('bbox'), recognition.get('confidence'), when
+    ) for recognition in items]
+
+
+ROW_BUILDERS = {'tracks': track_rows, 'recognitions': recognition_rows}
+
+
+def _text(value) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def _integer(value) -> Optional[int]:
+    try:
+        return None if value is None else int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _error_kind(error: Optional[Exception]) -> str:
+    """Classify a DB-API error as 'data', 'unavailable' or 'other'"""
+    error = getattr(error, 'orig', None) or error
+    names = {cls.__name__ for cls in type(error).__mro__}
+    if names & {'DataError', 'IntegrityError'}:
+        return 'data'
+    if names & {'OperationalError', 'InterfaceError'}:
+        return 'unavailable'
+    return 'other'
+
+
+class TrackPartitions:
+    """Daily range partitions of the time-series tables (PostgreSQL only)"""
+
+    def __init__(self, retention_days: int = 30):
+        self.retention_days = retention_days
+        self.known = set()
+
+    @staticmethod
+    def name(table: str, day) -> str:
+        return f'{table}_p{day.strftime(PARTITION_FORMAT)}'
+
+    def ensure(self, connection, table: str, days) -> List[tuple]:
+        """Create the partitions covering `days` that are not known yet
+
+        Returns their keys, to be passed to mark() once the transaction has
+        committed; a rollback also undoes the CREATE TABLE.
+        """
+        created = []
+        for day in days:
+            if (table, day) in self.known:
+                continue
+            start = datetime(day.year, day.month, day.day)
+            connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {self.name(table, day)} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{(start + timedelta(days=1)).isoformat()}')"
+            ))
+            created.append((table, day))
+        return created
+
+    def mark(self, keys: List[tuple]):
+        self.known.update(keys)
+
+    def drop_expired(self, connection, table: str) -> List[str]:
+        """Drop whole partitions older than the retention window"""
+        cutoff = (datetime.utcnow() - timedelta(days=self.retention_days)).strftime(PARTITION_FORMAT)
+        names = connection.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "WHERE parent.relname = :table"
+        ), {'table': table}).scalars().all()
+
+        dropped = []
+        prefix = f'{table}_p'
+        for name in sorted(names):
+            suffix = name[len(prefix):]
+            if name.startswith(prefix) and suffix.isdigit() and suffix < cutoff:
+                connection.execute(text(f'DROP TABLE IF EXISTS {name}'))
+                dropped.append(name)
+        self.known = {(t, day) for t, day in self.known if day.strftime(PARTITION_FORMAT) >= cutoff}
+        return dropped
+
+
+class TrackWriter:
+    """Write-behind persistence of track and recognition records
+
+    The bridge hands over whole records with add(), which never blocks: a
+    full queue drops the record and counts it. A writer thread turns records
+    into rows and flushes every `batch_size` rows or `flush_interval_ms`,
+    with COPY on PostgreSQL and one executemany elsewhere. While inserts
+    fail, or while the queue is backing up because the database is slow,
+    batches are appended to NDJSON segments under `spill_dir` instead. The
+    segments are replayed once the database keeps up again.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.engine = None
+        self.batch_size = 500
+        self.flush_interval = 0.2
+        self.queue = queue.Queue(maxsize=10000)
+        self.spill_dir = 'data/spill'
+        self.spill_max_bytes = 1024 * 1024 * 1024
+        self.spill_bytes = 0
+        self.partitions = TrackPartitions()
+        self.running = False
+        self.thread = None
+        self.retry_at = 0.0
+        self.backoff = 1.0
+        self.last_retention_check = 0.0
+        self.last_error: Optional[Exception] = None
+        self.replay_attempts: Dict[str, int] = {}
+        self.stats = {'queued': 0, 'written': 0, 'spilled': 0, 'replayed': 0,
+                      'dropped': 0, 'rejected': 0, 'rejected_segments': 0, 'batches': 0, 'failures': 0,
+                      'last_flush_ms': 0.0}
+
+    def configure(self, app, batch_size: int, flush_interval_ms: int, queue_size: int,
+                  spill_dir: str, spill_max_bytes: int, retention_days: int):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_bytes
+        self.partitions = TrackPartitions(retention_days)
+
+    def add(self, table: str, camera_id, timestamp, items: List[Dict[str, Any]]):
+        """Queue one record's items for persistence without blocking"""
+        if not items:
+            return
+        try:
+            self.queue.put_nowait((table, camera_id, timestamp, items))
+            self.stats['queued'] += len(items)
+        except queue.Full:
+            self.stats['dropped'] += len(items)
+
+    def start(self):
+        if self.running:
+            return
+        if self.app is None:
+            raise RuntimeError("TrackWriter.configure() must be called before start()")
+        with self.app.app_context():
+            self.engine = db.engine
+        self.spill_bytes = sum(os.path.getsize(path) for path in self._spill_files())
+
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='track-writer')
+        self.thread.daemon = True
+        self.thread.start()
+        logger.info(f"Track writer started (batch {self.batch_size} rows, "
+                    f"every {int(self.flush_interval * 1000)} ms)")
+
+    def stop(self):
+        """Stop the writer after flushing what is queued"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=10)
+            self.thread = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats, queue_depth=self.queue.qsize(), spill_bytes=self.spill_bytes)
+
+    @property
+    def use_postgres(self) -> bool:
+        return self.engine is not None and self.engine.dialect.name == 'postgresql'
+
+    def _run(self):
+        buffers: Dict[str, List[tuple]] = {name: [] for name in TABLES}
+        pending = 0
+        deadline = time.monotonic() + self.flush_interval
+        while self.running or not self.queue.empty():
+            try:
+                table, camera_id, timestamp, items = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                pass
+            else:
+                try:
+                    pending += self._buffer(buffers[table], table, camera_id, timestamp, items)
+                except Exception as e:
+                    # One bad record must never stop the writer thread
+                    logger.error(f"Error buffering {table} record: {str(e)}")
+                if pending < self.batch_size and time.monotonic() < deadline:
+                    continue
+
+            try:
+                if pending:
+                    self._flush(buffers)
+                    pending = 0
+                self._maintain()
+            except Exception as e:
+                logger.error(f"Error in track writer: {str(e)}")
+            deadline = time.monotonic() + self.flush_interval
+
+        if pending:
+            self._flush(buffers)
+
+    def _buffer(self, rows: List[tuple], table: str, camera_id, timestamp, items) -> int:
+        try:
+            built = ROW_BUILDERS[table](int(camera_id), record_time(timestamp), items)
+        except (TypeError, ValueError, AttributeError, OverflowError, OSError):
+            # OverflowError/OSError: timestamps outside the platform's range
+            self.stats['rejected'] += len(items)
+            return 0
+        rows.extend(built)
+        return len(built)
+
+    def _flush(self, buffers: Dict[str, List[tuple]]):
+        started = time.monotonic()
+        # A backed-up queue means the database is not keeping up: park the
+        # batch on disk rather than fall further behind the live stream
+        congested = self.queue.qsize() >= self.queue.maxsize // 2
+        for table, rows in buffers.items():
+            if not rows:
+                continue
+            if congested or time.monotonic() < self.retry_at or not self._insert(table, rows):
+                self._spill(table, rows)
+            else:
+                self.stats['written'] += len(rows)
+            buffers[table] = []
+        self.stats['batches'] += 1
+        self.stats['last_flush_ms'] = round((time.monotonic() - started) * 1000, 2)
+
+    def _insert(self, table: str, rows: List[tuple]) -> bool:
+        created = []
+        try:
+            with self.engine.begin() as connection:
+                if self.use_postgres:
+                    days = {row_time.date() for row_time in self._times(table, rows)}
+                    created = self.partitions.ensure(connection, table, days)
+                    self._copy(connection, table, rows)
+                else:
+                    columns = [column.name for column in TABLES[table].columns]
+                    connection.execute(TABLES[table].insert(), [dict(zip(columns, row)) for row in rows])
+        except Exception as e:
+            self.last_error = e
+            self.stats['failures'] += 1
+            self.retry_at = time.monotonic() + self.backoff
+            logger.warning(f"Writing {len(rows)} {table} rows failed, spilling to disk "
+                           f"for {self.backoff:.0f} s: {str(e)}")
+            self.backoff = min(self.backoff * 2, MAX_RETRY_BACKOFF)
+            return False
+
+        self.partitions.mark(created)
+        self.backoff = 1.0
+        return True
+
+    @staticmethod
+    def _times(table: str, rows: List[tuple]):
+        index = [column.name for column in TABLES[table].columns].index('timestamp')
+        return (row[index] for row in rows)
+
+    @staticmethod
+    def _copy(connection, table: str, rows: List[tuple]):
+        """Stream rows through COPY ... FROM STDIN, the fastest bulk path"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([
+                json.dumps(value) if isinstance(value, (dict, list))
+                else value.isoformat() if isinstance(value, datetime)
+                else value
+                for value in row
+            ])
+        buffer.seek(0)
+
+        columns = ', '.join(f'"{column.name}"' for column in TABLES[table].columns)
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert(f'COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+        finally:
+            cursor.close()
+
+    def _spill(self, table: str, rows: List[tuple]):
+        lines = ''.join(json.dumps(row, default=lambda value: value.isoformat()) + '\n' for row in rows)
+        if self.spill_bytes + len(lines) > self.spill_max_bytes:
+            self.stats['dropped'] += len(rows)
+            logger.error(f"Spill directory is full, dropped {len(rows)} {table} rows")
+            return
+
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = os.path.join(self.spill_dir, f'{table}-{time.time_ns()}.ndjson')
+        # Readers only ever see complete segments
+        with open(f'{path}.tmp', 'w') as f:
+            f.write(lines)
+        os.replace(f'{path}.tmp', path)
+        self.spill_bytes += len(lines)
+        self.stats['spilled'] += len(rows)
+
+    def _spill_files(self) -> List[str]:
+        if not os.path.isdir(self.spill_dir):
+            return []
+        return sorted(os.path.join(self.spill_dir, name) for name in os.listdir(self.spill_dir)
+                      if name.endswith('.ndjson'))
+
+    def _maintain(self):
+        """Replay one spill segment and drop expired partitions when due"""
+        if self.spill_bytes and time.monotonic() >= self.retry_at \
+                and self.queue.qsize() < self.queue.maxsize * REPLAY_QUEUE_FRACTION:
+            files = self._spill_files()
+            if files:
+                self._replay(files[0])
+            else:
+                self.spill_bytes = 0
+
+        if time.monotonic() - self.last_retention_check >= RETENTION_CHECK_INTERVAL:
+            self.last_retention_check = time.monotonic()
+            self._apply_retention()
+
+    def _replay(self, path: str):
+        table = os.path.basename(path).rsplit('-', 1)[0]
+        if table not in TABLES:
+            logger.warning(f"Ignoring unknown spill segment {path}")
+            os.replace(path, f'{path}.unknown')
+            return
+
+        timestamp_index = [column.name for column in TABLES[table].columns].index('timestamp')
+        rows = []
+        try:
+            with open(path) as f:
+                for line in f:
+                    row = json.loads(line)
+                    row[timestamp_index] = datetime.fromisoformat(row[timestamp_index])
+                    rows.append(tuple(row))
+        except (ValueError, TypeError, IndexError) as e:
+            self._set_aside(path, f"unreadable: {str(e)}")
+            return
+
+        retry_at, backoff = self.retry_at, self.backoff
+        if self._insert(table, rows):
+            size = os.path.getsize(path)
+            os.remove(path)
+            self.replay_attempts.pop(path, None)
+            self.spill_bytes = max(0, self.spill_bytes - size)
+            self.stats['replayed'] += len(rows)
+            self.stats['written'] += len(rows)
+            logger.info(f"Replayed {len(rows)} spilled {table} rows")
+            return
+
+        if _error_kind(self.last_error) == 'unavailable':
+            # The database is down, not the segment; retry it as usual
+            return
+        # The segment itself is at fault, so live batches need not back off
+        self.retry_at, self.backoff = retry_at, backoff
+        attempts = self.replay_attempts.get(path, 0) + 1
+        self.replay_attempts[path] = attempts
+        if _error_kind(self.last_error) == 'data' or attempts >= MAX_REPLAY_ATTEMPTS:
+            self._set_aside(path, f"rejected after {attempts} attempts: {str(self.last_error)}")
+
+    def _set_aside(self, path: str, reason: str):
+        """Move a segment that cannot be replayed out of the way as .bad"""
+        size = os.path.getsize(path)
+        os.replace(path, f'{path}.bad')
+        self.replay_attempts.pop(path, None)
+        self.spill_bytes = max(0, self.spill_bytes - size)
+        self.stats['rejected_segments'] += 1
+        logger.error(f"Set aside spill segment {path}, {reason}")
+
+    def _apply_retention(self):
+        cutoff = datetime.utcnow() - timedelta(days=self.partitions.retention_days)
+        with self.engine.begin() as connection:
+            for name, table in TABLES.items():
+                if self.use_postgres:
+                    dropped = self.partitions.drop_expired(connection, name)
+                    if dropped:
+                        logger.info(f"Dropped expired partitions {', '.join(dropped)}")
+                else:
+                    connection.execute(table.delete().where(table.c.timestamp < cutoff))
+
+
+track_writer = TrackWriter()
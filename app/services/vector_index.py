@@ -0,0 +1,472 @@
+import logging
+import os
+import threading
+from typing import Optional, Dict, Any, List, Tuple
+import numpy as np
+from sqlalchemy import event
+from app import db
+from app.models.person import Person, Embedding
+
+logger = logging.getLogger(__name__)
+
+FLAT = 'flat'
+IVF = 'ivf'
+IVFPQ = 'ivfpq'
+INDEX_MODES = (FLAT, IVF, IVFPQ)
+
+# Gallery rows scored per matrix product, bounds the score buffer
+SEARCH_BLOCK = 65536
+# Vectors k-means is trained on, for IVF centroids and PQ codebooks
+TRAIN_SAMPLE = 65536
+PQ_TRAIN_SAMPLE = 16384
+
+
+def decode_embedding(blob: bytes) -> np.ndarray:
+    """Read an embeddings.embedding value as a float32 vector"""
+    return np.frombuffer(blob, dtype=np.float32)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length so dot products are cosine similarities"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def kmeans(data: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Plain L2 k-means, returns the centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=k, replace=len(data) < k)].copy()
+    for _ in range(iterations):
+        labels = nearest(data, centroids)
+        counts = np.bincount(labels, minlength=k)
+        empty = counts == 0
+        # Sum each cluster's members from one sorted pass
+        starts = np.cumsum(counts) - counts
+        sums = np.add.reduceat(data[np.argsort(labels, kind='stable')], starts[~empty], axis=0)
+        centroids[~empty] = sums / counts[~empty, None]
+        # Reseed empty clusters with random points
+        if empty.any():
+            centroids[empty] = data[rng.choice(len(data), size=int(empty.sum()))]
+    return centroids
+
+
+def nearest(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the closest centroid (L2) for each row"""
+    labels = np.empty(len(data), dtype=np.int32)
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    for start in range(0, len(data), SEARCH_BLOCK):
+        block = data[start:start + SEARCH_BLOCK]
+        distances = centroid_norms[None, :] - 2.0 * (block @ centroids.T)
+        labels[start:start + len(block)] = distances.argmin(axis=1)
+    return labels
+
+
+class VectorIndex:
+    """Cosine similarity index over face embeddings
+
+    Vectors are kept L2-normalised in contiguous float32 matrices next to
+    parallel arrays of embedding and person ids. A gallery opened from a
+    snapshot stays a read-only memory map shared by every worker (the base
+    segment): deletes there only set a tombstone, and new vectors go to an
+    in-memory tail that grows and swap-removes. A search is a matrix product
+    against both segments, processed in blocks and reduced to the top k with
+    argpartition.
+
+    In 'ivf' mode, k-means centroids split the gallery into `nlist` lists, and
+    a query is only scored against the `nprobe` lists nearest to it. 'ivfpq'
+    also stores product-quantised codes (`pq_m` bytes per vector): the
+    candidates are scored from lookup tables, and only the best `rerank` are
+    rescored exactly. Until the index is trained it searches the whole
+    gallery.
+    """
+
+    def __init__(self, mode: str = FLAT, nlist: int = 1024, nprobe: int = 16,
+                 pq_m: int = 32, rerank: int = 256):
+        if mode not in INDEX_MODES:
+            raise ValueError(f"Unknown vector index mode: {mode}")
+        self.mode = mode
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.rerank = rerank
+
+        self.dim: Optional[int] = None
+        # Rows [0, base_count) live in `base`, the rest in `tail`
+        self.base: Optional[np.ndarray] = None
+        self.base_count = 0
+        self.deleted = np.zeros(0, dtype=bool)
+        self.dead = 0
+        self.tail = np.empty((0, 0), dtype=np.float32)
+        self.count = 0
+        self.embedding_ids = np.empty(0, dtype=np.int64)
+        self.person_ids = np.empty(0, dtype=np.int64)
+        self.positions: Dict[int, int] = {}
+
+        self.centroids: Optional[np.ndarray] = None
+        self.lists = np.empty(0, dtype=np.int32)
+        self.codebooks: Optional[np.ndarray] = None
+        self.codes = np.empty((0, 0), dtype=np.uint8)
+
+        self.loaded = False
+        self.lock = threading.RLock()
+
+    # Building
+
+    def load(self, embedding_ids: np.ndarray, person_ids: np.ndarray, matrix: np.ndarray,
+             normalized: bool = False):
+        """Replace the index contents with prepared arrays
+
+        A read-only matrix (a memory-mapped snapshot) becomes the shared base
+        segment and is never copied.
+        """
+        with self.lock:
+            matrix = matrix if normalized else normalize(matrix)
+            count = len(embedding_ids)
+            if matrix.flags.writeable:
+                self.base, self.base_count = None, 0
+                self.tail = matrix
+            else:
+                self.base, self.base_count = matrix, count
+                self.tail = np.empty((0, matrix.shape[1]), dtype=np.float32)
+            self.deleted = np.zeros(self.base_count, dtype=bool)
+            self.dead = 0
+            self.count = count
+            self.dim = matrix.shape[1] if count else self.dim
+            self.embedding_ids = np.array(embedding_ids, dtype=np.int64)
+            self.person_ids = np.array(person_ids, dtype=np.int64)
+            self.positions = {embedding_id: row for row, embedding_id in enumerate(self.embedding_ids.tolist())}
+            self.centroids = None
+            self.codebooks = None
+            self.loaded = True
+            if self.mode != FLAT:
+                self.train()
+
+    def load_from_db(self, batch_size: int = 10000):
+        """Read every embedding row into the index"""
+        embedding_ids, person_ids, vectors = [], [], []
+        query = db.session.query(Embedding.id, Embedding.person_id, Embedding.embedding).order_by(Embedding.id)
+        for embedding_id, person_id, blob in query.yield_per(batch_size):
+            vector = decode_embedding(blob)
+            if vectors and len(vector) != len(vectors[0]):
+                logger.warning(f"Skipping embedding {embedding_id} with dimension {len(vector)}")
+                continue
+            embedding_ids.append(embedding_id)
+            person_ids.append(person_id or 0)
+            vectors.append(vector)
+
+        matrix = np.vstack(vectors) if vectors else np.empty((0, self.dim or 0), dtype=np.float32)
+        self.load(np.array(embedding_ids), np.array(person_ids), matrix)
+        logger.info(f"Loaded {self.count} embeddings into the vector index")
+
+    def train(self, iterations: int = 10):
+        """Fit IVF centroids (and PQ codebooks) on a sample of the gallery"""
+        with self.lock:
+            live = self._live_rows()
+            if self.mode == FLAT or len(live) < self.nlist:
+                return
+            rng = np.random.default_rng(0)
+            if len(live) > TRAIN_SAMPLE:
+                live = np.sort(rng.choice(live, TRAIN_SAMPLE, replace=False))
+            sample = self._vectors(live)
+
+            self.centroids = kmeans(sample, self.nlist, iterations)
+            self.lists = np.empty(len(self.embedding_ids), dtype=np.int32)
+            for start, block in self._blocks():
+                self.lists[start:start + len(block)] = nearest(block, self.centroids)
+            # Tombstoned rows point at a list that is never probed
+            self.lists[:self.base_count][self.deleted] = self.nlist
+
+            if self.mode == IVFPQ:
+                if self.dim % self.pq_m:
+                    raise ValueError(f"Embedding dimension {self.dim} is not divisible by pq_m={self.pq_m}")
+                sub = self.dim // self.pq_m
+                pq_sample = sample[:PQ_TRAIN_SAMPLE]
+                self.codebooks = np.stack([
+                    kmeans(np.ascontiguousarray(pq_sample[:, j * sub:(j + 1) * sub]), 256, iterations)
+                    for j in range(self.pq_m)
+                ])
+                self.codes = np.empty((len(self.embedding_ids), self.pq_m), dtype=np.uint8)
+                for start, block in self._blocks():
+                    self.codes[start:start + len(block)] = self._encode(block)
+            logger.info(f"Trained {self.mode} vector index with {self.nlist} lists on {len(sample)} vectors")
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        sub = self.dim // self.pq_m
+        return np.stack([
+            nearest(np.ascontiguousarray(vectors[:, j * sub:(j + 1) * sub]), self.codebooks[j])
+            for j in range(self.pq_m)
+        ], axis=1).astype(np.uint8)
+
+    # Incremental updates
+
+    def add(self, embedding_ids, person_ids, vectors):
+        """Add or replace embeddings"""
+        vectors = normalize(vectors)
+        with self.lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional embeddings, got {vectors.shape[1]}")
+            for embedding_id in embedding_ids:
+                self._remove(int(embedding_id))
+
+            self._reserve(self.count + len(vectors))
+            rows = slice(self.count, self.count + len(vectors))
+            tail_rows = slice(rows.start - self.base_count, rows.stop - self.base_count)
+            self.tail[tail_rows] = vectors
+            self.embedding_ids[rows] = embedding_ids
+            self.person_ids[rows] = person_ids
+            if self.centroids is not None:
+                self.lists[rows] = nearest(vectors, self.centroids)
+                if self.codebooks is not None:
+                    self.codes[rows] = self._encode(vectors)
+            for offset, embedding_id in enumerate(embedding_ids):
+                self.positions[int(embedding_id)] = self.count + offset
+            self.count += len(vectors)
+
+    def remove(self, embedding_id: int):
+        with self.lock:
+            self._remove(int(embedding_id))
+
+    def remove_person(self, person_id: int):
+        """Drop every embedding of a person"""
+        with self.lock:
+            rows = np.flatnonzero(self.person_ids[:self.count] == person_id)
+            for embedding_id in self.embedding_ids[rows].tolist():
+                self._remove(embedding_id)
+
+    def _remove(self, embedding_id: int):
+        row = self.positions.pop(embedding_id, None)
+        if row is None:
+            return
+
+        if row < self.base_count:
+            # The shared base is read-only, so only mark the row dead
+            self.deleted[row] = True
+            self.dead += 1
+            if self.centroids is not None:
+                self.lists[row] = self.nlist
+            return
+
+        # Move the last tail row into the hole so the tail stays contiguous
+        last = self.count - 1
+        if row != last:
+            self.tail[row - self.base_count] = self.tail[last - self.base_count]
+            self.embedding_ids[row] = self.embedding_ids[last]
+            self.person_ids[row] = self.person_ids[last]
+            if self.centroids is not None:
+                self.lists[row] = self.lists[last]
+                if self.codebooks is not None:
+                    self.codes[row] = self.codes[last]
+            self.positions[int(self.embedding_ids[row])] = row
+        self.count = last
+
+    def _reserve(self, size: int):
+        capacity = len(self.embedding_ids)
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2, self.base_count + 1024)
+        used = self.count - self.base_count
+
+        def grow(array, shape, dtype, filled):
+            grown = np.empty(shape, dtype=dtype)
+            if filled:
+                grown[:filled] = array[:filled]
+            return grown
+
+        self.tail = grow(self.tail, (capacity - self.base_count, self.dim), np.float32, used)
+        self.embedding_ids = grow(self.embedding_ids, capacity, np.int64, self.count)
+        self.person_ids = grow(self.person_ids, capacity, np.int64, self.count)
+        if self.centroids is not None:
+            self.lists = grow(self.lists, capacity, np.int32, self.count)
+            if self.codebooks is not None:
+                self.codes = grow(self.codes, (capacity, self.pq_m), np.uint8, self.count)
+
+    # Row access across the base and tail segments
+
+    def _blocks(self):
+        """Yield (first row, vectors) over every row, dead base rows included"""
+        for start in range(0, self.base_count, SEARCH_BLOCK):
+            yield start, self.base[start:min(start + SEARCH_BLOCK, self.base_count)]
+        used = self.count - self.base_count
+        for start in range(0, used, SEARCH_BLOCK):
+            yield self.base_count + start, self.tail[start:min(start + SEARCH_BLOCK, used)]
+
+    def _vectors(self, rows: np.ndarray) -> np.ndarray:
+        if not self.base_count:
+            return self.tail[rows]
+        in_base = rows < self.base_count
+        vectors = np.empty((len(rows), self.dim), dtype=np.float32)
+        vectors[in_base] = self.base[rows[in_base]]
+        vectors[~in_base] = self.tail[rows[~in_base] - self.base_count]
+        return vectors
+
+    def _live_rows(self) -> np.ndarray:
+        rows = np.arange(self.count)
+        if self.dead:
+            rows = rows[np.concatenate([~self.deleted, np.ones(self.count - self.base_count, dtype=bool)])]
+        return rows
+
+    # Searching
+
+    def search(self, queries, k: int = 10) -> List[List[Tuple[int, int, float]]]:
+        """Top-k (embedding_id, person_id, score) for each query vector"""
+        queries = normalize(queries)
+        with self.lock:
+            if not len(self) or k <= 0:
+                return [[] for _ in queries]
+            if queries.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional queries, got {queries.shape[1]}")
+
+            if self.centroids is None:
+                scores, rows = self._search_flat(queries, k)
+            else:
+                scores, rows = self._search_ivf(queries, k)
+
+            results = []
+            for query_scores, query_rows in zip(scores, rows):
+                valid = (query_rows >= 0) & np.isfinite(query_scores)
+                results.append([
+                    (int(self.embedding_ids[row]), int(self.person_ids[row]), float(score))
+                    for row, score in zip(query_rows[valid], query_scores[valid])
+                ])
+            return results
+
+    def search_persons(self, queries, k: int = 10, exclude_person: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Best-matching persons for one or more query vectors of one face
+
+        Scores are the best cosine similarity of any embedding of a person
+        against any of the queries.
+        """
+        best: Dict[int, float] = {}
+        # Several embeddings per person, so over-fetch before grouping
+        for matches in self.search(queries, k * 4):
+            for _, person_id, score in matches:
+                if person_id != exclude_person and score > best.get(person_id, -2.0):
+                    best[person_id] = score
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [{'person_id': person_id, 'score': round(score, 4)} for person_id, score in ranked]
+
+    def _search_flat(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        k = min(k, self.count)
+        top_scores = np.empty((len(queries), 0), dtype=np.float32)
+        top_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start, block in self._blocks():
+            block_scores = queries @ block.T
+            if start < self.base_count and self.dead:
+                block_scores[:, self.deleted[start:start + len(block)]] = -np.inf
+            scores = np.concatenate([top_scores, block_scores], axis=1)
+            rows = np.concatenate([top_rows, np.broadcast_to(
+                np.arange(start, start + len(block)), (len(queries), len(block)))], axis=1)
+            if scores.shape[1] > k:
+                keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                rows = np.take_along_axis(rows, keep, axis=1)
+            top_scores, top_rows = scores, rows
+
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top_scores, order, axis=1), np.take_along_axis(top_rows, order, axis=1)
+
+    def _search_ivf(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        top_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        top_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        nprobe = min(self.nprobe, len(self.centroids))
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        lists = self.lists[:self.count]
+        # One extra slot for tombstoned rows, never probed
+        probed = np.zeros(len(self.centroids) + 1, dtype=bool)
+
+        for i, query in enumerate(queries):
+            probed[:] = False
+            probed[probes[i]] = True
+            candidates = np.flatnonzero(probed[lists])
+            if not len(candidates):
+                continue
+
+            if self.codebooks is not None and len(candidates) > self.rerank:
+                # Score candidates from PQ lookup tables, rescore the best exactly
+                sub = self.dim // self.pq_m
+                tables = np.einsum('jd,jcd->jc', query.reshape(self.pq_m, sub), self.codebooks)
+                approx = tables[np.arange(self.pq_m), self.codes[candidates]].sum(axis=1)
+                keep = np.argpartition(-approx, self.rerank - 1)[:self.rerank]
+                candidates = candidates[keep]
+
+            scores = self._vectors(candidates) @ query
+            count = min(k, len(candidates))
+            keep = np.argpartition(-scores, count - 1)[:count]
+            keep = keep[np.argsort(-scores[keep])]
+            top_scores[i, :count] = scores[keep]
+            top_rows[i, :count] = candidates[keep]
+        return top_scores, top_rows
+
+    def __len__(self):
+        return self.count - self.dead
+
+
+class VectorSearch:
+    """App-wide vector index, loaded on first use
+
+    With a snapshot path the gallery is memory-mapped from the snapshot file
+    (written from the database first if it doesn't exist yet) and only newer
+    rows are read from the database; otherwise every row is read.
+    """
+
+    def __init__(self):
+        self.index = VectorIndex()
+        self.snapshot_path = None
+        self.load_lock = threading.Lock()
+
+    def configure(self, mode: str, nlist: int, nprobe: int, pq_m: int, snapshot_path: Optional[str] = None):
+        self.index = VectorIndex(mode=mode, nlist=nlist, nprobe=nprobe, pq_m=pq_m)
+        self.snapshot_path = snapshot_path or None
+
+    def ensure_loaded(self) -> VectorIndex:
+        if not self.index.loaded:
+            with self.load_lock:
+                if not self.index.loaded:
+                    self._load()
+        return self.index
+
+    def _load(self):
+        if not self.snapshot_path:
+            self.index.load_from_db()
+            return
+
+        from app.services.embedding_snapshot import load_index, write_snapshot
+        if load_index(self.index, self.snapshot_path):
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.snapshot_path)), exist_ok=True)
+            write_snapshot(self.snapshot_path)
+        except OSError as e:
+            logger.error(f"Could not write embedding snapshot {self.snapshot_path}: {str(e)}")
+        if not load_index(self.index, self.snapshot_path):
+            self.index.load_from_db()
+
+
+vector_search = VectorSearch()
+
+
+@event.listens_for(Embedding, 'after_insert')
+@event.listens_for(Embedding, 'after_update')
+def _index_embedding(mapper, connection, target):
+    index = vector_search.index
+    if index.loaded:
+        index.add([target.id], [target.person_id or 0], decode_embedding(target.embedding))
+
+
+@event.listens_for(Embedding, 'after_delete')
+def _unindex_embedding(mapper, connection, target):
+    if vector_search.index.loaded:
+        vector_search.index.remove(target.id)
+
+
+@event.listens_for(Person, 'after_delete')
+def _unindex_person_embeddings(mapper, connection, target):
+    # embeddings rows go with ON DELETE CASCADE, without ORM events
+    if vector_search.index.loaded:
+        vector_search.index.remove_person(target.id)
@@ -0,0 +1,75 @@
+import logging
+from typing import Optional, Dict, Any
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+JSON = 'json'
+MSGPACK = 'msgpack'
+
+# Overlay events that can be sent as binary attachments, with the key that
+# holds their item list
+OVERLAY_ITEMS = {
+    'detection_update': 'detections',
+    'recognition_update': 'recognitions',
+    'tracking_update': 'tracks'
+}
+BINARY_EVENTS = set(OVERLAY_ITEMS) | {'overlay_batch'}
+
+# Packed bbox layout: [x, y, width, height]
+BBOX_FORMAT = 'xywh'
+
+
+def negotiate_encoding(auth: Optional[Dict[str, Any]]) -> str:
+    """Pick the overlay encoding for a client from its connect payload"""
+    requested = (auth or {}).get('encoding', JSON)
+    if requested == MSGPACK:
+        if msgpack is not None:
+            return MSGPACK
+        logger.warning("Client requested msgpack but it is not installed, falling back to JSON")
+    return JSON
+
+
+def _pack_bbox(bbox: Any) -> Any:
+    if isinstance(bbox, dict):
+        return [bbox.get('x', 0), bbox.get('y', 0), bbox.get('width', 0), bbox.get('height', 0)]
+    return bbox
+
+
+def compact_payload(event: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a copy of an overlay payload with bbox dicts packed as arrays"""
+    if event == 'overlay_batch':
+        compacted = dict(payload)
+        compacted['events'] = {
+            name: compact_payload(name, inner) for name, inner in payload.get('events', {}).items()
+        }
+        return compacted
+
+    items_key = OVERLAY_ITEMS.get(event)
+    if items_key is None or items_key not in payload:
+        return payload
+
+    compacted = dict(payload)
+    compacted['bbox_format'] = BBOX_FORMAT
+    packed_items = []
+    for item in payload[items_key]:
+        if 'bbox' in item:
+            item = dict(item)
+            item['bbox'] = _pack_bbox(item['bbox'])
+        packed_items.append(item)
+    compacted[items_key] = packed_items
+    return compacted
+
+
+def encode_overlay(event: str, payload: Dict[str, Any]) -> bytes:
+    """Encode an overlay payload as a MessagePack binary attachment"""
+    return msgpack.packb(compact_payload(event, payload), use_bin_type=True)
+
+
+def decode_overlay(data: bytes) -> Dict[str, Any]:
+    """Decode a MessagePack overlay payload (bboxes stay packed)"""
+    return msgpack.unpackb(data, raw=False)
@@ -0,0 +1,68 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class BlockingPool:
+    """Bounded pool for CPU- or IO-heavy calls made from request handlers
+
+    Under eventlet, calls run on eventlet's native thread pool behind a
+    green semaphore, so the hub keeps serving Socket.IO streams while at
+    most `max_workers` calls run. Other async modes use a ThreadPoolExecutor
+    of the same size. A pool task that calls run() again runs the inner call
+    inline rather than waiting on a slot it may be holding.
+    """
+
+    def __init__(self, max_workers: int = 4, async_mode: str = 'threading', name: str = 'worker'):
+        self.name = name
+        self.executor = None
+        self.local = threading.local()
+        self.configure(max_workers, async_mode)
+
+    def configure(self, max_workers: int, async_mode: str):
+        """Size the pool for the server's async mode"""
+        self.max_workers = max_workers
+        self.async_mode = async_mode
+
+        if self.executor:
+            self.executor.shutdown(wait=False)
+        self.executor = None
+        self.slots = None
+        if async_mode == 'eventlet':
+            from eventlet.semaphore import Semaphore
+            self.slots = Semaphore(max_workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=self.name)
+
+    def run(self, fn, *args):
+        """Call fn on the pool and wait for its result"""
+        if getattr(self.local, 'active', False):
+            return fn(*args)
+        if self.slots is not None:
+            from eventlet import tpool
+            with self.slots:
+                return tpool.execute(self._call, fn, *args)
+        return self.executor.submit(self._call, fn, *args).result()
+
+    def _call(self, fn, *args):
+        self.local.active = True
+        try:
+            return fn(*args)
+        finally:
+            self.local.active = False
+
+    def submit(self, fn, *args):
+        """Call fn on the pool without waiting; errors are only logged"""
+        def call():
+            try:
+                self.run(fn, *args)
+            except Exception as e:
+                logger.error(f"Error in {self.name} pool task: {str(e)}")
+
+        if self.slots is not None:
+            import eventlet
+            eventlet.spawn_n(call)
+        else:
+            self.executor.submit(self._call, call)
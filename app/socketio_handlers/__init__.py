@@ -1,13 +1,21 @@
-from flask_socketio import emit, join_room, leave_room
+from flask import request, current_app
+from flask_socketio import emit, join_room, leave_room, rooms
 from flask_jwt_extended import decode_token
+from app.services.wire_format import negotiate_encoding
+from app.services.overlay_filters import parse_overlay_settings, parse_tier
+from app.services.playback import playback_manager
+from app.services.system_metrics import metrics_sampler, status_summary, ADMIN_ROOM
+from app.api.middleware.auth import is_admin
+from app.socketio_handlers.playback_events import register_playback_handlers
 import logging
-import time
 
 logger = logging.getLogger(__name__)
 
 def register_handlers(socketio):
     """Register all SocketIO event handlers"""
     
+    register_playback_handlers(socketio)
+    
     @socketio.on('connect')
     def handle_connect(auth):
         """Handle client connection with authentication"""
@@ -18,10 +26,21 @@ def register_handlers(socketio):
                 user_id = token_data['sub']['user_id']
                 username = token_data['sub']['username']
                 
+                # Overlay events are sent as MessagePack to clients that ask for it
+                encoding = negotiate_encoding(auth)
+                manager = socketio.server.manager
+                if hasattr(manager, 'set_client_encoding'):
+                    manager.set_client_encoding(request.sid, encoding)
+                
+                # Admins receive performance_metrics and the detailed status
+                if is_admin(token_data['sub'].get('role')):
+                    join_room(ADMIN_ROOM)
+                
                 logger.info(f"User {username} connected successfully")
                 emit('connection_status', {
                     'status': 'connected',
-                    'message': f'Welcome {username}!'
+                    'message': f'Welcome {username}!',
+                    'encoding': encoding
                 })
                 return True
             else:
@@ -43,6 +62,7 @@ def register_handlers(socketio):
     @socketio.on('disconnect')
     def handle_disconnect():
         """Handle client disconnection"""
+        playback_manager.stop_client(request.sid)
         logger.info("Client disconnected")
     
     @socketio.on('join_camera_room')
@@ -51,14 +71,34 @@ def register_handlers(socketio):
         try:
             camera_id = data.get('camera_id')
             if camera_id:
+                try:
+                    tier = parse_tier(data)
+                except ValueError as e:
+                    emit('error', {'message': str(e)})
+                    return
+
                 room = f'camera_{camera_id}'
                 join_room(room)
-                logger.info(f"Client joined camera room: {room}")
+
+                # Thumbnails ask for a reduced or summary tier so they get a
+                # coalesced frame at a lower cadence than the focused view
+                manager = socketio.server.manager
+                if hasattr(manager, 'set_client_tier'):
+                    manager.set_client_tier(request.sid, room, tier)
+
+                logger.info(f"Client joined camera room: {room} ({tier})")
                 emit('room_joined', {
                     'camera_id': camera_id,
                     'room': room,
+                    'tier': tier,
                     'status': 'success'
                 })
+                
+                # Show the latest known state right away instead of waiting
+                # for the next record; it also seeds the track delta baseline
+                bridge = getattr(current_app, 'kafka_bridge', None)
+                if bridge:
+                    bridge.emit_snapshot(camera_id, request.sid)
             else:
                 emit('error', {'message': 'Camera ID required'})
         except Exception as e:
@@ -83,6 +123,36 @@ def register_handlers(socketio):
             logger.error(f"Error leaving camera room: {str(e)}")
             emit('error', {'message': 'Failed to leave camera room'})
     
+    @socketio.on('update_overlay_settings')
+    def handle_update_overlay_settings(data):
+        """Subscribe to a subset of a camera's overlays"""
+        try:
+            camera_id = data.get('camera_id')
+            if not camera_id:
+                emit('error', {'message': 'Camera ID required'})
+                return
+            
+            overlay_filter = parse_overlay_settings(data)
+            room = f'camera_{camera_id}'
+            manager = socketio.server.manager
+            if hasattr(manager, 'set_overlay_filter'):
+                if manager.set_overlay_filter(request.sid, room, overlay_filter):
+                    # Deltas sent from here on need the current baseline
+                    bridge = getattr(current_app, 'kafka_bridge', None)
+                    if bridge:
+                        bridge.emit_track_keyframe(camera_id, request.sid)
+            
+            logger.info(f"Client updated overlay settings for {room}")
+            emit('overlay_settings_updated', {
+                'camera_id': camera_id,
+                'settings': overlay_filter.to_dict()
+            })
+        except ValueError as e:
+            emit('error', {'message': str(e)})
+        except Exception as e:
+            logger.error(f"Error updating overlay settings: {str(e)}")
+            emit('error', {'message': 'Failed to update overlay settings'})
+    
     @socketio.on('request_camera_status')
     def handle_request_camera_status(data):
         """Handle request for current camera status"""
@@ -126,24 +196,12 @@ def register_handlers(socketio):
     def handle_request_system_status():
         """Handle request for system status"""
         try:
-            # This would integrate with actual system monitoring
-            # For now, return mock data
-            system_status = {
-                'services': [
-                    {'name': 'gui-service', 'status': 'running', 'health': 'healthy'},
-                    {'name': 'detection-service', 'status': 'running', 'health': 'healthy'},
-                    {'name': 'recognition-service', 'status': 'running', 'health': 'healthy'},
-                    {'name': 'database', 'status': 'running', 'health': 'healthy'},
-                    {'name': 'kafka', 'status': 'running', 'health': 'healthy'}
-                ],
-                'performance': {
-                    'cpu_usage': 25.5,
-                    'memory_usage': 68.2,
-                    'gpu_usage': 45.0,
-                    'disk_usage': 23.1
-                },
-                'timestamp': int(time.time())
-            }
+            sample = metrics_sampler.latest()
+            if sample is None:
+                emit('error', {'message': 'System metrics not collected yet'})
+                return
+            
+            system_status = status_summary(sample, camel_case=False, detailed=ADMIN_ROOM in rooms())
             
             emit('system_status_update', system_status)
             
@@ -0,0 +1,42 @@
+from flask import request, current_app
+from flask_socketio import emit
+from app.services.playback import playback_manager, parse_time
+import logging
+
+logger = logging.getLogger(__name__)
+
+def register_playback_handlers(socketio):
+    """Register historical playback SocketIO event handlers"""
+
+    @socketio.on('start_playback')
+    def handle_start_playback(data):
+        """Replay a camera's stored tracks and recognitions for a time range"""
+        try:
+            camera_id = data.get('camera_id')
+            if not camera_id:
+                emit('error', {'message': 'Camera ID required'})
+                return
+
+            session = playback_manager.start(
+                current_app._get_current_object(),
+                socketio,
+                request.sid,
+                camera_id,
+                parse_time(data.get('start')),
+                parse_time(data.get('end')),
+                int(data.get('speed', 1))
+            )
+            logger.info(f"Started playback {session.playback_id} of camera {camera_id} at {session.speed}x")
+            emit('playback_started', session.to_dict())
+        except ValueError as e:
+            emit('error', {'message': str(e)})
+        except Exception as e:
+            logger.error(f"Error starting playback: {str(e)}")
+            emit('error', {'message': 'Failed to start playback'})
+
+    @socketio.on('stop_playback')
+    def handle_stop_playback(data):
+        """Stop one of this client's playbacks"""
+        playback_id = (data or {}).get('playback_id')
+        if not playback_manager.stop(playback_id, request.sid):
+            emit('error', {'message': 'Playback not found'})
@@ -0,0 +1,75 @@
+# app/utils/conditional.py
+import hashlib
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional, Dict
+from flask import request, current_app
+from werkzeug.http import http_date, quote_etag
+from app import db
+from app.services.table_versions import table_version
+
+
+class Validator(NamedTuple):
+    """ETag and Last-Modified of a resource, computed without loading it"""
+    etag: str
+    last_modified: Optional[datetime]
+
+    def headers(self) -> Dict[str, str]:
+        # no-cache: clients may store the body but revalidate on every poll
+        headers = {'ETag': quote_etag(self.etag, weak=True), 'Cache-Control': 'private, no-cache'}
+        if self.last_modified is not None:
+            headers['Last-Modified'] = http_date(self.last_modified)
+        return headers
+
+
+def make_validator(*parts, last_modified: Optional[datetime] = None) -> Validator:
+    """Hash the parts that identify a resource's state into an ETag"""
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    if last_modified is not None and last_modified.tzinfo is None:
+        # updated_at columns hold naive UTC
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return Validator(digest, last_modified)
+
+
+def collection_validator(model, scope: str = '') -> Validator:
+    """Validator for a listing of `model`'s table, from its version counter
+
+    Every committed insert, update or delete bumps the table's version (see
+    app.services.table_versions), so the ETag changes with the first write
+    and costs one primary key lookup. No Last-Modified is sent because a
+    delete leaves no timestamp behind. `scope` should carry everything else
+    the response depends on, such as the query string.
+    """
+    table_name = model.__tablename__
+    return make_validator(table_name, scope, table_version(table_name))
+
+
+def row_validator(model, row_id) -> Optional[Validator]:
+    """Validator for one row, or None if it does not exist"""
+    row = db.session.query(model.updated_at).filter(model.id == row_id).first()
+    if row is None:
+        return None
+    return make_validator(model.__tablename__, row_id, row.updated_at, last_modified=row.updated_at)
+
+
+def is_not_modified(validator: Validator) -> bool:
+    """Whether the request's If-None-Match or If-Modified-Since still holds"""
+    if request.if_none_match:
+        # If-None-Match wins over If-Modified-Since when both are sent
+        return request.if_none_match.contains_weak(validator.etag)
+    if validator.last_modified is not None and request.if_modified_since:
+        return validator.last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def not_modified_response(validator: Validator):
+    response = current_app.response_class(status=304)
+    response.headers.update(validator.headers())
+    return response
+
+
+def with_validator(result, validator: Optional[Validator]):
+    """Attach validator headers to a success_response or paginated_response result"""
+    data, status_code = result if isinstance(result, tuple) else (result, 200)
+    if validator is None:
+        return data, status_code
+    return data, status_code, validator.headers()
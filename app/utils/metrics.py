@@ -0,0 +1,219 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Tuple
+
+try:
+    # Greenlets of one hub share an OS thread and never preempt each other
+    # mid-update, so shards are per OS thread even when eventlet is patched
+    from eventlet.patcher import original
+    _get_ident = original('_thread').get_ident
+except ImportError:
+    from _thread import get_ident as _get_ident
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _ThreadShards:
+    """One values dict per OS thread; only the owning thread writes to it"""
+
+    def __init__(self):
+        self.by_thread: Dict[int, dict] = {}
+        self.lock = threading.Lock()
+
+    def local(self) -> dict:
+        values = self.by_thread.get(_get_ident())
+        if values is None:
+            with self.lock:
+                values = self.by_thread.setdefault(_get_ident(), {})
+        return values
+
+    def snapshots(self) -> List[list]:
+        return [list(values.items()) for values in list(self.by_thread.values())]
+
+
+class Counter:
+    """Monotonic counter; labels are passed positionally in labelnames order"""
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.shards = _ThreadShards()
+
+    def inc(self, *labels, amount: float = 1):
+        values = self.shards.local()
+        values[labels] = values.get(labels, 0) + amount
+
+    def samples(self) -> List[Tuple[str, tuple, float]]:
+        totals: Dict[tuple, float] = {}
+        for items in self.shards.snapshots():
+            for labels, value in items:
+                totals[labels] = totals.get(labels, 0) + value
+        return [(f'{self.name}_total', _pairs(self.labelnames, labels), value)
+                for labels, value in sorted(totals.items())]
+
+
+class Histogram:
+    """Latency histogram; bucket counts are cumulated only at scrape time"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.bounds = tuple(sorted(buckets))
+        self.shards = _ThreadShards()
+
+    def observe(self, value: float, *labels):
+        values = self.shards.local()
+        counts = values.get(labels)
+        if counts is None:
+            # One slot per bound, one for +Inf, then the sum
+            counts = values[labels] = [0] * (len(self.bounds) + 1) + [0.0]
+        counts[bisect_left(self.bounds, value)] += 1
+        counts[-1] += value
+
+    def time(self, *labels) -> '_Timer':
+        return _Timer(self, labels)
+
+    def samples(self) -> List[Tuple[str, tuple, float]]:
+        merged: Dict[tuple, list] = {}
+        for items in self.shards.snapshots():
+            for labels, counts in items:
+                counts = counts[:]
+                total = merged.get(labels)
+                merged[labels] = counts if total is None else [a + b for a, b in zip(total, counts)]
+
+        samples = []
+        for labels, counts in sorted(merged.items()):
+            pairs = _pairs(self.labelnames, labels)
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float('inf'),), counts):
+                cumulative += count
+                samples.append((f'{self.name}_bucket', pairs + (('le', _number(bound)),), cumulative))
+            samples.append((f'{self.name}_sum', pairs, counts[-1]))
+            samples.append((f'{self.name}_count', pairs, cumulative))
+        return samples
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram: Histogram, labels: tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Gauge:
+    """Gauge whose values are read from a callback at scrape time"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.callback: Callable[[], Dict[tuple, float]] = dict
+
+    def set_function(self, callback: Callable[[], Dict[tuple, float]]):
+        self.callback = callback
+
+    def samples(self) -> List[Tuple[str, tuple, float]]:
+        return [(self.name, _pairs(self.labelnames, labels), value)
+                for labels, value in sorted(self.callback().items())]
+
+
+def _pairs(labelnames: Tuple[str, ...], labels: tuple) -> tuple:
+    return tuple(zip(labelnames, (str(label) for label in labels)))
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Registry:
+    """Metrics exposed on /metrics in the Prometheus text format"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, pairs, value in metric.samples():
+                if pairs:
+                    labels = ','.join(f'{key}="{_escape(label)}"' for key, label in pairs)
+                    name = f'{name}{{{labels}}}'
+                lines.append(f'{name} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.register(Counter(
+    'http_requests', 'REST requests by blueprint, resource, method and status',
+    ('blueprint', 'resource', 'method', 'status')))
+HTTP_LATENCY = registry.register(Histogram(
+    'http_request_duration_seconds', 'REST handler latency by blueprint and resource',
+    ('blueprint', 'resource', 'method')))
+TOKEN_CHECK_LATENCY = registry.register(Histogram(
+    'token_required_duration_seconds', 'Time spent authenticating requests in token_required'))
+SCHEMA_DUMP_LATENCY = registry.register(Histogram(
+    'schema_dump_duration_seconds', 'Marshmallow dump time by schema', ('schema',)))
+KAFKA_POLL_TO_EMIT = registry.register(Histogram(
+    'kafka_poll_to_emit_seconds', 'Time from a record being polled to its emit by topic', ('topic',)))
+KAFKA_DROPPED = registry.register(Counter(
+    'kafka_records_dropped', 'Kafka records dropped by the bridge by topic and reason', ('topic', 'reason')))
+SOCKETIO_ROOM_CLIENTS = registry.register(Gauge(
+    'socketio_room_clients', 'Clients in each camera room', ('room',)))
+
+
+class TimedDumpMixin:
+    """Record marshmallow dump time per schema class"""
+
+    def dump(self, obj, *, many=None):
+        with SCHEMA_DUMP_LATENCY.time(type(self).__name__):
+            return super().dump(obj, many=many)
+
+
+def instrument_app(app):
+    """Time every REST request by blueprint and resource"""
+    from flask import g, request
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            blueprint = request.blueprint or 'app'
+            resource = request.endpoint.rsplit('.', 1)[-1] if request.endpoint else 'unmatched'
+            HTTP_LATENCY.observe(time.perf_counter() - started, blueprint, resource, request.method)
+            HTTP_REQUESTS.inc(blueprint, resource, request.method, response.status_code)
+        return response
@@ -0,0 +1,183 @@
+# app/utils/pagination.py
+import base64
+import json
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+from sqlalchemy import and_, or_, text
+from app import db
+
+COUNT_CACHE_TTL = 10.0
+COUNT_MODES = ('none', 'exact', 'estimate')
+MAX_PER_PAGE = 100
+
+_count_cache: Dict[str, Tuple[int, float]] = {}
+_count_cache_lock = threading.Lock()
+
+
+def parse_page_args(args) -> Tuple[int, int]:
+    """Read `page` and `per_page` from request args, capping per_page at MAX_PER_PAGE"""
+    try:
+        page = int(args.get('page', 1))
+        per_page = int(args.get('per_page', 20))
+    except ValueError:
+        raise ValueError("page and per_page must be integers")
+    if page < 1 or per_page < 1:
+        raise ValueError("page and per_page must be at least 1")
+    return page, min(per_page, MAX_PER_PAGE)
+
+
+def encode_cursor(values: Dict[str, Any]) -> str:
+    """Pack the last row's sort key into an opaque, URL-safe cursor"""
+    raw = json.dumps(values, separators=(',', ':'), default=lambda value: value.isoformat())
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Unpack a cursor made by encode_cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, dict) or 'id' not in values:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def parse_sort(sort: Optional[str], model, allowed: Tuple[str, ...]) -> Tuple[str, bool]:
+    """Read a `sort` argument such as 'name' or '-created_at'"""
+    sort = sort or 'id'
+    descending = sort.startswith('-')
+    key = sort.lstrip('-')
+    if key not in allowed or not hasattr(model, key):
+        raise ValueError(f"sort must be one of {', '.join(allowed)}, optionally prefixed with '-'")
+    return key, descending
+
+
+def _cursor_value(sort_column, value):
+    """Check a cursor's sort value against the column type"""
+    if value is None:
+        return None
+    if isinstance(sort_column.type, db.DateTime):
+        try:
+            return datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+    if isinstance(sort_column.type, db.String):
+        if not isinstance(value, str):
+            raise ValueError("Invalid cursor")
+        return value
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError("Invalid cursor")
+    return value
+
+
+def keyset_page(query, model, sort_key: str, descending: bool, cursor: Optional[str],
+                per_page: int) -> Tuple[List[Any], Optional[str]]:
+    """Fetch the page after `cursor` ordered by (sort_key, id)
+
+    Seeks past the last row of the previous page instead of using OFFSET, so
+    every page costs the same however deep it is. NULL sort values order as
+    the largest, as in a default PostgreSQL index. Returns the rows and the
+    cursor of the next page, or None on the last page.
+    """
+    if per_page < 1:
+        raise ValueError("per_page must be at least 1")
+    id_column = model.id
+    sort_column = getattr(model, sort_key)
+
+    if cursor:
+        values = decode_cursor(cursor)
+        if values.get('sort') != sort_key:
+            raise ValueError("Cursor was issued for a different sort order")
+        last_id = values['id']
+        if isinstance(last_id, bool) or not isinstance(last_id, int):
+            raise ValueError("Invalid cursor")
+        if sort_key == 'id':
+            query = query.filter(id_column < last_id if descending else id_column > last_id)
+        else:
+            last_value = _cursor_value(sort_column, values.get('value'))
+            if last_value is None:
+                # The previous page ended among the NULLs
+                if descending:
+                    query = query.filter(or_(sort_column.isnot(None),
+                                             and_(sort_column.is_(None), id_column < last_id)))
+                else:
+                    query = query.filter(sort_column.is_(None), id_column > last_id)
+            elif descending:
+                query = query.filter(or_(sort_column < last_value,
+                                         and_(sort_column == last_value, id_column < last_id)))
+            else:
+                query = query.filter(or_(sort_column > last_value,
+                                         and_(sort_column == last_value, id_column > last_id),
+                                         sort_column.is_(None)))
+
+    if sort_key == 'id':
+        order = [id_column.desc() if descending else id_column.asc()]
+    elif descending:
+        order = [sort_column.desc().nulls_first(), id_column.desc()]
+    else:
+        order = [sort_column.asc().nulls_last(), id_column.asc()]
+
+    # One extra row tells whether there is a next page without counting
+    rows = query.order_by(*order).limit(per_page + 1).all()
+    if len(rows) <= per_page:
+        return rows, None
+
+    rows = rows[:per_page]
+    last = rows[-1]
+    values = {'sort': sort_key, 'id': last.id}
+    if sort_key != 'id':
+        values['value'] = getattr(last, sort_key)
+    return rows, encode_cursor(values)
+
+
+def cached_count(query, ttl: float = COUNT_CACHE_TTL) -> int:
+    """Count the rows of a query, reusing the result for `ttl` seconds"""
+    compiled = query.statement.compile()
+    key = str(compiled) + repr(sorted(compiled.params.items()))
+    now = time.monotonic()
+
+    with _count_cache_lock:
+        entry = _count_cache.get(key)
+        if entry is not None and now < entry[1]:
+            return entry[0]
+
+    total = query.order_by(None).count()
+    with _count_cache_lock:
+        _count_cache[key] = (total, now + ttl)
+        if len(_count_cache) > 1000:
+            for stale in [k for k, (_, expires_at) in _count_cache.items() if expires_at <= now]:
+                del _count_cache[stale]
+    return total
+
+
+def estimated_count(query, model, filtered: bool) -> Tuple[int, bool]:
+    """Return (count, is_estimate) for a listing
+
+    Unfiltered listings on PostgreSQL read the planner's row estimate from
+    pg_class.reltuples, which costs nothing; anything else falls back to the
+    cached exact count.
+    """
+    if not filtered and db.engine.dialect.name == 'postgresql':
+        reltuples = db.session.execute(
+            text("SELECT reltuples FROM pg_class WHERE relname = :table"),
+            {'table': model.__tablename__}
+        ).scalar()
+        # reltuples is -1 (or 0) before the table was first analyzed
+        if reltuples is not None and reltuples > 0:
+            return int(reltuples), True
+    return cached_count(query), False
+
+
+def page_total(query, model, count_mode: str, filtered: bool) -> Tuple[Optional[int], bool]:
+    """Resolve the `total` argument of a cursor listing"""
+    if count_mode not in COUNT_MODES:
+        raise ValueError(f"total must be one of {', '.join(COUNT_MODES)}")
+    if count_mode == 'exact':
+        return cached_count(query), False
+    if count_mode == 'estimate':
+        return estimated_count(query, model, filtered)
+    return None, False
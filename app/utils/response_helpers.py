@@ -34,4 +34,19 @@ def paginated_response(items, page, per_page, total, endpoint=None):
             'has_next': page * per_page < total,
             'has_prev': page > 1
         }
+    }
+
+def cursor_response(items, per_page, next_cursor, total=None, total_is_estimate=False):
+    pagination = {
+        'per_page': per_page,
+        'next_cursor': next_cursor,
+        'has_next': next_cursor is not None
+    }
+    if total is not None:
+        pagination['total'] = total
+        pagination['total_is_estimate'] = total_is_estimate
+    return {
+        'success': True,
+        'data': items,
+        'pagination': pagination
     }
\ No newline at end of file
@@ -0,0 +1,57 @@
+"""Compare the bridge's zero-rebuild forwarding path with normalisation.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_forwarding
+"""
+import random
+import timeit
+from app.services.kafka_bridge import KafkaWebSocketBridge
+
+DETECTIONS_PER_FRAME = 200
+FRAMES = 500
+
+
+class NullSocketIO:
+    def emit(self, *args, **kwargs):
+        pass
+
+
+def make_record(count, extra_field=False, schema_version=None):
+    detections = []
+    for i in range(count):
+        detection = {
+            'bbox': {'x': random.randint(0, 1920), 'y': random.randint(0, 1080), 'width': 80, 'height': 160},
+            'confidence': round(random.random(), 4),
+            'class_name': 'person',
+            'track_id': f'track_{i:05d}'
+        }
+        if extra_field:
+            # Anything outside the canonical schema forces the slow path
+            detection['embedding_ref'] = i
+        detections.append(detection)
+
+    record = {'camera_id': '1', 'timestamp': 1700000000, 'detections': detections}
+    if schema_version is not None:
+        record['schema_version'] = schema_version
+    return record
+
+
+def main():
+    bridge = KafkaWebSocketBridge(NullSocketIO())
+    cases = (
+        ('normalised', make_record(DETECTIONS_PER_FRAME, extra_field=True)),
+        ('shape check', make_record(DETECTIONS_PER_FRAME)),
+        ('schema version', make_record(DETECTIONS_PER_FRAME, schema_version=1))
+    )
+
+    print(f"{FRAMES} detection frames x {DETECTIONS_PER_FRAME} detections")
+    print(f"{'path':<16}{'us/frame':>10}")
+    for name, record in cases:
+        seconds = min(timeit.repeat(
+            lambda: bridge._process_message('detections', record), number=FRAMES, repeat=5))
+        print(f"{name:<16}{seconds / FRAMES * 1e6:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Measure overlay delivery lag during a login burst under eventlet.
+
+A greenlet stands in for the overlay emitter and ticks every 20 ms, as the
+bridge would while streaming a camera; its lateness is what a viewer sees as
+overlay delay. Concurrent logins then check bcrypt hashes either inline on
+the hub or through the PasswordHasher pool.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_login_burst
+"""
+import time
+import eventlet
+from app import bcrypt
+from app.services.password_hasher import PasswordHasher
+
+TICK = 0.02
+LOGIN_COUNTS = (1, 8, 32)
+PASSWORD = 'correct horse battery staple'
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def run_burst(check, logins, password_hash):
+    """Return (login throughput, p50 lag ms, max lag ms) for one burst"""
+    lags = []
+    running = True
+
+    def overlay_emitter():
+        expected = time.monotonic() + TICK
+        while running:
+            eventlet.sleep(max(0.0, expected - time.monotonic()))
+            now = time.monotonic()
+            lags.append(now - expected)
+            expected = now + TICK
+
+    emitter = eventlet.spawn(overlay_emitter)
+    eventlet.sleep(0.1)
+
+    started = time.monotonic()
+    pool = eventlet.GreenPool()
+    for i in range(logins):
+        # Distinct usernames, so per-user limits don't reject the burst
+        pool.spawn(check, f'user{i}', password_hash, PASSWORD)
+    pool.waitall()
+    elapsed = time.monotonic() - started
+
+    eventlet.sleep(0.1)
+    running = False
+    emitter.wait()
+    return logins / elapsed, percentile(lags, 0.5) * 1000, max(lags) * 1000
+
+
+def main():
+    password_hash = bcrypt.generate_password_hash(PASSWORD).decode('utf-8')
+    hasher = PasswordHasher(max_workers=4, per_user_limit=2, async_mode='eventlet')
+
+    def inline(username, password_hash, password):
+        return bcrypt.check_password_hash(password_hash, password)
+
+    print(f"{'mode':<8} {'logins':>6} {'logins/s':>9} {'p50 lag ms':>11} {'max lag ms':>11}")
+    for logins in LOGIN_COUNTS:
+        for name, check in (('inline', inline), ('pool', hasher.check)):
+            throughput, p50, worst = run_burst(check, logins, password_hash)
+            print(f"{name:<8} {logins:>6} {throughput:>9.1f} {p50:>11.1f} {worst:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
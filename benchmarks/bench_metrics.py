@@ -0,0 +1,45 @@
+"""Measure the hot-path cost of metric updates and of a scrape.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_metrics
+"""
+import threading
+import time
+import timeit
+from app.utils.metrics import Counter, Histogram, Registry
+
+UPDATES = 200000
+THREADS = 4
+
+
+def main():
+    registry = Registry()
+    counter = registry.register(Counter('bench_events', 'Benchmark counter', ('topic',)))
+    histogram = registry.register(Histogram('bench_seconds', 'Benchmark histogram', ('topic',)))
+
+    print(f"{'operation':<24}{'ns/op':>10}")
+    for name, update in (('counter.inc', lambda: counter.inc('tracks')),
+                         ('histogram.observe', lambda: histogram.observe(0.003, 'tracks'))):
+        seconds = min(timeit.repeat(update, number=UPDATES, repeat=5))
+        print(f"{name:<24}{seconds / UPDATES * 1e9:>10.0f}")
+
+    def work():
+        for _ in range(UPDATES):
+            histogram.observe(0.003, 'tracks')
+
+    threads = [threading.Thread(target=work) for _ in range(THREADS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    print(f"{f'observe x {THREADS} threads':<24}{elapsed / (UPDATES * THREADS) * 1e9:>10.0f}")
+
+    seconds = min(timeit.repeat(registry.render, number=100, repeat=3))
+    print(f"{'scrape':<24}{seconds / 100 * 1e6:>9.0f}us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Compare bulk NDJSON person onboarding with one POST per person.
+
+Needs the configured database (DATABASE_URL, PostgreSQL since persons.images
+is an ARRAY column). The rows it creates are deleted afterwards.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_person_import
+"""
+import json
+import time
+from app import create_app, db
+from app.models.person import Person
+from app.models.user import User
+from app.utils.jwt_helper import generate_jwt
+
+SIZES = (500, 5000)
+PREFIX = 'bench-import-'
+
+
+def records(count, run):
+    return [{'name': f'{PREFIX}{run}-{i:06d}', 'images': [f'/uploads/persons/bench/{i}.jpg']}
+            for i in range(count)]
+
+
+def main():
+    app = create_app()
+    client = app.test_client()
+    with app.app_context():
+        user = User.query.filter_by(role='admin').first() or User.query.first()
+        if user is None:
+            raise SystemExit("Create a user first (python -m app.utils)")
+        token = generate_jwt(user.id, user.username, user.role)
+    headers = {'Authorization': f'Bearer {token}'}
+
+    print(f"{'records':>8} {'single/s':>10} {'bulk/s':>10} {'speedup':>8}")
+    try:
+        for count in SIZES:
+            rows = records(count, f'single{count}')
+            started = time.perf_counter()
+            for row in rows:
+                client.post('/api/persons', json=row, headers=headers)
+            single = count / (time.perf_counter() - started)
+
+            body = '\n'.join(json.dumps(row) for row in records(count, f'bulk{count}'))
+            started = time.perf_counter()
+            response = client.post('/api/persons/bulk', data=body,
+                                   headers=dict(headers, **{'Content-Type': 'application/x-ndjson'}))
+            bulk = count / (time.perf_counter() - started)
+            assert response.get_json()['data']['created'] == count, response.get_json()
+
+            print(f"{count:>8} {single:>10.0f} {bulk:>10.0f} {bulk / single:>7.1f}x")
+    finally:
+        with app.app_context():
+            Person.query.filter(Person.name.like(f'{PREFIX}%')).delete(synchronize_session=False)
+            db.session.commit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Measure embedding search latency and recall of the vector index modes.
+
+Vectors are synthetic, clustered 512-d float32 faces. For each gallery size,
+64 queries are searched for the top 10. Recall is measured against the exact
+'flat' results.
+
+Run from the repository root (1M vectors need about 4 GB of memory):
+
+    python -m benchmarks.bench_vector_index [size ...]
+"""
+import sys
+import time
+import numpy as np
+from app.services.vector_index import VectorIndex
+
+SIZES = (100_000, 1_000_000)
+DIM = 512
+IDENTITIES = 5000
+QUERIES = 64
+K = 10
+CHUNK = 100_000
+
+
+def make_gallery(size, rng):
+    """Unit vectors scattered around a few thousand identity centres"""
+    centres = rng.standard_normal((IDENTITIES, DIM), dtype=np.float32)
+    gallery = np.empty((size, DIM), dtype=np.float32)
+    for start in range(0, size, CHUNK):
+        count = min(CHUNK, size - start)
+        block = centres[rng.integers(0, IDENTITIES, count)]
+        block += 0.3 * rng.standard_normal((count, DIM), dtype=np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        gallery[start:start + count] = block
+    return gallery
+
+
+def recall(results, truth):
+    hits = [len({match[0] for match in found} & {match[0] for match in expected}) / K
+            for found, expected in zip(results, truth)]
+    return sum(hits) / len(hits)
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or SIZES
+    rng = np.random.default_rng(0)
+
+    print(f"{'vectors':>9} {'mode':<6} {'build s':>8} {'batch ms':>9} {'per query ms':>13} {'recall@10':>10}")
+    for size in sizes:
+        gallery = make_gallery(size, rng)
+        ids = np.arange(1, size + 1)
+        queries = gallery[rng.integers(0, size, QUERIES)] + 0.1 * rng.standard_normal((QUERIES, DIM), dtype=np.float32)
+
+        truth = None
+        for mode in ('flat', 'ivf', 'ivfpq'):
+            index = VectorIndex(mode=mode, nlist=max(64, int(np.sqrt(size))), nprobe=16, pq_m=64)
+            started = time.perf_counter()
+            index.load(ids, ids, gallery, normalized=True)
+            build = time.perf_counter() - started
+
+            index.search(queries[:1], K)
+            started = time.perf_counter()
+            results = index.search(queries, K)
+            elapsed = (time.perf_counter() - started) * 1000
+
+            if truth is None:
+                truth = results
+            print(f"{size:>9} {mode:<6} {build:>8.2f} {elapsed:>9.1f} {elapsed / QUERIES:>13.2f} "
+                  f"{recall(results, truth):>10.3f}")
+            del index
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Compare JSON and MessagePack overlay encoding on the Socket.IO wire.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_wire_format
+"""
+import random
+import time
+import timeit
+from socketio import packet
+from app.services.wire_format import encode_overlay
+
+DETECTIONS = 1000
+REPEAT = 50
+
+
+def make_payload(count):
+    detections = []
+    for i in range(count):
+        detections.append({
+            'bbox': {
+                'x': random.randint(0, 1920),
+                'y': random.randint(0, 1080),
+                'width': random.randint(20, 400),
+                'height': random.randint(20, 400)
+            },
+            'confidence': round(random.random(), 4),
+            'class_name': 'person',
+            'track_id': f'track_{i:05d}'
+        })
+    return {
+        'camera_id': '1',
+        'timestamp': int(time.time()),
+        'detections': detections,
+        'count': count
+    }
+
+
+def encode_json(payload):
+    return packet.Packet(packet.EVENT, data=['detection_update', payload]).encode()
+
+
+def encode_msgpack(payload):
+    data = encode_overlay('detection_update', payload)
+    return packet.Packet(packet.EVENT, data=['detection_update', data]).encode()
+
+
+def wire_bytes(encoded):
+    if isinstance(encoded, list):
+        return sum(len(part) for part in encoded)
+    return len(encoded)
+
+
+def main():
+    payload = make_payload(DETECTIONS)
+
+    print(f"Overlay encoding for {DETECTIONS} detections ({REPEAT} runs)")
+    print(f"{'format':<10}{'bytes':>10}{'encode ms':>12}")
+    for name, encoder in (('json', encode_json), ('msgpack', encode_msgpack)):
+        size = wire_bytes(encoder(payload))
+        seconds = min(timeit.repeat(lambda: encoder(payload), number=1, repeat=REPEAT))
+        print(f"{name:<10}{size:>10}{seconds * 1000:>12.3f}")
+
+
+if __name__ == '__main__':
+    main()